@@ -9,8 +9,56 @@ from desktop import features
 features.clipboard()
 """
 
-from .clipboard import recieve_clipboard, send_clipboard
-from .notifications import PCNotificationManager
-from .command import run_command, SudoCommandError
-from .mouse_keyboard import track_cursor_polling, track_cursor_pynput, press_key
-from .multimedia import Brightness, Volume,Media, set_brightness, set_volume, media_playback
+# Feature modules are plugins imported on first use: several pull in pyautogui,
+# pynput, pyperclip, psutil or probe win32 at import time, which the server
+# shouldn't pay for before a client asks for that feature.
+import importlib
+
+# Plugin module -> names it provides
+PLUGINS = {
+    'clipboard': ('recieve_clipboard', 'send_clipboard'),
+    'notifications': ('PCNotificationManager', 'AsyncNotificationService', 'NotificationServer'),
+    'command': ('run_command', 'SudoCommandError', 'CommandRunner', 'CommandLimitError', 'CommandCache'),
+    'jobs': ('JobManager', 'JobLimitError', 'JobNotFoundError'),
+    'pty_session': ('PtyManager', 'PTY_SUPPORTED'),
+    'mouse_keyboard': ('track_cursor_polling', 'track_cursor_pynput', 'press_key', 'move_cursor'),
+    'multimedia': ('Brightness', 'Volume', 'Media', 'set_brightness', 'set_volume', 'media_playback',
+                   'get_volume', 'get_brightness', 'get_media_status'),
+    'battery': ('get_battery_status',),
+    'touchpad': ('Touchpad', 'AccelerationCurve'),
+}
+
+_PROVIDERS = {name: module for module, names in PLUGINS.items() for name in names}
+
+__all__ = sorted(_PROVIDERS) + ['lazy', 'register_plugin']
+
+
+def register_plugin(module, names):
+    """Register a feature module (relative to this package) whose names load on first use."""
+    PLUGINS[module] = tuple(names)
+    for name in names:
+        _PROVIDERS[name] = module
+        if name not in __all__:
+            __all__.append(name)
+
+
+def lazy(name):
+    """A stand-in for a feature function that imports its plugin only when first called."""
+    def call(*args, **kwargs):
+        return __getattr__(name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+def __getattr__(name):
+    module = _PROVIDERS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    # Cache it so later lookups don't come back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_PROVIDERS))
@@ -1 +1,24 @@
 # Battery status sharing
+import psutil
+
+
+def get_battery_status():
+    """
+    Read the battery state.
+    Returns a dict with 'percent', 'plugged' and 'secs_left', or None on machines without a battery.
+    """
+    try:
+        battery = psutil.sensors_battery()
+    except Exception as e:
+        print(f"❌ Error reading battery: {e}")
+        return None
+    if battery is None:
+        return None
+    secs_left = battery.secsleft
+    if secs_left in (psutil.POWER_TIME_UNKNOWN, psutil.POWER_TIME_UNLIMITED):
+        secs_left = None
+    return {
+        'percent': round(battery.percent),
+        'plugged': bool(battery.power_plugged),
+        'secs_left': secs_left
+    }
@@ -1,7 +1,16 @@
 # Clipboard sync (receive/update)
-import pyperclip
+import hashlib
+import io
+import os
+import platform
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
 
 def send_clipboard():
+    import pyperclip  # imported on first use, it probes for a clipboard backend
     try:
         clipboard_content = pyperclip.paste()
         return clipboard_content
@@ -10,9 +19,272 @@ def send_clipboard():
         print("Ensure xclip or xsel is installed on Linux, or other necessary backend tools are available.")
 
 def recieve_clipboard(data):
+    import pyperclip
     try:
         pyperclip.copy(data)
         print("Clipboard updated")
     except pyperclip.PyperclipException as e:
         print(f"Error accessing clipboard: {e}")
         print("Ensure xclip or xsel is installed on Linux, or other necessary backend tools are available.")
+
+
+TEXT_MIME = 'text/plain'
+SUPPORTED_MIMES = (TEXT_MIME, 'text/html', 'image/png')
+IMAGE_FORMATS = ('PNG', 'JPEG', 'WEBP')   # what transcode_image can re-encode to
+
+
+def _linux_clipboard_cmd(mime=None, write=False):
+    """Build the wl-clipboard or xclip command line for the current session."""
+    if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-paste'):
+        if write:
+            return ['wl-copy', '--type', mime]
+        return ['wl-paste', '--list-types'] if mime is None else ['wl-paste', '--no-newline', '--type', mime]
+    if write:
+        return ['xclip', '-selection', 'clipboard', '-t', mime, '-i']
+    return ['xclip', '-selection', 'clipboard', '-t', mime or 'TARGETS', '-o']
+
+
+def get_clipboard_mimes():
+    """List the supported MIME types currently offered by the clipboard."""
+    system = platform.system()
+    try:
+        if system == 'Linux':
+            result = subprocess.run(_linux_clipboard_cmd(), capture_output=True, text=True, check=True, timeout=5)
+            offered = set(result.stdout.split())
+            if offered & {'UTF8_STRING', 'STRING', 'TEXT', 'text/plain;charset=utf-8'}:
+                offered.add(TEXT_MIME)
+            return [mime for mime in SUPPORTED_MIMES if mime in offered]
+        if system == 'Darwin':
+            result = subprocess.run(['osascript', '-e', 'clipboard info'], capture_output=True, text=True, check=True, timeout=5)
+            mimes = []
+            if 'string' in result.stdout or 'utf8' in result.stdout:
+                mimes.append(TEXT_MIME)
+            if 'PNGf' in result.stdout:
+                mimes.append('image/png')
+            return mimes
+    except Exception as e:
+        print(f"Error listing clipboard types: {e}")
+    return [TEXT_MIME]
+
+
+def read_clipboard(mime=TEXT_MIME):
+    """Read clipboard content of the given MIME type as bytes, or None if it isn't available."""
+    if mime == TEXT_MIME:
+        text = send_clipboard()
+        return None if text is None else text.encode('utf-8')
+    system = platform.system()
+    try:
+        if system == 'Linux':
+            result = subprocess.run(_linux_clipboard_cmd(mime), capture_output=True, check=True, timeout=10)
+            return result.stdout or None
+        if system == 'Darwin' and mime == 'image/png':
+            result = subprocess.run(
+                ['osascript', '-e', 'the clipboard as «class PNGf»'],
+                capture_output=True, text=True, check=True, timeout=10
+            )
+            # Printed as «data PNGf89504E47...»
+            return bytes.fromhex(result.stdout.strip()[len('«data PNGf'):-1])
+        if system == 'Windows' and mime == 'image/png':
+            import win32clipboard
+            win32clipboard.OpenClipboard()
+            try:
+                png_format = win32clipboard.RegisterClipboardFormat('PNG')
+                if win32clipboard.IsClipboardFormatAvailable(png_format):
+                    return win32clipboard.GetClipboardData(png_format)
+            finally:
+                win32clipboard.CloseClipboard()
+    except Exception as e:
+        print(f"Error reading {mime} from clipboard: {e}")
+    return None
+
+
+def write_clipboard(data: bytes, mime=TEXT_MIME):
+    """Put bytes of the given MIME type on the clipboard. Returns True on success."""
+    if mime == TEXT_MIME:
+        recieve_clipboard(data.decode('utf-8', 'replace'))
+        return True
+    system = platform.system()
+    try:
+        if system == 'Linux':
+            # xclip forks into the background to serve the selection, don't wait on its pipes
+            subprocess.run(_linux_clipboard_cmd(mime, write=True), input=data, check=True, timeout=10,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return True
+        if system == 'Darwin' and mime == 'image/png':
+            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+                f.write(data)
+            try:
+                subprocess.run(
+                    ['osascript', '-e', f'set the clipboard to (read (POSIX file "{f.name}") as «class PNGf»)'],
+                    check=True, timeout=10
+                )
+            finally:
+                os.unlink(f.name)
+            return True
+        if system == 'Windows' and mime == 'image/png':
+            import win32clipboard
+            win32clipboard.OpenClipboard()
+            try:
+                win32clipboard.EmptyClipboard()
+                win32clipboard.SetClipboardData(win32clipboard.RegisterClipboardFormat('PNG'), data)
+            finally:
+                win32clipboard.CloseClipboard()
+            return True
+    except Exception as e:
+        print(f"Error writing {mime} to clipboard: {e}")
+        return False
+    print(f"Clipboard type {mime} is not supported on {system}")
+    return False
+
+
+def transcode_image(data: bytes, max_dimension: int = 1080, image_format: str = 'PNG'):
+    """
+    Downscale an image to fit max_dimension and re-encode it.
+    CPU heavy, meant to run in a worker process. Returns (bytes, mime).
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((max_dimension, max_dimension))
+        if image_format.upper() == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format=image_format, optimize=True)
+    return output.getvalue(), Image.MIME[image_format.upper()]
+
+
+def clipboard_hash(data):
+    """Cheap content fingerprint used to detect changes and suppress echoes."""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'surrogatepass')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ClipboardWatcher:
+    """
+    Watches the system clipboard on a background thread and calls
+    on_change(text, digest) when its content changes.
+    Uses X selection-owner events (XFixes) when available; otherwise polls a
+    cheap change counter where the platform has one, and a content hash where not.
+    """
+
+    def __init__(self, on_change, interval: float = 1.0):
+        self.on_change = on_change
+        self.interval = interval
+        self.last_hash = None
+        self._stop = None
+        self._stop_w = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # Every thread gets its own stop event and wake-up pipe, so a restart never
+        # touches those of a thread that is still on its way out
+        self._stop = threading.Event()
+        stop_r, self._stop_w = os.pipe()
+        self._thread = threading.Thread(target=self._run, args=(self._stop, stop_r),
+                                        name='clipboard-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Tell the thread to stop without waiting for it, so this is safe to call on the
+        event loop. Returns the thread, to join() elsewhere if needed, or None.
+        """
+        thread = self._thread
+        if thread is None:
+            return None
+        self._stop.set()
+        # Closing the write end wakes the thread's select(); it closes the read end itself
+        os.close(self._stop_w)
+        self._thread = self._stop = self._stop_w = None
+        return thread
+
+    def _run(self, stop, stop_r):
+        try:
+            try:
+                if self._watch_x11(stop, stop_r):
+                    return
+            except Exception as e:
+                print(f"X clipboard events unavailable, falling back to polling: {e}")
+            self._poll(stop)
+        finally:
+            os.close(stop_r)
+
+    def _check(self):
+        text = send_clipboard()
+        digest = clipboard_hash(text)
+        if digest is not None and digest != self.last_hash:
+            self.last_hash = digest
+            self.on_change(text, digest)
+
+    def _watch_x11(self, stop, stop_r):
+        if platform.system() != 'Linux' or not os.environ.get('DISPLAY'):
+            return False
+        try:
+            from Xlib import display
+            from Xlib.ext import xfixes
+        except ImportError:
+            print("python-xlib not installed, clipboard changes will be polled. Install with: pip install python-xlib")
+            return False
+
+        disp = display.Display()
+        try:
+            if not disp.has_extension('XFIXES'):
+                return False
+            disp.xfixes_query_version()
+            root = disp.screen().root
+            selection = disp.get_atom('CLIPBOARD')
+            disp.xfixes_select_selection_input(root, selection, xfixes.XFixesSetSelectionOwnerNotifyMask)
+            disp.flush()
+            print("📋 Watching clipboard with X selection events")
+
+            self._check()
+            # Block on the X connection and the stop pipe, no periodic wakeups
+            while not stop.is_set():
+                readable, _, _ = select.select([disp.fileno(), stop_r], [], [])
+                if stop_r in readable:
+                    break
+                changed = False
+                while disp.pending_events():
+                    event = disp.next_event()
+                    if (event.type, getattr(event, 'sub_code', None)) == disp.extension_event.SetSelectionOwnerNotify:
+                        changed = True
+                if changed:
+                    self._check()
+            return True
+        finally:
+            disp.close()
+
+    def _poll(self, stop):
+        counter = _clipboard_change_counter()
+        last_count = None
+        while not stop.is_set():
+            if counter is None:
+                self._check()
+            else:
+                # Only read the clipboard when the OS says it changed
+                count = counter()
+                if count != last_count:
+                    last_count = count
+                    self._check()
+            stop.wait(self.interval)
+
+
+def _clipboard_change_counter():
+    """Return a callable reading the OS clipboard change counter, or None if there is none."""
+    system = platform.system()
+    if system == 'Windows':
+        import ctypes
+        return ctypes.windll.user32.GetClipboardSequenceNumber
+    if system == 'Darwin':
+        try:
+            from AppKit import NSPasteboard
+            pasteboard = NSPasteboard.generalPasteboard()
+            return pasteboard.changeCount
+        except ImportError:
+            return None
+    return None
@@ -1,33 +1,29 @@
 # Whitelisted command execution
+import asyncio
+import codecs
 import subprocess
 import shlex
-from typing import List, Union
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
 class SudoCommandError(Exception):
     """Raised when attempting to run a command that requires sudo privileges. something soemtihng siht"""
     pass
 
-def run_command(cmd: Union[str, List[str]], **kwargs) -> subprocess.CompletedProcess:
+def prepare_command(cmd: Union[str, List[str]]) -> List[str]:
     """
-    Run a command while rejecting explicit sudo commands.
-    
-    Args:
-        cmd: Command to run as string or list of arguments
-        **kwargs: Additional arguments to pass to subprocess.run()
+    Split a command into an argument list and reject explicit sudo commands.
     
-    Returns:
-        subprocess.CompletedProcess: Result of the command execution
-        
     Raises:
+        ValueError: If the command is empty
         SudoCommandError: If the command starts with sudo
-        subprocess.CalledProcessError: If the command fails (with sudo note if permission denied)
     """
-    
     # Convert string command to list if needed
     if isinstance(cmd, str):
         cmd_list = shlex.split(cmd)
     else:
-        cmd_list = cmd.copy()
+        cmd_list = list(cmd)
     
     if not cmd_list:
         raise ValueError("Command cannot be empty")
@@ -39,6 +35,26 @@ def run_command(cmd: Union[str, List[str]], **kwargs) -> subprocess.CompletedPro
     if base_cmd == 'sudo':
         raise SudoCommandError("Sudo commands are not supported")
     
+    return cmd_list
+
+def run_command(cmd: Union[str, List[str]], **kwargs) -> subprocess.CompletedProcess:
+    """
+    Run a command while rejecting explicit sudo commands.
+    
+    Args:
+        cmd: Command to run as string or list of arguments
+        **kwargs: Additional arguments to pass to subprocess.run()
+    
+    Returns:
+        subprocess.CompletedProcess: Result of the command execution
+        
+    Raises:
+        SudoCommandError: If the command starts with sudo
+        subprocess.CalledProcessError: If the command fails (with sudo note if permission denied)
+    """
+    
+    cmd_list = prepare_command(cmd)
+    
     # Set default subprocess arguments
     default_kwargs = {
         'capture_output': True,
@@ -67,4 +83,250 @@ def run_command(cmd: Union[str, List[str]], **kwargs) -> subprocess.CompletedPro
                 stderr=e.stderr + "\nNote: Sudo commands are not supported"
             )
         # Re-raise with original error info
-        raise e
\ No newline at end of file
+        raise e
+
+
+class CommandLimitError(Exception):
+    """Raised when a client already runs the maximum number of concurrent commands."""
+    pass
+
+class CommandRunner:
+    """
+    Runs commands as asyncio subprocesses, streaming stdout and stderr to the
+    caller as they arrive instead of buffering them until exit.
+    Output is capped per command and concurrency is capped per client.
+    """
+    
+    def __init__(self, max_output_bytes: Optional[int] = 1024 * 1024, max_per_client: int = 4,
+                 chunk_size: int = 4096):
+        self.max_output_bytes = max_output_bytes
+        self.max_per_client = max_per_client
+        self.chunk_size = chunk_size
+        self._processes = {}  # owner -> {command_id: process, None while spawning}
+        self._early_cancels = {}  # (owner, command_id) -> force, for cancels that beat the spawn
+    
+    def running(self, owner) -> int:
+        return len(self._processes.get(owner, {}))
+    
+    def reserve(self, owner, command_id: str):
+        """
+        Claim one of the owner's slots for a command, without awaiting anything, so two
+        requests can't both pass the limit check. run(..., reserved=True) then uses the
+        slot; release() gives it back if the command never runs.
+        
+        Raises:
+            CommandLimitError: If the owner already runs max_per_client commands
+            ValueError: If a command with this ID is already running
+        """
+        processes = self._processes.setdefault(owner, {})
+        if len(processes) >= self.max_per_client:
+            if not processes:
+                self._processes.pop(owner, None)
+            raise CommandLimitError(f"At most {self.max_per_client} commands can run at once")
+        if command_id in processes:
+            raise ValueError(f"Command {command_id} is already running")
+        # Held while spawning too, so a cancel arriving meanwhile isn't lost
+        processes[command_id] = None
+    
+    def release(self, owner, command_id: str) -> bool:
+        """Free a reserved slot. Returns True if the command was cancelled while it held it."""
+        processes = self._processes.get(owner, {})
+        processes.pop(command_id, None)
+        if not processes:
+            self._processes.pop(owner, None)
+        return self._early_cancels.pop((owner, command_id), None) is not None
+    
+    async def run(self, owner, command_id: str, cmd: Union[str, List[str]],
+                  send: Callable[[dict], Awaitable], timeout: Optional[float] = None,
+                  reserved: bool = False) -> int:
+        """
+        Run a command for `owner`, passing command_output and command_exit messages to `send`.
+        With `reserved`, the slot taken by reserve() is used (and freed on every outcome).
+        
+        Returns:
+            int: The exit code (negative for a signal on POSIX)
+        
+        Raises:
+            SudoCommandError / ValueError: If the command is rejected
+            CommandLimitError: If the owner already runs max_per_client commands
+        """
+        try:
+            cmd_list = prepare_command(cmd)
+        except BaseException:
+            if reserved:
+                self.release(owner, command_id)
+            raise
+        if not reserved:
+            self.reserve(owner, command_id)
+        processes = self._processes[owner]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd_list,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except BaseException:
+            self.release(owner, command_id)
+            raise
+        processes[command_id] = process
+        if (owner, command_id) in self._early_cancels:
+            self._signal(process, self._early_cancels.pop((owner, command_id)))
+        budget = {'remaining': self.max_output_bytes, 'truncated': False}  # None means uncapped
+        timed_out = False
+        try:
+            pumps = asyncio.gather(
+                self._pump(process.stdout, 'stdout', command_id, send, budget),
+                self._pump(process.stderr, 'stderr', command_id, send, budget),
+                process.wait()
+            )
+            try:
+                await asyncio.wait_for(pumps, timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                process.kill()
+                await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            self.release(owner, command_id)
+        
+        await send({
+            'type': 'command_exit',
+            'commandId': command_id,
+            'exitCode': process.returncode,
+            'truncated': budget['truncated'],
+            'timedOut': timed_out
+        })
+        return process.returncode
+    
+    async def _pump(self, stream, name, command_id, send, budget):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = await stream.read(self.chunk_size)
+            if not chunk:
+                text = decoder.decode(b'', final=True)
+                if text:
+                    await send({'type': 'command_output', 'commandId': command_id, 'stream': name, 'data': text})
+                return
+            if budget['remaining'] is not None:
+                if budget['remaining'] <= 0:
+                    # Keep draining so the process never blocks on a full pipe
+                    budget['truncated'] = True
+                    continue
+                chunk = chunk[:budget['remaining']]
+                budget['remaining'] -= len(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                await send({'type': 'command_output', 'commandId': command_id, 'stream': name, 'data': text})
+    
+    def cancel(self, owner, command_id: str, force: bool = False) -> bool:
+        """Terminate (or kill, with force) a running command. Returns False if it isn't running."""
+        processes = self._processes.get(owner, {})
+        if command_id not in processes:
+            return False
+        process = processes[command_id]
+        if process is None:
+            self._early_cancels[(owner, command_id)] = force
+            return True
+        if process.returncode is not None:
+            return False
+        self._signal(process, force)
+        return True
+    
+    @staticmethod
+    def _signal(process, force):
+        if force:
+            process.kill()
+        else:
+            process.terminate()
+    
+    def cancel_all(self, owner):
+        """Kill every command started by an owner, e.g. when its connection drops."""
+        for command_id in list(self._processes.get(owner, {})):
+            self.cancel(owner, command_id, force=True)
+
+
+# Read-only commands dashboards poll, with how long (seconds) a result may be reused
+DEFAULT_CACHEABLE_COMMANDS = {
+    'uptime': 5.0,
+    'df -h': 10.0,
+    'free -h': 5.0,
+    'free -m': 5.0,
+    'nvidia-smi': 2.0,
+}
+
+class CommandCache:
+    """
+    Short-lived cache in front of run_command for read-only commands.
+    Results are keyed by the argv from shlex.split, so `df  -h` and `df -h` share
+    an entry. Only commands on the allowlist are cached, each for its own TTL, and
+    only successful runs are kept. Identical requests arriving while one is already
+    running wait for that run instead of starting another process.
+    """
+    
+    def __init__(self, allowlist: Optional[Dict[str, float]] = None, max_entries: int = 128,
+                 runner: Callable[..., subprocess.CompletedProcess] = run_command):
+        if allowlist is None:
+            allowlist = DEFAULT_CACHEABLE_COMMANDS
+        self.allowlist = {tuple(prepare_command(cmd)): ttl for cmd, ttl in allowlist.items()}
+        self.max_entries = max_entries
+        self.runner = runner
+        self._entries = OrderedDict()  # argv -> (expires, CompletedProcess)
+        self._inflight = {}            # argv -> task running it
+        self.hits = 0
+        self.misses = 0
+    
+    def cacheable(self, cmd: Union[str, List[str]]) -> bool:
+        """Whether a command is on the allowlist. Raises like prepare_command."""
+        return tuple(prepare_command(cmd)) in self.allowlist
+    
+    async def run(self, cmd: Union[str, List[str]]) -> Tuple[subprocess.CompletedProcess, bool]:
+        """
+        Run a command, reusing a fresh cached result when there is one.
+        
+        Returns:
+            (CompletedProcess, cached): cached is True when no new process was started
+        """
+        argv = tuple(prepare_command(cmd))
+        ttl = self.allowlist.get(argv)
+        if ttl is None:
+            return await asyncio.to_thread(self.runner, list(argv), check=False), False
+        
+        entry = self._entries.get(argv)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(argv)
+                self.hits += 1
+                return entry[1], True
+            del self._entries[argv]
+        
+        task = self._inflight.get(argv)
+        if task is not None:
+            # Single flight: share the run that is already going
+            self.hits += 1
+            return await asyncio.shield(task), True
+        
+        self.misses += 1
+        task = asyncio.ensure_future(asyncio.to_thread(self.runner, list(argv), check=False))
+        self._inflight[argv] = task
+        task.add_done_callback(lambda t: self._store(argv, ttl, t))
+        # Shielded so one caller going away doesn't cancel the run for the others
+        return await asyncio.shield(task), False
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def _store(self, argv, ttl, task):
+        self._inflight.pop(argv, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result.returncode != 0:
+            # Failures may be transient, don't pin them
+            return
+        self._entries[argv] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(argv)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
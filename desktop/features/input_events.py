@@ -0,0 +1,174 @@
+# Batched input events, and the one thread every input injection runs on
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .touchpad import PointerBackend
+
+MAX_BATCH_EVENTS = 256
+MAX_BATCH_SPAN = 2.0   # seconds, the latest 't' a timed batch may ask for
+BUTTONS = ('left', 'right', 'middle')
+KEY_ALIASES = {'next': 'right', 'previous': 'left'}   # presentation actions, as press_key maps them
+
+
+class InputBusyError(Exception):
+    """Raised when the input thread already has as much work waiting as it takes."""
+
+
+def _number(event, name, default=0):
+    value = event.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a number")
+    return value
+
+
+def validate_events(events):
+    """
+    Check a batch and return it normalized: dicts with a known 'type' and 't',
+    the milliseconds since the batch started. Raises ValueError naming the
+    first bad event, so a batch either runs whole or not at all.
+    """
+    if not isinstance(events, list) or not events:
+        raise ValueError('events must be a non-empty list')
+    if len(events) > MAX_BATCH_EVENTS:
+        raise ValueError(f'at most {MAX_BATCH_EVENTS} events per batch')
+    normalized = []
+    last_t = 0
+    for index, event in enumerate(events):
+        try:
+            if not isinstance(event, dict):
+                raise ValueError('must be an object')
+            kind = event.get('type')
+            t = _number(event, 't', last_t)
+            if t < last_t or t > MAX_BATCH_SPAN * 1000:
+                raise ValueError(f"'t' must not go back and must be at most {MAX_BATCH_SPAN * 1000:.0f} ms")
+            last_t = t
+            if kind == 'move':
+                step = {'dx': _number(event, 'dx'), 'dy': _number(event, 'dy')}
+            elif kind in ('click', 'down', 'up'):
+                button = event.get('button', 'left')
+                if button not in BUTTONS:
+                    raise ValueError(f"'button' must be one of {', '.join(BUTTONS)}")
+                step = {'button': button}
+                if kind == 'click':
+                    clicks = _number(event, 'clicks', 1)
+                    if clicks not in (1, 2, 3):
+                        raise ValueError("'clicks' must be 1, 2 or 3")
+                    step['clicks'] = int(clicks)
+            elif kind == 'scroll':
+                step = {'dx': int(_number(event, 'dx')), 'dy': int(_number(event, 'dy'))}
+            elif kind == 'key':
+                key = event.get('key')
+                if not isinstance(key, str) or not key:
+                    raise ValueError("'key' must be a key name")
+                step = {'key': KEY_ALIASES.get(key, key)}
+            else:
+                raise ValueError(f"unknown type {kind!r}")
+        except ValueError as e:
+            raise ValueError(f'event {index}: {e}')
+        normalized.append({'type': kind, 't': t, **step})
+    return normalized
+
+
+class InputBackend(PointerBackend):
+    """Buttons, wheel and keys through pyautogui, without its PAUSE sleep after every call."""
+
+    def click(self, button, clicks):
+        import pyautogui
+        pyautogui.click(button=button, clicks=clicks, _pause=False)
+
+    def down(self, button):
+        import pyautogui
+        pyautogui.mouseDown(button=button, _pause=False)
+
+    def up(self, button):
+        import pyautogui
+        pyautogui.mouseUp(button=button, _pause=False)
+
+    def scroll(self, dx, dy):
+        import pyautogui
+        if dy:
+            pyautogui.scroll(dy, _pause=False)
+        if dx:
+            pyautogui.hscroll(dx, _pause=False)
+
+    def key(self, key):
+        import pyautogui
+        pyautogui.press(key, _pause=False)
+
+
+class InputExecutor:
+    """
+    The one thread all input injection runs on: batches, single moves, key presses
+    and media keys. Nothing injects from two threads at once, events reach the OS
+    in the order they were submitted, and the event loop never waits on the
+    injection backend. With timing on, each event of a batch waits until its 't'
+    so a drag or a gesture replays at the speed it was made.
+
+    At most `max_pending` jobs wait or run at once; beyond that submit() and call()
+    raise InputBusyError instead of queueing without bound.
+    """
+
+    def __init__(self, backend=None, clock=time.monotonic, sleep=time.sleep, max_pending: int = 32):
+        self.backend = backend or InputBackend()
+        self.clock = clock
+        self.sleep = sleep
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='input')
+
+    async def submit(self, events, touchpad, timing=False):
+        """Run a validated batch on the input thread. Returns the result of run()."""
+        return await self.call(self.run, events, touchpad, timing)
+
+    async def call(self, fn, *args):
+        """Run any other injection, fn(*args), on the input thread and return its result."""
+        if self.pending >= self.max_pending:
+            raise InputBusyError(f'{self.pending} input jobs already waiting')
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def run(self, events, touchpad, timing=False):
+        """
+        Execute events in order, stopping at the first that fails. Returns a dict with
+        'executed', the number that ran, 'error' if one failed, and 'lateMs', how far
+        behind its 't' the most delayed event ran when timing is on.
+        """
+        start = self.clock()
+        late = 0.0
+        last_move_t = None
+        executed = 0
+        for event in events:
+            if timing:
+                wait = start + event['t'] / 1000 - self.clock()
+                if wait > 0:
+                    self.sleep(wait)
+                else:
+                    late = max(late, -wait)
+            try:
+                kind = event['type']
+                if kind == 'move':
+                    # Sample spacing from the client, so acceleration sees the real finger speed;
+                    # moves sharing a 't' count as slow rather than infinitely fast
+                    dt = (event['t'] - last_move_t) / 1000 if last_move_t is not None else None
+                    last_move_t = event['t']
+                    touchpad.move(event['dx'], event['dy'], dt)
+                elif kind == 'click':
+                    self.backend.click(event['button'], event['clicks'])
+                elif kind == 'down':
+                    self.backend.down(event['button'])
+                elif kind == 'up':
+                    self.backend.up(event['button'])
+                elif kind == 'scroll':
+                    self.backend.scroll(event['dx'], event['dy'])
+                elif kind == 'key':
+                    self.backend.key(event['key'])
+            except Exception as e:
+                return {'executed': executed, 'error': f'event {executed}: {e}', 'lateMs': round(late * 1000, 1)}
+            executed += 1
+        return {'executed': executed, 'error': None, 'lateMs': round(late * 1000, 1)}
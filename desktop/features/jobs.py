@@ -0,0 +1,229 @@
+# Background jobs for long-running remote commands
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import List, Optional, Union
+
+from .command import CommandRunner, prepare_command
+
+
+class JobLimitError(Exception):
+    """Raised when a client or the whole server already holds the maximum number of jobs."""
+    pass
+
+
+class JobNotFoundError(Exception):
+    """Raised for unknown job IDs or jobs owned by another client."""
+    pass
+
+
+def _encoded_size(text: str) -> int:
+    return len(text.encode('utf-8', 'surrogatepass'))
+
+
+class Job:
+    """A command running in the background, detached from any one connection."""
+
+    def __init__(self, job_id: str, owner, command, max_output_bytes: int):
+        self.id = job_id
+        self.owner = owner
+        self.command = command
+        self.status = 'running'     # running, exited, failed, cancelled
+        self.exit_code = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.max_output_bytes = max_output_bytes
+        self.output = deque()       # (seq, stream, text), oldest dropped past max_output_bytes of UTF-8
+        self.output_bytes = 0
+        self.dropped_bytes = 0
+        self.next_seq = 0
+        self.listeners = {}         # attached session -> seq of the last output queued to it
+        self.task = None
+        self.started = False        # the command has been handed to the runner
+        self.cancel_requested = False
+
+    def append(self, stream: str, text: str):
+        entry = (self.next_seq, stream, text)
+        self.next_seq += 1
+        self.output.append(entry)
+        self.output_bytes += _encoded_size(text)
+        while self.output_bytes > self.max_output_bytes and len(self.output) > 1:
+            _, _, dropped = self.output.popleft()
+            self.output_bytes -= _encoded_size(dropped)
+            self.dropped_bytes += _encoded_size(dropped)
+        if self.output_bytes > self.max_output_bytes:
+            # A single oversized chunk, keep only its tail, cut on a character boundary
+            seq, kept_stream, kept = self.output[0]
+            tail = kept.encode('utf-8', 'surrogatepass')[-self.max_output_bytes:].decode('utf-8', 'ignore')
+            self.output[0] = (seq, kept_stream, tail)
+            self.dropped_bytes += self.output_bytes - _encoded_size(tail)
+            self.output_bytes = _encoded_size(tail)
+        return entry
+
+    def output_since(self, seq: Optional[int] = None):
+        return [entry for entry in self.output if seq is None or entry[0] > seq]
+
+    def to_dict(self):
+        return {
+            'jobId': self.id,
+            'command': self.command,
+            'status': self.status,
+            'exitCode': self.exit_code,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+            'outputBytes': self.output_bytes,
+            'droppedBytes': self.dropped_bytes,
+            'nextSeq': self.next_seq
+        }
+
+
+class JobManager:
+    """
+    Runs commands as background jobs. Submitting returns a job ID right away; the
+    job keeps running if the client disconnects, buffers the tail of its output,
+    and keeps its result until the owner collects it (or result_ttl expires).
+    """
+
+    def __init__(self, max_per_client: int = 4, max_jobs: int = 32,
+                 max_output_bytes: int = 256 * 1024, result_ttl: float = 24 * 3600):
+        self.max_per_client = max_per_client
+        self.max_jobs = max_jobs
+        self.max_output_bytes = max_output_bytes
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._runner = CommandRunner(max_output_bytes=None, max_per_client=1)
+
+    def submit(self, owner, command: Union[str, List[str]]) -> Job:
+        """Validate and start a job. Raises SudoCommandError, ValueError or JobLimitError."""
+        prepare_command(command)
+        self._expire()
+        if len(self.jobs) >= self.max_jobs:
+            raise JobLimitError(f"The server already holds {self.max_jobs} jobs")
+        if sum(1 for job in self.jobs.values() if job.owner == owner) >= self.max_per_client:
+            raise JobLimitError(f"At most {self.max_per_client} jobs per client, collect finished ones first")
+        job = Job(uuid.uuid4().hex, owner, command, self.max_output_bytes)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, owner, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            raise JobNotFoundError(f"Unknown job: {job_id}")
+        return job
+
+    def jobs_for(self, owner) -> List[Job]:
+        self._expire()
+        return [job for job in self.jobs.values() if job.owner == owner]
+
+    async def attach(self, owner, job_id: str, session, since: Optional[int] = None) -> Job:
+        """Replay buffered output after `since`, then stream live output to the session."""
+        if since is not None and (isinstance(since, bool) or not isinstance(since, int)):
+            raise ValueError("'since' must be the integer seq of the last output received")
+        job = self.get(owner, job_id)
+        # Replay until caught up, then register without awaiting so nothing is missed in between
+        while True:
+            entries = job.output_since(since)
+            if not entries:
+                break
+            for entry in entries:
+                await session.send(self._output_frame(job, entry))
+                since = entry[0]
+        if job.status == 'running':
+            job.listeners[session] = since
+        else:
+            await session.send(self._exit_frame(job))
+        return job
+
+    def detach(self, owner, job_id: str, session):
+        self.get(owner, job_id).listeners.pop(session, None)
+
+    def detach_all(self, session):
+        for job in self.jobs.values():
+            job.listeners.pop(session, None)
+
+    def cancel(self, owner, job_id: str, force: bool = False) -> bool:
+        job = self.get(owner, job_id)
+        if job.status != 'running':
+            return False
+        job.cancel_requested = True
+        if not job.started:
+            # _run() sees the request and never spawns the command
+            return True
+        return self._runner.cancel(job.id, job.id, force=force)
+
+    def cancel_all(self):
+        """Kill every running job, e.g. when the server shuts down."""
+        for job in self.jobs.values():
+            if job.status == 'running':
+                job.cancel_requested = True
+                if job.started:
+                    self._runner.cancel(job.id, job.id, force=True)
+
+    def transfer(self, old_owner, new_owner):
+        """Hand an owner's jobs to another, e.g. a session resumed under a new ID."""
+        for job in self.jobs.values():
+            if job.owner == old_owner:
+                job.owner = new_owner
+
+    def collect(self, owner, job_id: str) -> Job:
+        """Hand over a finished job's result and forget it."""
+        job = self.get(owner, job_id)
+        if job.status == 'running':
+            raise ValueError(f"Job {job_id} is still running")
+        del self.jobs[job_id]
+        return job
+
+    async def _run(self, job: Job):
+        async def on_message(message):
+            if message['type'] == 'command_output':
+                entry = job.append(message['stream'], message['data'])
+                self._fan_out(job, self._output_frame(job, entry), entry[0])
+        try:
+            if job.cancel_requested:
+                # Cancelled before the task got to run
+                job.status = 'cancelled'
+            else:
+                # Each job is its own runner owner, jobs have no timeout. The runner holds
+                # the job's slot before its first await, so later cancels reach it
+                job.started = True
+                job.exit_code = await self._runner.run(job.id, job.id, job.command, on_message)
+                job.status = 'cancelled' if job.cancel_requested else 'exited'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished = time.time()
+        self._fan_out(job, self._exit_frame(job))
+        job.listeners.clear()
+        # Results nobody comes back for are dropped without waiting for the next request
+        asyncio.get_running_loop().call_later(self.result_ttl, self._expire)
+
+    def _fan_out(self, job: Job, frame: str, seq: Optional[int] = None):
+        # Queued without waiting, a slow listener must not hold up the job. One that falls
+        # behind is detached rather than disconnected, and told where to re-attach from
+        for session, last in list(job.listeners.items()):
+            if session.push(frame, droppable=True, lane='bulk'):
+                if seq is not None:
+                    job.listeners[session] = seq
+                continue
+            del job.listeners[session]
+            session.push(json.dumps({'type': 'job_detached', 'jobId': job.id, 'reason': 'overflow', 'since': last}))
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                del self.jobs[job_id]
+
+    @staticmethod
+    def _output_frame(job: Job, entry):
+        seq, stream, text = entry
+        return json.dumps({'type': 'job_output', 'jobId': job.id, 'seq': seq, 'stream': stream, 'data': text})
+
+    @staticmethod
+    def _exit_frame(job: Job):
+        return json.dumps({'type': 'job_exit', **job.to_dict()})
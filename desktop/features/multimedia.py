@@ -2,6 +2,7 @@ from enum import Enum
 import platform
 import subprocess
 import os
+import re
 import time
 
 # Import win32api for Windows media control
@@ -257,3 +258,83 @@ def media_playback(action):
         print(f"❌ Error executing media action '{action}': {e}")
 
 
+
+
+def get_volume():
+    """
+    Read the current output volume.
+    Returns a dict with 'level' (0-100) and 'muted', or None if unavailable.
+    """
+    system = platform.system()
+    try:
+        if system == 'Darwin':
+            result = subprocess.run(
+                ['osascript', '-e', 'get volume settings'],
+                capture_output=True, text=True, check=True
+            )
+            # "output volume:50, input volume:75, alert volume:100, output muted:false"
+            settings = dict(
+                part.strip().split(':', 1) for part in result.stdout.strip().split(',') if ':' in part
+            )
+            return {
+                'level': int(settings['output volume']),
+                'muted': settings.get('output muted') == 'true'
+            }
+        elif system == 'Linux':
+            try:
+                result = subprocess.run(['amixer', 'get', 'Master'], capture_output=True, text=True, check=True)
+                match = re.search(r'\[(\d+)%\](?:.*\[(on|off)\])?', result.stdout)
+                if match:
+                    return {'level': int(match.group(1)), 'muted': match.group(2) == 'off'}
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                pass
+            # Fallback to pactl (PulseAudio / PipeWire)
+            result = subprocess.run(
+                ['pactl', 'get-sink-volume', '@DEFAULT_SINK@'], capture_output=True, text=True, check=True
+            )
+            muted = subprocess.run(
+                ['pactl', 'get-sink-mute', '@DEFAULT_SINK@'], capture_output=True, text=True, check=True
+            )
+            match = re.search(r'(\d+)%', result.stdout)
+            if match:
+                return {'level': int(match.group(1)), 'muted': 'yes' in muted.stdout}
+    except Exception as e:
+        print(f"❌ Error reading volume: {e}")
+    return None
+
+def get_brightness():
+    """
+    Read the current screen brightness.
+    Returns a dict with 'level' (0-100), or None if unavailable.
+    """
+    system = platform.system()
+    try:
+        if system == 'Windows':
+            import screen_brightness_control as sbc
+            return {'level': int(sbc.get_brightness(display=0)[0])}
+        elif system == 'Linux':
+            # Machine readable output: device,class,current,percent,max
+            result = subprocess.run(['brightnessctl', '-m'], capture_output=True, text=True, check=True)
+            fields = result.stdout.strip().splitlines()[0].split(',')
+            return {'level': int(fields[3].rstrip('%'))}
+    except Exception as e:
+        print(f"❌ Error reading brightness: {e}")
+    return None
+
+def get_media_status():
+    """
+    Read the state of the active media player.
+    Returns a dict with 'status', 'artist' and 'title', or None if no player is running.
+    """
+    if platform.system() != 'Linux':
+        return None
+    try:
+        result = subprocess.run(
+            ['playerctl', 'metadata', '--format', '{{status}}\t{{artist}}\t{{title}}'],
+            capture_output=True, text=True, check=True
+        )
+        status, artist, title = (result.stdout.rstrip('\n').split('\t') + ['', '', ''])[:3]
+        return {'status': status.lower(), 'artist': artist, 'title': title}
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # No player running or playerctl not installed
+        return None
@@ -0,0 +1,154 @@
+# Notification history (bounded in-memory ring + append-only SQLite store)
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class NotificationHistory:
+    """
+    Keeps the most recent notifications in a fixed-size ring buffer and every
+    notification in an append-only SQLite table indexed by app and time.
+    Entries are plain JSON-serializable dicts.
+    """
+
+    def __init__(self, db_path=None, max_memory: int = 500, max_rows: Optional[int] = 100000):
+        self.recent = deque(maxlen=max_memory)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path) if db_path else ":memory:", check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                app TEXT NOT NULL,
+                title TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_notifications_app_time ON notifications (app, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_notifications_time ON notifications (timestamp);
+        """)
+        self._recover(max_rows)
+
+    def _recover(self, max_rows):
+        """Trim the store to max_rows and reload only the newest rows into the ring."""
+        with self._lock:
+            if max_rows:
+                # Rowid range delete, no table scan
+                self._db.execute(
+                    "DELETE FROM notifications WHERE id <= (SELECT MAX(id) FROM notifications) - ?",
+                    (max_rows,)
+                )
+                self._db.commit()
+            rows = self._db.execute(
+                "SELECT * FROM notifications ORDER BY id DESC LIMIT ?", (self.recent.maxlen,)
+            ).fetchall()
+            self.recent.extend(dict(row) for row in reversed(rows))
+            oldest = self._db.execute("SELECT MIN(id) FROM notifications").fetchone()[0]
+            self._oldest_id = oldest
+
+    def add(self, app: str, title: str, message: str):
+        """Append one notification and return the stored entry."""
+        return self.add_many([(app, title, message)])[0]
+
+    def add_many(self, notifications):
+        """Append (app, title, message) tuples in a single transaction."""
+        entries = []
+        with self._lock:
+            # Stamped with the receive time so ring and table stay in time order
+            now = time.time()
+            for app, title, message in notifications:
+                entry = {
+                    'timestamp': now,
+                    'app': app,
+                    'title': title,
+                    'message': message
+                }
+                cursor = self._db.execute(
+                    "INSERT INTO notifications (timestamp, app, title, message) VALUES (?, ?, ?, ?)",
+                    (entry['timestamp'], app, title, message)
+                )
+                entry['id'] = cursor.lastrowid
+                if self._oldest_id is None:
+                    self._oldest_id = entry['id']
+                entries.append(entry)
+            self._db.commit()
+            self.recent.extend(entries)
+        return entries
+
+    def query(self, app: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, cursor: Optional[str] = None, limit: int = 50):
+        """
+        Return a page of notifications, newest first, and the cursor for the next page
+        (None when there are no more). Pages that fit in the ring never touch SQLite.
+        Raises TypeError for filters of the wrong type, ValueError for a malformed cursor.
+        """
+        for name, value, types in (('app', app, str), ('cursor', cursor, str),
+                                   ('since', since, (int, float)), ('until', until, (int, float))):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, types)):
+                raise TypeError(f"'{name}' must be a {'string' if types is str else 'number'}")
+        before = self._parse_cursor(cursor)
+        with self._lock:
+            items = self._query_memory(app, since, until, before, limit)
+            if items is None:
+                items = self._query_db(app, since, until, before, limit)
+        next_cursor = None
+        if len(items) == limit:
+            next_cursor = f"{items[-1]['timestamp']!r}:{items[-1]['id']}"
+        return items, next_cursor
+
+    def _query_memory(self, app, since, until, before, limit):
+        items = []
+        for entry in reversed(self.recent):
+            key = (entry['timestamp'], entry['id'])
+            if before is not None and key >= before:
+                continue
+            if since is not None and entry['timestamp'] < since:
+                # Everything older is out of range too
+                return items
+            if until is not None and entry['timestamp'] > until:
+                continue
+            if app is not None and entry['app'] != app:
+                continue
+            items.append(entry)
+            if len(items) == limit:
+                return items
+        # Ran off the end of the ring, only complete if the ring holds the whole store
+        if not self.recent or self.recent[0]['id'] <= (self._oldest_id or 0):
+            return items
+        return None
+
+    def _query_db(self, app, since, until, before, limit):
+        clauses, params = [], []
+        if app is not None:
+            clauses.append("app = ?")
+            params.append(app)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._db.execute(
+            f"SELECT * FROM notifications {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _parse_cursor(cursor):
+        if not cursor:
+            return None
+        timestamp, _, row_id = cursor.partition(':')
+        return float(timestamp), int(row_id)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,10 +1,16 @@
 # Notification display
+import asyncio
 import platform
 import subprocess
 import sys
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+from .notification_history import NotificationHistory
+
 class PCNotificationManager:
     
     def __init__(self):
@@ -135,7 +141,8 @@ class LinuxDBusNotifier:
     def send_notification(self, title: str, message: str, 
                          app_name: str = "KDE Connect Clone",
                          icon: str = "", timeout: int = 5000,
-                         urgency: int = 1):
+                         urgency: int = 1, replaces_id: int = 0,
+                         call_timeout: Optional[float] = None):
         if not self.available:
             return False
         
@@ -144,57 +151,299 @@ class LinuxDBusNotifier:
                 'urgency': self.dbus.Byte(urgency)
             }
             
+            # dbus-python proxies accept a per-call timeout in seconds
+            call_kwargs = {'timeout': call_timeout} if call_timeout else {}
             notification_id = self.notify_interface.Notify(
                 app_name,      # app_name
-                0,            # replaces_id
+                replaces_id,  # replaces_id
                 icon,         # app_icon
                 title,        # summary
                 message,      # body
                 [],           # actions
                 hints,        # hints
-                timeout       # expire_timeout
+                timeout,      # expire_timeout
+                **call_kwargs
             )
-            return notification_id
+            return int(notification_id)
         except Exception as e:
             print(f"D-Bus notification error: {e}")
             return False
 
 
+# Async notification sender used from the websocket server loop
+class AsyncNotificationService:
+    """
+    Non-blocking notification sender.
+    One worker thread owns the notification backend (and so the single session bus
+    connection). Only one call is in flight at a time; everything queued behind it
+    is coalesced by key, so a slow daemon costs memory per key, not per notification.
+    """
+
+    def __init__(self, backend=None, rate: float = 1.0, burst: int = 3,
+                 call_timeout: float = 2.0, max_tracked: int = 256):
+        self._backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notify')
+        self.rate = rate                # tokens per second per source app
+        self.burst = burst              # max notifications an app can send back to back
+        self.call_timeout = call_timeout
+        self.max_tracked = max_tracked
+        self._pending = OrderedDict()   # key -> notification waiting to be shown
+        self._shown = OrderedDict()     # key -> id of the last notification shown for it
+        self._buckets = {}              # app -> [tokens, last refill time]
+        self._in_flight = False
+        self._wakeup = None
+
+    def notify(self, title: str, message: str, app_name: str = "SyncBridge",
+               key=None, icon: str = "", timeout: int = 5000, urgency: int = 1):
+        """
+        Queue a notification and return immediately.
+        Notifications sharing a key replace each other, both while queued and on screen.
+        """
+        if key is None:
+            key = (app_name, title)
+        self._pending.pop(key, None)
+        self._pending[key] = {
+            'title': title,
+            'message': message,
+            'app_name': app_name,
+            'icon': icon,
+            'timeout': timeout,
+            'urgency': urgency
+        }
+        self._pump()
+
+    def _take_token(self, app_name, now):
+        tokens, last = self._buckets.get(app_name, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[app_name] = [tokens, now]
+            return (1 - tokens) / self.rate
+        self._buckets[app_name] = [tokens - 1, now]
+        return 0
+
+    def _pump(self):
+        if self._in_flight or not self._pending:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        retry_in = None
+        for key, notification in self._pending.items():
+            wait = self._take_token(notification['app_name'], now)
+            if wait == 0:
+                del self._pending[key]
+                self._dispatch(loop, key, notification)
+                return
+            retry_in = wait if retry_in is None else min(retry_in, wait)
+        # Every queued app is rate limited, come back when the first one has a token
+        if self._wakeup is None:
+            self._wakeup = loop.call_later(retry_in, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._pump()
+
+    def _dispatch(self, loop, key, notification):
+        self._in_flight = True
+        replaces_id = self._shown.get(key, 0)
+        future = loop.run_in_executor(self._executor, self._send_blocking, notification, replaces_id)
+        future.add_done_callback(lambda f: self._on_sent(key, f))
+
+    def _on_sent(self, key, future):
+        self._in_flight = False
+        notification_id = None
+        if not future.cancelled():
+            if future.exception() is not None:
+                print(f"Notification worker error: {future.exception()}")
+            else:
+                notification_id = future.result()
+        if notification_id:
+            self._shown.pop(key, None)
+            self._shown[key] = notification_id
+            while len(self._shown) > self.max_tracked:
+                self._shown.popitem(last=False)
+        self._pump()
+
+    def _send_blocking(self, notification, replaces_id):
+        # Runs on the worker thread, the backend is created there on first use
+        if self._backend is None:
+            self._backend = self._create_backend()
+        if isinstance(self._backend, PCNotificationManager):
+            # Fallback backends can't update a notification in place
+            self._backend.send_notification(
+                notification['title'],
+                notification['message'],
+                duration=max(1, notification['timeout'] // 1000)
+            )
+            return None
+        notification_id = self._backend.send_notification(
+            notification['title'],
+            notification['message'],
+            app_name=notification['app_name'],
+            icon=notification['icon'],
+            timeout=notification['timeout'],
+            urgency=notification['urgency'],
+            replaces_id=replaces_id,
+            call_timeout=self.call_timeout
+        )
+        if notification_id is False:
+            # Reconnect on the next call in case the notification daemon restarted
+            self._backend = None
+        return notification_id
+
+    @staticmethod
+    def _create_backend():
+        if platform.system().lower() == "linux":
+            notifier = LinuxDBusNotifier()
+            if notifier.available:
+                return notifier
+        return PCNotificationManager()
+
+    def close(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        self._executor.shutdown(wait=False)
+
+
+# Burst batching for mirrored phone notifications
+class NotificationBatcher:
+    """
+    Merges bursts of phone notifications per app.
+    The first notification from a quiet app is shown right away. Anything else the
+    app sends within its window is only counted, and one summary popup replaces it
+    when the window closes. A burst costs one counter and one timer per app,
+    however many notifications it contains.
+    """
+
+    def __init__(self, service, default_window: float = 2.0, windows: Optional[dict] = None,
+                 max_windows: int = 256):
+        self.service = service
+        self.default_window = default_window
+        self.max_windows = max_windows      # per-app windows a client may configure
+        self.windows = {}                   # app -> window in seconds (0 disables batching)
+        self._bursts = {}                   # app -> state of the burst currently open
+        self.set_windows(windows or {})
+
+    def window_for(self, app_name: str) -> float:
+        return self.windows.get(app_name, self.default_window)
+
+    def set_windows(self, windows: dict):
+        """Set per-app windows, all or none. Raises ValueError past max_windows apps."""
+        added = sum(1 for app_name in windows if app_name not in self.windows)
+        if len(self.windows) + added > self.max_windows:
+            raise ValueError(f"At most {self.max_windows} per-app batching windows")
+        self.windows.update(windows)
+
+    def add(self, app_name: str, title: str, message: str):
+        burst = self._bursts.get(app_name)
+        if burst is not None:
+            burst['pending'] += 1
+            burst['total'] += 1
+            burst['title'] = title
+            burst['message'] = message
+            return
+        self._show(app_name, f"{app_name}: {title}", message)
+        window = self.window_for(app_name)
+        if window > 0:
+            self._bursts[app_name] = {
+                'pending': 0,
+                'total': 1,
+                'title': title,
+                'message': message,
+                'timer': asyncio.get_running_loop().call_later(window, self._close_window, app_name)
+            }
+
+    def _close_window(self, app_name: str):
+        burst = self._bursts[app_name]
+        if burst['pending'] == 0:
+            # Quiet for a whole window, the burst is over
+            del self._bursts[app_name]
+            return
+        self._show(
+            app_name,
+            f"{burst['total']} new notifications from {app_name}",
+            f"{burst['title']}: {burst['message']}"
+        )
+        # Keep the burst open so a continuing flood keeps updating the same summary
+        burst['pending'] = 0
+        burst['timer'] = asyncio.get_running_loop().call_later(
+            self.window_for(app_name), self._close_window, app_name
+        )
+
+    def _show(self, app_name: str, title: str, message: str):
+        # One key per app, so the summary replaces the popup already on screen
+        self.service.notify(title, message, app_name=app_name, key=('phone', app_name))
+
+    def close(self):
+        for burst in self._bursts.values():
+            burst['timer'].cancel()
+        self._bursts.clear()
 
 
 # Notification server for receiving notifications from phone
 class NotificationServer:
     
-    def __init__(self):
-        self.notifier = PCNotificationManager()
-        self.received_notifications = []
+    def __init__(self, history_path=None, history_size: int = 500,
+                 default_window: float = 2.0, windows: Optional[dict] = None, max_batch: int = 100):
+        self.notifier = AsyncNotificationService()
+        self.max_batch = max_batch   # notifications one message may carry
+        self.history_path = history_path
+        self.history_size = history_size
+        self._history = None
+        self._history_lock = threading.Lock()
+        self.batcher = NotificationBatcher(self.notifier, default_window=default_window, windows=windows)
+    
+    @property
+    def history(self) -> NotificationHistory:
+        """The history store, opened on first use. Opening reads the database, so not on the loop."""
+        with self._history_lock:
+            if self._history is None:
+                self._history = NotificationHistory(self.history_path, max_memory=self.history_size)
+            return self._history
     
-    def handle_phone_notification(self, notification_data: dict):
-        title = notification_data.get('title', 'Phone Notification')
-        message = notification_data.get('message', '')
-        app_name = notification_data.get('app', 'Unknown App')
+    async def handle_phone_notification(self, notification_data: dict):
+        return await self.handle_phone_notifications([notification_data])
+
+    async def handle_phone_notifications(self, notifications: list):
+        """
+        Mirror a batch of phone notifications to the desktop.
+        Must be called from the server loop. Returns the number of notifications accepted.
+        Raises ValueError for batches longer than max_batch.
+        """
+        if len(notifications) > self.max_batch:
+            raise ValueError(f"At most {self.max_batch} notifications per message")
+        parsed = []
+        for notification_data in notifications:
+            if not isinstance(notification_data, dict):
+                continue
+            parsed.append((
+                str(notification_data.get('app', 'Unknown App')),
+                str(notification_data.get('title', 'Phone Notification')),
+                str(notification_data.get('message', ''))
+            ))
+        if not parsed:
+            return 0
         
-        # Format the notification
-        formatted_title = f"{app_name}: {title}"
+        # Store for history, one transaction per batch, on a worker thread
+        await asyncio.to_thread(lambda: self.history.add_many(parsed))
         
-        # Send to PC
-        success = self.notifier.send_notification(
-            formatted_title,
-            message,
-            duration=5
-        )
+        # Display through the batching stage
+        for app_name, title, message in parsed:
+            self.batcher.add(app_name, title, message)
         
-        # Store for history
-        if success:
-            self.received_notifications.append({
-                'timestamp': __import__('datetime').datetime.now(),
-                'title': formatted_title,
-                'message': message,
-                'app': app_name
-            })
-        
-        return success
+        return len(parsed)
     
-    def get_notification_history(self):
-        """Get history of received notifications"""
-        return self.received_notifications
\ No newline at end of file
+    def set_batch_window(self, app_name: Optional[str], seconds: float):
+        """Set the burst window for one app, or the default window when app_name is None"""
+        if app_name is None:
+            self.batcher.default_window = seconds
+        else:
+            self.batcher.set_windows({app_name: seconds})
+    
+    async def get_notification_history(self, app: Optional[str] = None, since: Optional[float] = None,
+                                       until: Optional[float] = None, cursor: Optional[str] = None,
+                                       limit: int = 50):
+        """Get a page of received notifications, newest first, and the cursor for the next page"""
+        return await asyncio.to_thread(
+            lambda: self.history.query(app=app, since=since, until=until, cursor=cursor, limit=limit)
+        )
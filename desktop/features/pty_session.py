@@ -0,0 +1,259 @@
+# Interactive terminal sessions (PTY) relayed over the websocket
+import asyncio
+import codecs
+import os
+import signal
+import struct
+import sys
+import uuid
+from typing import Awaitable, Callable, Optional
+
+# PTYs only exist on POSIX systems
+try:
+    import fcntl
+    import pty
+    import termios
+    PTY_SUPPORTED = True
+except ImportError:
+    PTY_SUPPORTED = False
+
+# Runs between setsid (start_new_session) and the shell: makes the PTY the controlling
+# terminal so job control and ^C work, then execs the shell. A preexec_fn would do the
+# same, but isn't safe to run in a child forked from a multithreaded server.
+_CTTY_WRAPPER = (
+    'import fcntl, os, sys, termios; '
+    'fcntl.ioctl(0, termios.TIOCSCTTY, 0); '
+    'os.execvp(sys.argv[1], sys.argv[1:])'
+)
+
+
+class PtySession:
+    """
+    A shell running under a pseudo-terminal.
+    Output is coalesced for up to flush_delay seconds or max_frame bytes before it is
+    sent, instead of one frame per read(). Reading from the terminal pauses while more
+    than `window` bytes are unacknowledged by the client or the send buffer is full,
+    so a command like `yes` is throttled by the connection instead of flooding it.
+    """
+
+    def __init__(self, send: Callable[[dict], Awaitable], shell: Optional[str] = None,
+                 cols: int = 80, rows: int = 24, flush_delay: float = 0.005,
+                 max_frame: int = 16 * 1024, window: Optional[int] = 256 * 1024):
+        self.id = uuid.uuid4().hex
+        self.send = send
+        self.shell = shell or os.environ.get('SHELL', '/bin/sh')
+        self.cols, self.rows = cols, rows
+        self.flush_delay = flush_delay
+        self.max_frame = max_frame
+        self.window = window              # None disables ack-based flow control
+        self.process = None
+        self.exit_code = None
+        self._master = None
+        self._loop = None
+        self._buffer = bytearray()
+        self._pending_input = bytearray()
+        self._unacked = 0
+        self._reading = False
+        self._eof = False
+        self._flush_timer = None
+        self._ready = asyncio.Event()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._writer_task = None
+
+    async def start(self):
+        if not PTY_SUPPORTED:
+            raise RuntimeError("Terminal sessions are not supported on this platform")
+        self._loop = asyncio.get_running_loop()
+        master, slave = pty.openpty()
+        self._set_winsize(slave, self.cols, self.rows)
+        env = dict(os.environ, TERM='xterm-256color', COLUMNS=str(self.cols), LINES=str(self.rows))
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, '-I', '-S', '-c', _CTTY_WRAPPER, self.shell,
+                stdin=slave, stdout=slave, stderr=slave,
+                env=env,
+                start_new_session=True
+            )
+        except BaseException:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        self._master = master
+        os.set_blocking(master, False)
+        self._resume_reading()
+        self._writer_task = asyncio.create_task(self._writer())
+        asyncio.create_task(self._wait_exit())
+
+    def write(self, data: str):
+        """Relay keystrokes to the terminal."""
+        if self._master is None:
+            return
+        self._pending_input += data.encode('utf-8')
+        self._flush_input()
+
+    def resize(self, cols: int, rows: int):
+        self.cols, self.rows = cols, rows
+        if self._master is not None:
+            # The kernel delivers SIGWINCH to the foreground process group
+            self._set_winsize(self._master, cols, rows)
+
+    def ack(self, nbytes: int):
+        """The client has consumed nbytes of output."""
+        self._unacked = max(0, self._unacked - nbytes)
+        self._maybe_resume()
+
+    def close(self):
+        if self.process is not None and self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    @staticmethod
+    def _set_winsize(fd, cols, rows):
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    def _flush_input(self):
+        try:
+            written = os.write(self._master, self._pending_input)
+            del self._pending_input[:written]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._pending_input.clear()
+            return
+        if self._pending_input:
+            # Terminal input queue is full, finish when it drains
+            self._loop.add_writer(self._master, self._on_writable)
+
+    def _on_writable(self):
+        self._loop.remove_writer(self._master)
+        self._flush_input()
+
+    def _pause_reading(self):
+        if self._reading:
+            self._loop.remove_reader(self._master)
+            self._reading = False
+
+    def _resume_reading(self):
+        if not self._reading and not self._eof:
+            self._loop.add_reader(self._master, self._on_readable)
+            self._reading = True
+
+    def _maybe_resume(self):
+        window_open = self.window is None or self._unacked < self.window // 2
+        if window_open and len(self._buffer) < self.max_frame * 4:
+            self._resume_reading()
+
+    def _read_chunk(self):
+        """Move one read() worth of output into the buffer. Returns False when nothing was read."""
+        try:
+            data = os.read(self._master, 65536)
+        except BlockingIOError:
+            return False
+        except OSError:
+            # EIO once the shell and everything attached to the PTY has exited
+            data = b''
+        if not data:
+            self._eof = True
+            self._pause_reading()
+            self._ready.set()
+            return False
+        self._buffer += data
+        if self.window is not None:
+            self._unacked += len(data)
+        return True
+
+    def _on_readable(self):
+        if not self._read_chunk():
+            return
+        if (self.window is not None and self._unacked >= self.window) or len(self._buffer) >= self.max_frame * 4:
+            self._pause_reading()
+        if len(self._buffer) >= self.max_frame:
+            self._ready.set()
+        elif self._flush_timer is None:
+            # Coalesce bursts of small reads into one frame
+            self._flush_timer = self._loop.call_later(self.flush_delay, self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        self._ready.set()
+
+    async def _writer(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._buffer:
+                chunk = bytes(self._buffer[:self.max_frame])
+                del self._buffer[:self.max_frame]
+                await self.send({
+                    'type': 'pty_output',
+                    'sessionId': self.id,
+                    'data': self._decoder.decode(chunk),
+                    'bytes': len(chunk)
+                })
+                self._maybe_resume()
+            if self._eof:
+                return
+
+    async def _wait_exit(self):
+        self.exit_code = await self.process.wait()
+        # Deliver whatever the shell printed last, flow control no longer matters
+        self._pause_reading()
+        while self._read_chunk():
+            pass
+        self._eof = True
+        self._ready.set()
+        await self._writer_task
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._loop.remove_writer(self._master)
+        os.close(self._master)
+        self._master = None
+        await self.send({'type': 'pty_exit', 'sessionId': self.id, 'exitCode': self.exit_code})
+
+
+class PtyManager:
+    """Tracks terminal sessions per client and caps how many each may open."""
+
+    def __init__(self, max_per_client: int = 4):
+        self.max_per_client = max_per_client
+        self._sessions = {}  # owner -> {session_id: PtySession}
+
+    async def open(self, owner, send, cols: int = 80, rows: int = 24, **kwargs) -> PtySession:
+        sessions = self._sessions.setdefault(owner, {})
+        if len(sessions) >= self.max_per_client:
+            raise RuntimeError(f"At most {self.max_per_client} terminal sessions per client")
+
+        async def send_tracked(message):
+            if message['type'] == 'pty_exit':
+                sessions.pop(message['sessionId'], None)
+            await send(message)
+
+        session = PtySession(send_tracked, cols=cols, rows=rows, **kwargs)
+        # Hold the slot while the shell starts, so concurrent opens can't all pass the check
+        sessions[session.id] = session
+        try:
+            await session.start()
+        except BaseException:
+            sessions.pop(session.id, None)
+            raise
+        if self._sessions.get(owner) is not sessions:
+            # close_all() ran while the shell was starting, nobody is left to close it
+            session.close()
+            raise RuntimeError("Connection closed while the terminal was starting")
+        return session
+
+    def has(self, owner, session_id: str) -> bool:
+        return session_id in self._sessions.get(owner, {})
+
+    def get(self, owner, session_id: str) -> PtySession:
+        session = self._sessions.get(owner, {}).get(session_id)
+        if session is None:
+            raise KeyError(f"Unknown terminal session: {session_id}")
+        return session
+
+    def close_all(self, owner):
+        for session in self._sessions.pop(owner, {}).values():
+            session.close()
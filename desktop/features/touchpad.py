@@ -0,0 +1,151 @@
+# Relative touchpad: finger deltas to pointer moves, with acceleration and sub-pixel precision
+import math
+import time
+
+
+class AccelerationCurve:
+    """
+    Gain from touchpad units to screen pixels, by finger speed in units per second:
+    `sensitivity` up to low_speed, rising linearly to sensitivity * (1 + acceleration)
+    at high_speed. Slow strokes stay precise and fast flicks still cross a 4K screen.
+    """
+
+    def __init__(self, sensitivity=1.0, acceleration=2.0, low_speed=150.0, high_speed=1500.0):
+        self.sensitivity = sensitivity
+        self.acceleration = acceleration
+        self.low_speed = low_speed
+        self.high_speed = high_speed
+
+    def gain(self, speed):
+        if speed <= self.low_speed:
+            ramp = 0.0
+        elif speed >= self.high_speed:
+            ramp = 1.0
+        else:
+            ramp = (speed - self.low_speed) / (self.high_speed - self.low_speed)
+        return self.sensitivity * (1 + self.acceleration * ramp)
+
+
+def clamp_to_monitors(x, y, monitors):
+    """The point nearest (x, y) that is on a monitor. monitors are (left, top, width, height)."""
+    best = None
+    for left, top, width, height in monitors:
+        cx = min(max(x, left), left + width - 1)
+        cy = min(max(y, top), top + height - 1)
+        if (cx, cy) == (x, y):
+            return x, y
+        distance = (cx - x) ** 2 + (cy - y) ** 2
+        if best is None or distance < best[0]:
+            best = (distance, cx, cy)
+    return best[1], best[2]
+
+
+def monitor_layout():
+    """(left, top, width, height) of every monitor, from screeninfo when installed, else the primary screen."""
+    try:
+        from screeninfo import get_monitors
+        monitors = [(m.x, m.y, m.width, m.height) for m in get_monitors()]
+        if monitors:
+            return monitors
+    except Exception:
+        pass  # not installed, or no display it understands
+    import pyautogui
+    width, height = pyautogui.size()
+    return [(0, 0, width, height)]
+
+
+class PointerBackend:
+    """
+    Moves the real pointer through pyautogui. pyautogui.moveTo reads the position back
+    on every call, so moves go to the private platform call underneath, which just sets
+    it. That call isn't part of pyautogui's API: if it's missing or fails, moves fall
+    back to pyautogui.moveTo for good.
+    """
+
+    def __init__(self):
+        self._platform_move = True
+
+    def position(self):
+        import pyautogui
+        return tuple(pyautogui.position())
+
+    def move_to(self, x, y):
+        import pyautogui
+        if self._platform_move:
+            move = getattr(getattr(pyautogui, 'platformModule', None), '_moveTo', None)
+            if callable(move):
+                try:
+                    move(x, y)
+                    return
+                except Exception as e:
+                    print(f"⚠️ pyautogui's platform move failed, using moveTo from now on: {e}")
+            self._platform_move = False
+        pyautogui.moveTo(x, y, _pause=False)
+
+
+class Touchpad:
+    """
+    Turns finger deltas into pointer moves. The pointer position and monitor layout
+    are read once per gesture and tracked from then on, so each event is a single
+    move with no position query. Fractions of a pixel carry over to the next event,
+    so slow strokes move the pointer instead of rounding to zero. Moves stop at the
+    edges of the monitors, gaps between differently sized monitors included.
+    """
+
+    def __init__(self, curve=None, backend=None, layout=monitor_layout, clock=time.monotonic,
+                 max_gap=0.1, resync_after=1.0):
+        self.curve = curve or AccelerationCurve()
+        self.backend = backend or PointerBackend()
+        self.layout = layout
+        self.clock = clock
+        self.max_gap = max_gap            # seconds, a longer pause means the finger stopped
+        self.resync_after = resync_after  # seconds without events before reading the position again
+        self.position = None
+        self.monitors = None
+        self._remainder = [0.0, 0.0]
+        self._last = None
+
+    def begin(self):
+        """A new gesture: the pointer may have been moved by other means since the last one."""
+        self.position = None
+        self._remainder = [0.0, 0.0]
+        self._last = None
+
+    def move(self, dx, dy, dt=None):
+        """
+        Move by a finger delta in touchpad units. dt is the seconds since the previous
+        sample, when the client knows it; otherwise arrival times are used.
+        Returns the new pointer position.
+        """
+        now = self.clock()
+        if self._last is not None and now - self._last > self.resync_after:
+            self.begin()
+        if dt is None and self._last is not None:
+            dt = now - self._last
+        self._last = now
+        if self.position is None:
+            self.sync()
+
+        speed = math.hypot(dx, dy) / dt if dt and 0 < dt <= self.max_gap else 0.0
+        gain = self.curve.gain(speed)
+        wanted_x = self._remainder[0] + dx * gain
+        wanted_y = self._remainder[1] + dy * gain
+        step_x, step_y = math.trunc(wanted_x), math.trunc(wanted_y)
+        self._remainder = [wanted_x - step_x, wanted_y - step_y]
+        if step_x == 0 and step_y == 0:
+            return self.position
+
+        x, y = clamp_to_monitors(self.position[0] + step_x, self.position[1] + step_y, self.monitors)
+        # Pushing against an edge shouldn't build up movement to spend on the way back
+        if x != self.position[0] + step_x:
+            self._remainder[0] = 0.0
+        if y != self.position[1] + step_y:
+            self._remainder[1] = 0.0
+        if (x, y) != self.position:
+            self.backend.move_to(x, y)
+            self.position = (x, y)
+        return self.position
+
+    def sync(self):
+        self.monitors = self.layout()
+        self.position = clamp_to_monitors(*self.backend.position(), self.monitors)
@@ -1,14 +1,16 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFrame, QScrollArea)
 from PySide6.QtCore import Qt, QTimer
-from ..server.ws_handler import get_pairing_info, PORT, TOKEN
-from ..utils.qr import QRUtils
+from ..server.ws_handler import get_pairing, get_pairing_info, PORT
 
 class DevicesPage(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, admin=None):
         super().__init__(parent)
+        self.admin = admin   # GUI end of the server's admin channel, see ws_handler.handle_admin()
+        self.admin_requests = 0
         self.devices_layout = QVBoxLayout(self)
         self.devices_layout.setContentsMargins(24, 24, 24, 24)
         self.devices_layout.setSpacing(24)
+        self.shown_token = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -74,22 +76,21 @@ class DevicesPage(QWidget):
         # actions_layout.addWidget(self.show_qr_btn)
 
         # Connection Info
-        pairing_info = get_pairing_info()
-        conn_info = f"""
-        <b>LAN IP:</b> {pairing_info['server_ip']}<br>
-        <b>Port:</b> {PORT}<br>
-        <b>Pairing Token:</b> {TOKEN}
-        """
-        conn_label = QLabel(conn_info)
-        conn_label.setStyleSheet("font-size: 15px; color: #222; background: #f8f9fb; border-radius: 8px; padding: 12px;")
-        conn_label.setTextFormat(Qt.RichText)
-        header_info.addWidget(conn_label)
+        self.conn_label = QLabel()
+        self.conn_label.setStyleSheet("font-size: 15px; color: #222; background: #f8f9fb; border-radius: 8px; padding: 12px;")
+        self.conn_label.setTextFormat(Qt.RichText)
+        header_info.addWidget(self.conn_label)
 
-        # QR Code
-        qr_str = QRUtils.generate_qr_code(pairing_info)
-        qr_label = QLabel(f"<pre style='font-size:8px; color:#222;'>{qr_str}</pre>")
-        qr_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
-        header_info.addWidget(qr_label)
+        # QR Code, rendered once per token by the pairing service
+        self.qr_label = QLabel()
+        self.qr_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        header_info.addWidget(self.qr_label)
+        self.update_pairing()
+
+        # The pairing token rotates, so check for a new one every few seconds
+        self.pairing_timer = QTimer(self)
+        self.pairing_timer.timeout.connect(self.update_pairing)
+        self.pairing_timer.start(5000)
 
         header_layout.addLayout(header_info)
         header_layout.addStretch()
@@ -180,6 +181,22 @@ class DevicesPage(QWidget):
         self.devices_list_layout.setSpacing(8)
         self.show_empty_devices_state()
         self.devices_layout.addWidget(self.devices_list_widget)
+        # Paired Devices Section, each can be revoked
+        paired_title = QLabel("Paired Devices")
+        paired_title.setStyleSheet("""
+            QLabel {
+                font-size: 18px;
+                font-weight: bold;
+                color: #333333;
+            }
+        """)
+        self.devices_layout.addWidget(paired_title)
+        self.paired_list_widget = QWidget()
+        self.paired_list_layout = QVBoxLayout(self.paired_list_widget)
+        self.paired_list_layout.setContentsMargins(0, 0, 0, 0)
+        self.paired_list_layout.setSpacing(8)
+        self.devices_layout.addWidget(self.paired_list_widget)
+        self.refresh_paired()
 
         # Uncomment this to enable discovery and show qr 
         # self.start_discovery_btn.clicked.connect(self.start_discovery)
@@ -188,6 +205,68 @@ class DevicesPage(QWidget):
 
         self.refresh_btn.clicked.connect(self.refresh_devices)
 
+    def update_pairing(self):
+        pairing_info = get_pairing_info()
+        if pairing_info['pairing_token'] == self.shown_token:
+            return
+        self.shown_token = pairing_info['pairing_token']
+        self.conn_label.setText(f"""
+        <b>LAN IP:</b> {pairing_info['server_ip']}<br>
+        <b>Port:</b> {PORT}<br>
+        <b>Pairing Token:</b> {pairing_info['pairing_token']}
+        """)
+        try:
+            qr_str = get_pairing().asset_text('txt')
+        except Exception as e:
+            print(f"❌ Failed to render pairing QR code: {e}")
+            qr_str = ''
+        self.qr_label.setText(f"<pre style='font-size:8px; color:#222;'>{qr_str}</pre>")
+
+    def admin_request(self, request):
+        """Send a request to the server process and wait briefly for its reply, None if there is none."""
+        if self.admin is None:
+            return None
+        self.admin_requests += 1
+        request_id = self.admin_requests
+        try:
+            self.admin.send({**request, 'id': request_id})
+            # Skip replies to earlier requests that timed out
+            while self.admin.poll(2):
+                reply = self.admin.recv()
+                if reply.get('id') == request_id:
+                    return reply
+        except (OSError, EOFError) as e:
+            print(f"❌ Admin request to the server failed: {e}")
+        return None
+
+    def refresh_paired(self):
+        for i in reversed(range(self.paired_list_layout.count())):
+            widget = self.paired_list_layout.itemAt(i).widget()
+            if widget:
+                widget.setParent(None)
+        reply = self.admin_request({'action': 'paired_clients'})
+        clients = reply.get('clients', []) if reply else []
+        if not clients:
+            self.paired_list_layout.addWidget(QLabel("No paired devices" if reply else "Server not reachable"))
+        for client in clients:
+            row = QFrame()
+            row_layout = QHBoxLayout(row)
+            status = "🟢 Connected" if client['connected'] else "🔴 Disconnected"
+            row_layout.addWidget(QLabel(f"{client['name'] or client['clientId']}  ·  {status}"))
+            row_layout.addStretch()
+            revoke_btn = QPushButton("Revoke")
+            revoke_btn.setStyleSheet("background-color: #f44336; color: white; border: none; padding: 6px 12px; border-radius: 4px;")
+            revoke_btn.clicked.connect(lambda checked=False, client_id=client['clientId']: self.revoke(client_id))
+            row_layout.addWidget(revoke_btn)
+            self.paired_list_layout.addWidget(row)
+
+    def revoke(self, client_id):
+        """Forget a paired device's credential and disconnect it; it has to scan the QR code again."""
+        reply = self.admin_request({'action': 'revoke_client', 'clientId': client_id})
+        if not reply or not reply.get('revoked'):
+            print(f"❌ Failed to revoke device {client_id}: {reply}")
+        self.refresh_paired()
+
     def show_empty_devices_state(self):
         for i in reversed(range(self.devices_list_layout.count())):
             widget = self.devices_list_layout.itemAt(i).widget()
@@ -362,3 +441,4 @@ class DevicesPage(QWidget):
     def refresh_devices(self):
         self.found_value.setText("0")
         self.show_empty_devices_state()
+        self.refresh_paired()
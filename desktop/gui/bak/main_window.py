@@ -3,7 +3,7 @@ import sys
 from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QFrame, QVBoxLayout, QStackedWidget, QLabel, QPushButton, QScrollArea
 from PySide6.QtCore import Qt
 
-from multiprocessing import Process, Event
+from multiprocessing import Process, Event, Pipe
 from ..server.ws_handler import run_server 
 import asyncio
 
@@ -15,8 +15,10 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.stop_event = Event()
+        # The devices page lists and revokes paired clients through the server's admin channel
+        self.admin, server_admin = Pipe()
         # starting a true separate process for websocket
-        self.ws_process = Process(target=run_server, args=(self.stop_event,))
+        self.ws_process = Process(target=run_server, args=(self.stop_event, server_admin))
         self.ws_process.start()
 
 
@@ -45,7 +47,7 @@ class MainWindow(QMainWindow):
         # Main content area (stacked widget)
         self.main_content = QStackedWidget()
         self.dashboard_page = DashboardPage()
-        self.devices_page = DevicesPage()
+        self.devices_page = DevicesPage(admin=self.admin)
         self.file_transfer_page = FileTransferWidget()
         self.main_content.addWidget(self.dashboard_page)
         self.main_content.addWidget(self.devices_page)
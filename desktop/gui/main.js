@@ -473,6 +473,7 @@ app.whenReady().then(async () => {
   createMenu();
   createWindow();
   createTray();
+  watchPairingQr();
   // startPythonServer(); // Removed as per edit hint
   
   app.on('activate', () => {
@@ -782,6 +783,26 @@ ipcMain.handle('test-settings', () => {
   }
 }); 
 
+// The server renames a new QR code over assets/pairing_qr.png whenever the
+// pairing token rotates; tell the renderer so it reloads the image
+function watchPairingQr() {
+  const assetsDir = path.resolve(__dirname, 'assets');
+  let pending;
+  try {
+    fs.watch(assetsDir, (eventType, filename) => {
+      if (filename !== 'pairing_qr.png') return;
+      clearTimeout(pending);
+      pending = setTimeout(() => {
+        if (mainWindow) {
+          mainWindow.webContents.send('qr-updated', Date.now());
+        }
+      }, 200);
+    });
+  } catch (error) {
+    console.error('Failed to watch the pairing QR code:', error);
+  }
+}
+
 ipcMain.handle('get-qr-path', () => {
   // Return the absolute path to the QR code in the assets directory within gui
   return path.resolve(__dirname, 'assets/pairing_qr.png');
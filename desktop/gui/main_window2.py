@@ -3,8 +3,8 @@ import sys
 from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QFrame, QVBoxLayout, QStackedWidget, QLabel, QPushButton
 from PySide6.QtCore import Qt
 
-from multiprocessing import Process, Event
-from ..server.ws_handler import run_server 
+from multiprocessing import Process, Event, Pipe
+from ..server.ws_handler import run_server, SHUTDOWN_DEADLINE, CLOSE_TIMEOUT
 import asyncio
 
 from .dashboard import DashboardPage
@@ -15,8 +15,10 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.stop_event = Event()
+        # The devices page lists and revokes paired clients through the server's admin channel
+        self.admin, server_admin = Pipe()
         # starting a true separate process for websocket
-        self.ws_process = Process(target=run_server, args=(self.stop_event,))
+        self.ws_process = Process(target=run_server, args=(self.stop_event, server_admin))
         self.ws_process.start()
 
 
@@ -45,7 +47,7 @@ class MainWindow(QMainWindow):
         # Main content area (stacked widget)
         self.main_content = QStackedWidget()
         self.dashboard_page = DashboardPage()
-        self.devices_page = DevicesPage()
+        self.devices_page = DevicesPage(admin=self.admin)
         self.file_transfer_page = FileTransferWidget()
         self.main_content.addWidget(self.dashboard_page)
         self.main_content.addWidget(self.devices_page)
@@ -101,9 +103,9 @@ class MainWindow(QMainWindow):
         self.main_content.setCurrentIndex(2)
 
     def closeEvent(self, event):
-        # Signal the websocket process to close
+        # Signal the websocket process to close, it lets in-flight uploads finish first
         self.stop_event.set()
-        self.ws_process.join(timeout=5)
+        self.ws_process.join(timeout=SHUTDOWN_DEADLINE + CLOSE_TIMEOUT)
         super().closeEvent(event)
 
 def main():
@@ -48,6 +48,7 @@ contextBridge.exposeInMainWorld('electronAPI', {
   onMessageReceived: (callback) => ipcRenderer.on('message-received', callback),
   onTransferProgress: (callback) => ipcRenderer.on('transfer-progress', callback),
   onTrayAction: (callback) => ipcRenderer.on('tray-action', callback),
+  onQrUpdated: (callback) => ipcRenderer.on('qr-updated', callback),
   
   // Remove listeners
   removeAllListeners: (channel) => ipcRenderer.removeAllListeners(channel),
@@ -6,8 +6,9 @@ const QRCode = () => {
   const [localIP, setLocalIP] = useState('');
   const [qrData, setQrData] = useState('');
   const [isLoading, setIsLoading] = useState(false);
-  // Directly use the static path to the QR code image in the assets folder
+  // The server replaces this image whenever the pairing token rotates
   const qrPath = 'assets/pairing_qr.png';
+  const [qrVersion, setQrVersion] = useState(Date.now());
 
   useEffect(() => {
     const getIP = async () => {
@@ -33,6 +34,13 @@ const QRCode = () => {
     getIP();
   }, []);
 
+  useEffect(() => {
+    if (!window.electronAPI?.onQrUpdated) return;
+    // Cache-busting reload of the QR image after a rotation
+    window.electronAPI.onQrUpdated((event, version) => setQrVersion(version));
+    return () => window.electronAPI.removeAllListeners('qr-updated');
+  }, []);
+
   const refreshQR = async () => {
     setIsLoading(true);
     try {
@@ -40,11 +48,9 @@ const QRCode = () => {
         const ip = await window.electronAPI.getLocalIP();
         setLocalIP(ip);
         setQrData(`http://${ip}:3000`);
-        // Force reload the QR image by updating the timestamp
-        // window.electronAPI.getQrPath().then((path) => {
-        //   setQrPath(`file://${path}?t=${Date.now()}`);
-        // });
       }
+      // Force reload the QR image by updating the timestamp
+      setQrVersion(Date.now());
     } catch (error) {
       console.error('Failed to refresh QR:', error);
     } finally {
@@ -85,7 +91,7 @@ const QRCode = () => {
             <div className="relative">
               <div className="w-48 h-48 sm:w-64 sm:h-64 rounded-xl border-2 border-gray-200 overflow-hidden">
                 <img
-                  src={qrPath}
+                  src={`${qrPath}?t=${qrVersion}`}
                   alt="Pairing QR"
                   style={{ width: 256, height: 256 }}
                 />
@@ -0,0 +1,123 @@
+# Local addresses clients can reach the server on, and racing connections to them
+import asyncio
+import ipaddress
+import socket
+from typing import Awaitable, Callable, List, Optional
+
+# Interfaces of containers, VMs and VPNs, usually not reachable from a phone on the LAN
+VIRTUAL_PREFIXES = (
+    'docker', 'br-', 'veth', 'virbr', 'vmnet', 'vboxnet', 'lxc', 'lxd', 'cni', 'flannel', 'podman',
+    'vethernet', 'tun', 'tap', 'utun', 'wg', 'zt', 'tailscale', 'ham', 'awdl', 'llw', 'anpi',
+)
+
+
+def primary_address(family=socket.AF_INET) -> Optional[str]:
+    """The address of the interface the default route goes out of. Connecting UDP sends nothing."""
+    target = '8.8.8.8' if family == socket.AF_INET else '2001:4860:4860::8888'
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as s:
+            s.connect((target, 80))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def _interface_addresses():
+    """(interface name, address) for every interface that is up; None for the name without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        # Without psutil, whatever the hostname resolves to
+        try:
+            infos = socket.getaddrinfo(socket.gethostname(), None)
+        except OSError:
+            return []
+        return [(None, info[4][0]) for info in infos if info[0] in (socket.AF_INET, socket.AF_INET6)]
+    stats = psutil.net_if_stats()
+    found = []
+    for name, addrs in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+        for addr in addrs:
+            if addr.family in (socket.AF_INET, socket.AF_INET6):
+                found.append((name, addr.address))
+    return found
+
+
+def candidate_addresses(limit: int = 6) -> List[str]:
+    """
+    Addresses to advertise, best first: the default-route interfaces, then other
+    IPv4 and IPv6 addresses on physical interfaces, then container/VPN interfaces.
+    Loopback, link-local and multicast addresses are left out unless nothing else exists.
+    """
+    primary = {primary_address(socket.AF_INET), primary_address(socket.AF_INET6)}
+    ranked = {}
+    for order, (name, address) in enumerate(_interface_addresses()):
+        address = address.split('%')[0]   # IPv6 scope
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            continue
+        if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_unspecified:
+            continue
+        virtual = name is not None and name.lower().startswith(VIRTUAL_PREFIXES)
+        if address in primary:
+            rank = 0
+        elif virtual:
+            rank = 3
+        else:
+            rank = 1 if ip.version == 4 else 2
+        if address not in ranked or (rank, order) < ranked[address]:
+            ranked[address] = (rank, order)
+    candidates = sorted(ranked, key=ranked.get)[:limit]
+    return candidates or ['127.0.0.1']
+
+
+def candidate_urls(candidates: List[str], port: int, scheme: str = 'ws') -> List[str]:
+    return [f"{scheme}://[{address}]:{port}" if ':' in address else f"{scheme}://{address}:{port}"
+            for address in candidates]
+
+
+async def race_connect(urls: List[str], connect: Callable[[str], Awaitable], stagger: float = 0.25,
+                       timeout: float = 10.0):
+    """
+    Reference for clients: connect to the first candidate that answers, happy-eyeballs
+    style (RFC 8305). Attempts start in order, the next one `stagger` seconds after
+    the previous or as soon as it fails, and the first to connect wins; the rest are
+    cancelled or closed. Returns (url, connection). Raises the last error if all fail.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    attempts = {}      # task -> url
+    remaining = list(urls)
+    last_error = None
+    winner = None
+    try:
+        while winner is None and (remaining or attempts):
+            if remaining:
+                url = remaining.pop(0)
+                attempts[asyncio.ensure_future(connect(url))] = url
+            wait = min(stagger, deadline - loop.time()) if remaining else deadline - loop.time()
+            if wait <= 0:
+                break
+            done, _ = await asyncio.wait(list(attempts), timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = attempts.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif winner is None:
+                    winner = (url, task.result())
+                else:
+                    await task.result().close()
+    finally:
+        for task in attempts:
+            task.cancel()
+        for task in attempts:
+            try:
+                connection = await task
+            except BaseException:
+                continue
+            await connection.close()
+    if winner is None:
+        raise last_error or asyncio.TimeoutError(f"No candidate answered within {timeout} s")
+    return winner
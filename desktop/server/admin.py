@@ -0,0 +1,47 @@
+# Requests from the desktop GUI, which runs the server in a child process
+import asyncio
+import threading
+from typing import Awaitable, Callable
+
+
+class AdminChannel:
+    """
+    Answers requests the GUI sends over a multiprocessing Connection (one end of a
+    Pipe), such as listing or revoking paired clients. A thread blocks in recv() and
+    hands each request to the loop, so nothing polls; the reply goes back over the
+    same connection. handle(request) runs on the loop and returns the reply.
+    """
+
+    def __init__(self, conn, handle: Callable[[dict], Awaitable[dict]]):
+        self.conn = conn
+        self.handle = handle
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._serve, daemon=True, name='admin-channel')
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                request = self.conn.recv()
+            except (EOFError, OSError):
+                return   # the GUI went away
+            try:
+                reply = asyncio.run_coroutine_threadsafe(self._answer(request), self._loop).result()
+            except Exception:
+                return   # the loop has finished or is shutting down
+            if isinstance(request, dict) and 'id' in request:
+                # Lets the GUI match replies to requests that it gave up waiting for
+                reply = {**reply, 'id': request['id']}
+            try:
+                self.conn.send(reply)
+            except (OSError, ValueError):
+                return
+
+    async def _answer(self, request):
+        if not isinstance(request, dict):
+            return {'type': 'error', 'message': 'Admin requests are dicts'}
+        try:
+            return await self.handle(request)
+        except Exception as e:
+            print(f"❌ Error handling admin request {request.get('action')}: {e}")
+            return {'type': 'error', 'action': request.get('action'), 'message': str(e)}
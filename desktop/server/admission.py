@@ -0,0 +1,186 @@
+# Admission control: connection caps, idle timeouts and per-client rate and memory limits
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Sustained messages per second and burst size per message type, '*' covers the rest
+DEFAULT_RATES = {
+    'remote_input': (200, 400),
+    'input_batch': (60, 120),
+    # Seconds of timed input_batch playback, which holds the input thread for everyone
+    'input_timed': (0.5, 2.0),
+    'pty_input': (200, 400),
+    'presentation': (20, 40),
+    'media': (20, 40),
+    'file_chunk': (400, 800),
+    'file_start': (5, 20),
+    'command': (5, 20),
+    'job_submit': (2, 10),
+    'pty_open': (1, 4),
+    # Guessing the pairing token must stay slow
+    'pair': (0.5, 5),
+    'resume': (0.5, 5),
+    '*': (50, 100),
+}
+
+# Counted per client address instead of per connection, so reconnecting doesn't reset them
+PER_ADDRESS = ('pair', 'resume')
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average and bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` will be available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class ClientLimits:
+    """
+    Limits for one connection: a token bucket per message type, created on first use,
+    and a quota on the bytes the server holds for it (messages waiting to be handled,
+    uploads kept in memory). Buckets for PER_ADDRESS types live in `address_buckets`
+    when given, which all connections from the same address share.
+    """
+
+    def __init__(self, rates: Dict[str, Tuple[float, float]], memory_quota: int,
+                 clock: Callable[[], float] = time.monotonic,
+                 address_buckets: Optional[Dict[str, TokenBucket]] = None):
+        self.rates = rates
+        self.memory_quota = memory_quota
+        self.memory_used = 0
+        self.clock = clock
+        self.throttled = 0
+        self._buckets = {}
+        self._address_buckets = address_buckets
+
+    def check(self, msg_type: str, cost: float = 1) -> Optional[float]:
+        """Count a message against its type's rate. Returns None if allowed, else seconds to wait."""
+        buckets = self._buckets
+        if msg_type in PER_ADDRESS and self._address_buckets is not None:
+            buckets = self._address_buckets
+        bucket = buckets.get(msg_type)
+        if bucket is None:
+            rate, burst = self.rates.get(msg_type) or self.rates['*']
+            bucket = buckets[msg_type] = TokenBucket(rate, burst, clock=self.clock)
+        if bucket.take(cost):
+            return None
+        self.throttled += 1
+        return bucket.retry_after(cost)
+
+    def reserve(self, nbytes: int) -> bool:
+        """Charge nbytes against the memory quota, False (and nothing charged) if it would exceed it."""
+        if self.memory_used + nbytes > self.memory_quota:
+            self.throttled += 1
+            return False
+        self.memory_used += nbytes
+        return True
+
+    def release(self, nbytes: int):
+        self.memory_used -= nbytes
+
+
+class AdmissionControl:
+    """
+    Decides which connections are accepted and hands out per-client limits, so one
+    buggy or hostile client can't starve the others.
+    """
+
+    def __init__(self, max_connections: int = 64, max_per_client: int = 8,
+                 rates: Optional[Dict[str, Tuple[float, float]]] = None,
+                 memory_quota: int = 32 * 1024 * 1024, max_addresses: int = 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_connections = max_connections
+        self.max_per_client = max_per_client   # connections from one address
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.memory_quota = memory_quota
+        self.max_addresses = max_addresses
+        self.clock = clock
+        self.connections = {}                  # client address -> open connections
+        self.address_buckets = {}              # client address -> PER_ADDRESS type -> bucket
+
+    def admit(self, client_ip) -> Optional[str]:
+        """Count a new connection. Returns None if admitted, else why it was refused."""
+        if sum(self.connections.values()) >= self.max_connections:
+            return f"Server is at its limit of {self.max_connections} connections"
+        if self.connections.get(client_ip, 0) >= self.max_per_client:
+            return f"At most {self.max_per_client} connections per client"
+        self.connections[client_ip] = self.connections.get(client_ip, 0) + 1
+        return None
+
+    def release(self, client_ip):
+        """Forget an admitted connection once it has closed."""
+        remaining = self.connections.get(client_ip, 0) - 1
+        if remaining > 0:
+            self.connections[client_ip] = remaining
+        else:
+            self.connections.pop(client_ip, None)
+
+    def limits(self, client_ip=None) -> ClientLimits:
+        """Limits for a new connection from client_ip, sharing its address's PER_ADDRESS buckets."""
+        if client_ip is None:
+            return ClientLimits(self.rates, self.memory_quota, clock=self.clock)
+        buckets = self.address_buckets.get(client_ip)
+        if buckets is None:
+            if len(self.address_buckets) >= self.max_addresses:
+                self._forget_rested()
+            buckets = self.address_buckets[client_ip] = {}
+        return ClientLimits(self.rates, self.memory_quota, clock=self.clock, address_buckets=buckets)
+
+    def _forget_rested(self):
+        # Buckets that have refilled are no different from new ones, so dropping them loses
+        # nothing. If every address is still draining, drop the oldest to stay bounded
+        for address, buckets in list(self.address_buckets.items()):
+            if address not in self.connections and all(
+                    bucket.retry_after(bucket.burst) == 0 for bucket in buckets.values()):
+                del self.address_buckets[address]
+        while len(self.address_buckets) >= self.max_addresses:
+            del self.address_buckets[next(iter(self.address_buckets))]
+
+
+class IdleTimer:
+    """
+    Calls on_idle once touch() hasn't been called for `timeout` seconds.
+    touch() only records the time; the timer re-arms itself when it fires early,
+    so busy connections don't reschedule a timer for every message.
+    """
+
+    def __init__(self, timeout: float, on_idle: Callable[[], None]):
+        self.timeout = timeout
+        self.on_idle = on_idle
+        self._loop = asyncio.get_running_loop()
+        self._last = self._loop.time()
+        self._handle = self._loop.call_later(timeout, self._check)
+
+    def touch(self):
+        self._last = self._loop.time()
+
+    def cancel(self):
+        self._handle.cancel()
+
+    def _check(self):
+        remaining = self._last + self.timeout - self._loop.time()
+        if remaining > 0:
+            self._handle = self._loop.call_later(remaining, self._check)
+        else:
+            self.on_idle()
@@ -0,0 +1,207 @@
+# Push-based clipboard sync between the desktop and paired clients
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from ..features import send_clipboard, recieve_clipboard
+from ..features.clipboard import (
+    ClipboardWatcher, clipboard_hash, get_clipboard_mimes, read_clipboard, write_clipboard,
+    transcode_image, IMAGE_FORMATS, SUPPORTED_MIMES, TEXT_MIME
+)
+
+# Clipboard text up to this size travels inline in JSON, anything bigger or binary goes in chunks
+INLINE_LIMIT = 64 * 1024
+
+
+def check_mime(mime):
+    if mime not in SUPPORTED_MIMES:
+        raise ValueError(f"Unsupported clipboard type {mime!r}, use one of {', '.join(SUPPORTED_MIMES)}")
+
+
+class ClipboardSync:
+    """
+    One clipboard watcher for the whole server. A desktop clipboard change is
+    serialized once and queued on every paired session. Content a client has just
+    set is not echoed back to it, and writes that would not change the clipboard
+    are skipped.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.clients = set()
+        self.current_text = None
+        self.current_hash = None
+        self._loop = None
+        self._watcher = ClipboardWatcher(self._on_watcher_change, interval=interval)
+        self._stopping = []     # watcher threads told to stop, joined by close()
+        self._image_pool = None
+        self._tasks = set()     # broadcasts of local changes still running
+
+    @property
+    def watching(self):
+        return self._loop is not None
+
+    def add_client(self, session):
+        self.clients.add(session)
+        if self._loop is None:
+            # The watcher only runs while someone is listening
+            self._loop = asyncio.get_running_loop()
+            self._watcher.start()
+
+    def remove_client(self, session):
+        self.clients.discard(session)
+        if not self.clients:
+            self._stop_watching()
+
+    async def close(self):
+        """Stop watching and wait, off the loop, for the watcher thread to exit."""
+        self.clients.clear()
+        self._stop_watching()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        threads, self._stopping = self._stopping, []
+        for thread in threads:
+            await asyncio.to_thread(thread.join, 2)
+        if self._image_pool is not None:
+            pool, self._image_pool = self._image_pool, None
+            await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+    def _stop_watching(self):
+        if self._loop is None:
+            return
+        # Doesn't wait: the thread may be in the middle of reading the clipboard
+        thread = self._watcher.stop()
+        self._stopping = [stopping for stopping in self._stopping if stopping.is_alive()]
+        if thread is not None:
+            self._stopping.append(thread)
+        self._loop = None
+        self.current_text = None
+        self.current_hash = None
+
+    async def get(self):
+        """Current clipboard text, from the watcher's cache when it is running."""
+        if self.watching and self.current_hash is not None:
+            return self.current_text
+        return await asyncio.to_thread(send_clipboard)
+
+    async def read(self, mime=TEXT_MIME, max_dimension=None, image_format='PNG'):
+        """
+        Read clipboard content as (bytes, mime), or (None, mime) if that type isn't offered.
+        Images are downscaled and re-encoded in a worker process when max_dimension is given.
+        Raises ValueError for an unsupported mime, size or format, or an image that can't
+        be converted.
+        """
+        check_mime(mime)
+        if max_dimension is not None and (isinstance(max_dimension, bool) or not isinstance(max_dimension, int)
+                                          or max_dimension <= 0):
+            raise ValueError('maxDimension must be a positive integer')
+        if not isinstance(image_format, str) or image_format.upper() not in IMAGE_FORMATS:
+            raise ValueError(f"imageFormat must be one of {', '.join(IMAGE_FORMATS)}")
+        if mime == TEXT_MIME:
+            text = await self.get()
+            return (None if text is None else text.encode('utf-8')), mime
+        payload = await asyncio.to_thread(read_clipboard, mime)
+        if payload is not None and mime.startswith('image/') and max_dimension:
+            if self._image_pool is None:
+                self._image_pool = ProcessPoolExecutor(max_workers=1)
+            try:
+                payload, mime = await asyncio.get_running_loop().run_in_executor(
+                    self._image_pool, transcode_image, payload, max_dimension, image_format.upper()
+                )
+            except Exception as e:
+                raise ValueError(f'Could not convert the clipboard image: {e}')
+        return payload, mime
+
+    async def set_from_client(self, session, text):
+        """Apply clipboard content sent by a client. Returns False if nothing changed."""
+        digest = clipboard_hash(text)
+        if self.watching and digest == self.current_hash:
+            return False
+        # Remember first so the watcher sees a known hash when the write lands
+        previous = self._remember(text, digest)
+        try:
+            await asyncio.to_thread(recieve_clipboard, text)
+        except Exception:
+            self._remember(*previous)
+            raise
+        # Other clients get it now, the client that set it gets no echo
+        await self._broadcast(text, digest, exclude=session)
+        return True
+
+    async def set_binary_from_client(self, session, payload, mime):
+        """Apply clipboard content that arrived as a chunked transfer. Raises ValueError for an unsupported mime."""
+        check_mime(mime)
+        if mime == TEXT_MIME:
+            return await self.set_from_client(session, payload.decode('utf-8', 'replace'))
+        # Non-text content reads back as empty text, which is what the watcher will see
+        previous = self._remember('', clipboard_hash(''))
+        try:
+            written = await asyncio.to_thread(write_clipboard, payload, mime)
+        except Exception as e:
+            print(f"❌ Error writing {mime} to the clipboard: {e}")
+            written = False
+        if not written:
+            # The clipboard still holds what it held before
+            self._remember(*previous)
+            return False
+        await self._announce(clipboard_hash(payload), [mime], len(payload), exclude=session)
+        return True
+
+    def _remember(self, text, digest):
+        """Record the clipboard's content, returning what was recorded before."""
+        previous = (self.current_text, self.current_hash)
+        self.current_text = text
+        self.current_hash = digest
+        self._watcher.last_hash = digest
+        return previous
+
+    def _on_watcher_change(self, text, digest):
+        # Called on the watcher thread
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._on_local_change, text, digest)
+
+    def _on_local_change(self, text, digest):
+        if digest == self.current_hash:
+            return
+        self._remember(text, digest)
+        # Kept until done, the loop only holds weak references to tasks
+        task = asyncio.create_task(self._broadcast(text, digest))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_broadcast_done)
+
+    def _on_broadcast_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Failed to broadcast clipboard change: {task.exception()}")
+
+    async def _broadcast(self, text, digest, exclude=None):
+        size = len(text.encode('utf-8')) if text else 0
+        if not text or size > INLINE_LIMIT:
+            # Too big for one frame, or not text at all: tell clients what they can fetch
+            mimes = [TEXT_MIME] if text else await asyncio.to_thread(get_clipboard_mimes)
+            await self._announce(digest, mimes, size, exclude=exclude)
+            return
+        frame = json.dumps({
+            'type': 'clipboard_update',
+            'data': text,
+            'mime': TEXT_MIME,
+            'hash': digest
+        })
+        await self._send_all(frame, exclude)
+
+    async def _announce(self, digest, mimes, size, exclude=None):
+        frame = json.dumps({
+            'type': 'clipboard_update',
+            'data': None,
+            'mimes': mimes,
+            'size': size,
+            'hash': digest
+        })
+        await self._send_all(frame, exclude)
+
+    async def _send_all(self, frame, exclude):
+        for session in list(self.clients):
+            if session is not exclude:
+                session.push(frame)
@@ -0,0 +1,223 @@
+# LAN discovery: UDP broadcast responder with signed replies, optional mDNS advertisement
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .admission import TokenBucket
+
+DISCOVERY_PORT = 9001
+MDNS_SERVICE = '_syncbridge._tcp.local.'
+MAX_REQUEST = 512   # bytes, discovery requests are tiny JSON objects
+
+
+class DeviceIdentity:
+    """
+    This desktop's stable ID and the key its discovery replies are signed with,
+    kept across restarts. Paired clients get both, so after the desktop's address
+    changes they can find it again and check the reply came from it. Every paired
+    client knows the key, so it proves nothing to the server: pairing again takes
+    the client's own credential, see PairedClients.
+    """
+
+    def __init__(self, device_id: str, key: str):
+        self.device_id = device_id
+        self.key = key   # hex
+
+    @classmethod
+    def load(cls, path: Path) -> 'DeviceIdentity':
+        """Read the identity from path, creating it on first run."""
+        path = Path(path)
+        try:
+            stored = json.loads(path.read_text())
+            return cls(stored['deviceId'], stored['key'])
+        except (OSError, ValueError, KeyError):
+            pass
+        identity = cls(uuid.uuid4().hex, secrets.token_hex(32))
+        temp_path = path.with_suffix('.tmp')
+        # Only the owner may read the key
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'deviceId': identity.device_id, 'key': identity.key}, f)
+        os.replace(temp_path, path)
+        return identity
+
+
+def _signature(key: str, payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hmac.new(bytes.fromhex(key), canonical, hashlib.sha256).hexdigest()
+
+
+def sign_blob(key: str, payload: dict) -> dict:
+    """Return payload with an HMAC-SHA256 'sig' over its canonical JSON."""
+    return {**payload, 'sig': _signature(key, payload)}
+
+
+def verify_blob(key: str, blob: dict) -> bool:
+    payload = {name: value for name, value in blob.items() if name != 'sig'}
+    return isinstance(blob.get('sig'), str) and hmac.compare_digest(blob['sig'], _signature(key, payload))
+
+
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    """
+    Answers {"type": "discover", "nonce": ...} datagrams with the server's connection
+    details, signed with the device key and echoing the nonce so replies can't be
+    replayed. A request naming another deviceId is ignored, so a client looking for
+    its own desktop only hears back from it. Replies are rate limited per sender,
+    so the responder can't be used to flood a spoofed address.
+    """
+
+    def __init__(self, identity: DeviceIdentity, info: Callable[[], dict],
+                 rate: float = 10, burst: float = 20):
+        self.identity = identity
+        self.info = info            # connection details to advertise: name, port, addresses...
+        self.rate = rate
+        self.burst = burst
+        self.answered = 0
+        self.transport = None
+        self._buckets = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) > MAX_REQUEST:
+            return
+        try:
+            request = json.loads(data)
+        except ValueError:
+            return
+        if not isinstance(request, dict) or request.get('type') != 'discover':
+            return
+        nonce = request.get('nonce')
+        if not isinstance(nonce, str) or not 0 < len(nonce) <= 64:
+            return
+        wanted = request.get('deviceId')
+        if wanted is not None and wanted != self.identity.device_id:
+            return
+        if not self._allow(addr[0]):
+            return
+        reply = sign_blob(self.identity.key, {
+            'type': 'discover_response',
+            'deviceId': self.identity.device_id,
+            'nonce': nonce,
+            'ts': int(time.time()),
+            **self.info()
+        })
+        self.transport.sendto(json.dumps(reply).encode('utf-8'), addr)
+        self.answered += 1
+
+    def _allow(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            if len(self._buckets) >= 1024:
+                self._buckets.clear()
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.take()
+
+
+async def start_responder(identity: DeviceIdentity, info: Callable[[], dict],
+                          host: str = '0.0.0.0', port: int = DISCOVERY_PORT):
+    """Listen for discovery requests. Returns (transport, responder); close the transport to stop."""
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(
+        lambda: DiscoveryResponder(identity, info),
+        local_addr=(host, port),
+        family=socket.AF_INET,
+        allow_broadcast=True
+    )
+
+
+class _DiscoveryClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.replies = []
+        self.arrived = asyncio.Event()
+
+    def datagram_received(self, data, addr):
+        try:
+            reply = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(reply, dict):
+            self.replies.append((reply, addr))
+            self.arrived.set()
+
+
+async def discover(address: str = '255.255.255.255', port: int = DISCOVERY_PORT, timeout: float = 0.5,
+                   device_id: Optional[str] = None, key: Optional[str] = None) -> List[dict]:
+    """
+    Broadcast a discovery request and collect replies for `timeout` seconds.
+    With `key` (from pairing) only replies signed with it are returned, and the
+    search ends at the first one. Each reply gets 'address', where it came from.
+    """
+    loop = asyncio.get_running_loop()
+    nonce = secrets.token_hex(16)
+    transport, client = await loop.create_datagram_endpoint(
+        _DiscoveryClient, local_addr=('0.0.0.0', 0), family=socket.AF_INET, allow_broadcast=True
+    )
+    request = {'type': 'discover', 'nonce': nonce}
+    if device_id is not None:
+        request['deviceId'] = device_id
+    found = []
+    try:
+        transport.sendto(json.dumps(request).encode('utf-8'), (address, port))
+        deadline = loop.time() + timeout
+        while not (key is not None and found):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(client.arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            client.arrived.clear()
+            replies, client.replies = client.replies, []
+            for reply, addr in replies:
+                if reply.get('type') != 'discover_response' or reply.get('nonce') != nonce:
+                    continue
+                if key is not None and not verify_blob(key, reply):
+                    continue
+                found.append({**reply, 'address': addr[0]})
+    finally:
+        transport.close()
+    return found
+
+
+class MdnsAdvertisement:
+    """A registered DNS-SD service, unregistered by close()."""
+
+    def __init__(self, zeroconf, info):
+        self.zeroconf = zeroconf
+        self.info = info
+
+    async def close(self):
+        await self.zeroconf.async_unregister_service(self.info)
+        await self.zeroconf.async_close()
+
+
+async def advertise_mdns(identity: DeviceIdentity, name: str, port: int,
+                         addresses: List[str]) -> Optional[MdnsAdvertisement]:
+    """Advertise the server over mDNS/DNS-SD. Returns None when zeroconf isn't installed."""
+    try:
+        from zeroconf import ServiceInfo
+        from zeroconf.asyncio import AsyncZeroconf
+    except ImportError:
+        return None
+    info = ServiceInfo(
+        MDNS_SERVICE,
+        f'{name}-{identity.device_id[:8]}.{MDNS_SERVICE}',
+        addresses=[ipaddress.ip_address(address).packed for address in addresses],
+        port=port,
+        properties={'deviceId': identity.device_id}
+    )
+    zeroconf = AsyncZeroconf()
+    await zeroconf.async_register_service(info)
+    return MdnsAdvertisement(zeroconf, info)
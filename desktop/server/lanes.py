@@ -0,0 +1,117 @@
+# Priority lanes multiplexed over one websocket connection
+import asyncio
+import contextvars
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+# Highest priority first
+LANES = ('input', 'control', 'bulk')
+
+# Lane of the message being handled; replies and tasks started while handling it inherit it
+current_lane = contextvars.ContextVar('lane', default='control')
+
+
+def shielded(coro: Awaitable) -> Awaitable:
+    """
+    Await coro so that cancelling the caller, as LaneDispatcher.close() does on
+    disconnect, doesn't stop it halfway. For commit and cleanup sections, like
+    renaming an upload into place. Errors are also printed, as the caller may be gone.
+    """
+    task = asyncio.ensure_future(coro)
+    task.add_done_callback(_report_orphan)
+    return asyncio.shield(task)
+
+
+def _report_orphan(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Error in shielded section: {task.exception()}")
+
+
+class LaneDispatcher:
+    """
+    Receive side of the lanes: every lane has its own queue, so a backlog of file
+    chunks in the bulk lane never sits in front of input events.
+
+    Lanes listed in `ordered` handle one message at a time, in arrival order. In the
+    other lanes every message runs as its own task so a slow request doesn't hold up
+    unrelated ones, except that messages `key(message)` maps to the same key (the
+    chunks of one upload, say) still run one after another in arrival order.
+    `limits` caps the messages a lane holds, queued or running; a full lane makes
+    dispatch() wait, which pushes back on the connection.
+    """
+
+    def __init__(self, handle: Callable[[dict], Awaitable], limits: Optional[Dict[str, int]] = None,
+                 on_error: Optional[Callable[[dict, Exception], None]] = None,
+                 ordered: Iterable[str] = LANES, key: Optional[Callable[[dict], Optional[Hashable]]] = None):
+        limits = limits or {}
+        self.handle = handle
+        self.on_error = on_error
+        self.ordered = set(ordered)
+        self.key = key or (lambda message: None)
+        self._slots = {lane: asyncio.Semaphore(limits[lane]) if limits.get(lane) else None for lane in LANES}
+        self._pending = {lane: 0 for lane in LANES}
+        self._keyed = {lane: {} for lane in LANES}   # key -> messages waiting behind the running one
+        self._queues = {lane: asyncio.Queue() for lane in LANES}
+        self._tasks = set()
+        self._workers = [asyncio.create_task(self._work(lane)) for lane in LANES]
+
+    async def dispatch(self, lane: str, message: dict):
+        if self._slots[lane] is not None:
+            await self._slots[lane].acquire()
+        self._pending[lane] += 1
+        self._queues[lane].put_nowait(message)
+
+    def pending(self, lane: str) -> int:
+        """Messages in the lane that are queued or still being handled."""
+        return self._pending[lane]
+
+    def close(self):
+        """
+        Stop the workers and any message still being handled. Queued messages are dropped.
+        Sections a handler runs through shielded() still finish.
+        """
+        for task in self._workers + list(self._tasks):
+            task.cancel()
+
+    async def _work(self, lane):
+        current_lane.set(lane)
+        queue = self._queues[lane]
+        keyed = self._keyed[lane]
+        while True:
+            message = await queue.get()
+            if lane in self.ordered:
+                await self._handle(lane, message)
+                continue
+            key = self.key(message)
+            if key is None:
+                self._spawn(self._handle(lane, message))
+            elif key in keyed:
+                keyed[key].append(message)
+            else:
+                keyed[key] = deque([message])
+                self._spawn(self._drain(lane, key))
+
+    async def _drain(self, lane, key):
+        backlog = self._keyed[lane][key]
+        while backlog:
+            await self._handle(lane, backlog.popleft())
+        del self._keyed[lane][key]
+
+    def _spawn(self, coro):
+        # The task copies the worker's context, so it runs in the worker's lane
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, lane, message):
+        try:
+            await self.handle(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(message, e)
+        finally:
+            self._pending[lane] -= 1
+            if self._slots[lane] is not None:
+                self._slots[lane].release()
@@ -0,0 +1,184 @@
+# Event loop selection and loop-lag monitoring
+import asyncio
+import time
+import types
+from collections import deque
+
+# uvloop is optional, it isn't available on Windows
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def run(main, use_uvloop: bool = True):
+    """Run a coroutine to completion on uvloop if it is installed, else on the default loop."""
+    if use_uvloop and uvloop is not None:
+        if hasattr(uvloop, 'run'):
+            return uvloop.run(main)
+        # uvloop < 0.18
+        loop = uvloop.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(main)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+    return asyncio.run(main)
+
+
+def loop_name(loop=None) -> str:
+    loop = loop or asyncio.get_running_loop()
+    return 'uvloop' if uvloop is not None and isinstance(loop, uvloop.Loop) else 'asyncio'
+
+
+class HandlerStats:
+    """Time one message type spent running on the loop, between its awaits."""
+
+    def __init__(self):
+        self.count = 0
+        self.steps = 0
+        self.blocked = 0.0
+        self.max_step = 0.0
+        self.slow_steps = 0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'steps': self.steps,
+            'blockedMs': round(self.blocked * 1000, 3),
+            'maxStepMs': round(self.max_step * 1000, 3),
+            'slowSteps': self.slow_steps
+        }
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs a callback scheduled every `interval`
+    seconds (the delay every other callback sees too), and how long each step of
+    a timed() coroutine holds the loop. Steps longer than `slow_threshold` are logged
+    with the label they were timed under, and a stall in the lag samples lists the
+    slow steps that ran since the previous sample, so a blocked loop can be traced
+    to the message type that blocked it.
+
+    Lag is only sampled between start() and stop(). Each start() needs its own stop(),
+    so callers like connections can share the monitor and an idle process isn't
+    woken every `interval`.
+    """
+
+    def __init__(self, interval: float = 0.1, slow_threshold: float = 0.05,
+                 samples: int = 600, history: int = 100):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.lags = deque(maxlen=samples)      # seconds, most recent samples
+        self.max_lag = 0.0
+        self.handlers = {}                     # label -> HandlerStats
+        self.slow = deque(maxlen=history)      # (wall time, label, seconds)
+        self.stalls = deque(maxlen=history)    # (wall time, lag seconds, [(label, seconds)])
+        self._recent = []                      # slow steps since the last lag sample
+        self._task = None
+        self._users = 0
+
+    def start(self):
+        self._users += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._sample())
+
+    def stop(self):
+        self._users = max(0, self._users - 1)
+        if self._users == 0 and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self):
+        self.lags.clear()
+        self.max_lag = 0.0
+        self.handlers.clear()
+        self.slow.clear()
+        self.stalls.clear()
+        self._recent = []
+
+    def timed(self, label: str, coro):
+        """Wrap a coroutine so the time each of its steps holds the loop is recorded under label."""
+        stats = self.handlers.get(label)
+        if stats is None:
+            stats = self.handlers[label] = HandlerStats()
+        stats.count += 1
+        return self._timed(label, stats, coro)
+
+    @types.coroutine
+    def _timed(self, label, stats, coro):
+        # Drives the coroutine the way a task would, timing every send()/throw()
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                if error is None:
+                    future = coro.send(value)
+                else:
+                    future = coro.throw(error)
+            except StopIteration as done:
+                self._record(label, stats, time.perf_counter() - start)
+                return done.value
+            except BaseException:
+                self._record(label, stats, time.perf_counter() - start)
+                raise
+            self._record(label, stats, time.perf_counter() - start)
+            try:
+                value, error = (yield future), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    def _record(self, label, stats, elapsed):
+        stats.steps += 1
+        stats.blocked += elapsed
+        if elapsed > stats.max_step:
+            stats.max_step = elapsed
+        if elapsed >= self.slow_threshold:
+            stats.slow_steps += 1
+            self.slow.append((time.time(), label, elapsed))
+            self._recent.append((label, elapsed))
+            print(f"🐢 {label} held the event loop for {elapsed * 1000:.0f} ms")
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lags.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.slow_threshold:
+                self.stalls.append((time.time(), lag, self._recent))
+            self._recent = []
+
+    def stats(self):
+        lags = sorted(self.lags)
+
+        def percentile(p):
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))] * 1000, 3) if lags else None
+
+        return {
+            'loop': loop_name(),
+            'lag': {
+                'intervalMs': self.interval * 1000,
+                'samples': len(lags),
+                'p50Ms': percentile(0.5),
+                'p99Ms': percentile(0.99),
+                'maxMs': round(self.max_lag * 1000, 3)
+            },
+            'handlers': {label: stats.to_dict() for label, stats in self.handlers.items()},
+            'slow': [
+                {'at': at, 'label': label, 'ms': round(elapsed * 1000, 3)}
+                for at, label, elapsed in self.slow
+            ],
+            'stalls': [
+                {'at': at, 'lagMs': round(lag * 1000, 3),
+                 'causes': [{'label': label, 'ms': round(elapsed * 1000, 3)} for label, elapsed in causes]}
+                for at, lag, causes in self.stalls
+            ]
+        }
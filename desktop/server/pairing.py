@@ -0,0 +1,240 @@
+# Pairing tokens that rotate, with their QR codes rendered once into a cache
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import os
+import secrets
+import string
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+TOKEN_ALPHABET = string.ascii_lowercase + string.digits
+QR_FORMATS = ('png', 'svg', 'txt')
+
+
+class PairingToken:
+    """One pairing token and the pairing info (QR payload) built around it."""
+
+    def __init__(self, token: str, info: dict, expires_at: float):
+        self.token = token
+        self.info = info
+        self.expires_at = expires_at    # time.time()
+        self.digest = hashlib.sha256(
+            json.dumps(info, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()[:32]
+
+
+class PairingService:
+    """
+    Mints short-lived pairing tokens with `secrets` and rotates them every
+    token_ttl seconds. Each token's QR code is rendered once, off the event loop,
+    into a cache addressed by a hash of the QR payload (PNG, SVG and terminal text),
+    and the PNG is published by renaming it over `publish_path`, so readers never
+    see a half-written file. The previous token stays valid for `grace` seconds so
+    a code scanned just before a rotation still pairs. Tokens rotate even when the
+    QR code can't be rendered; the stale published PNG is removed instead, and the
+    token can still be typed in by hand.
+    """
+
+    def __init__(self, describe: Callable[[], dict], cache_dir: Path, publish_path: Optional[Path] = None,
+                 token_ttl: float = 600, grace: float = 60, token_length: int = 8, keep: int = 16,
+                 clock: Callable[[], float] = time.time):
+        self.describe = describe            # the rest of the QR payload: addresses, port, device id
+        self.cache_dir = Path(cache_dir)
+        self.publish_path = Path(publish_path) if publish_path is not None else None
+        self.token_ttl = token_ttl
+        self.grace = grace
+        self.token_length = token_length
+        self.keep = keep                    # cached QR codes kept on disk
+        self.clock = clock
+        self._current = None
+        self._previous = None
+        self._previous_until = 0.0
+        self._task = None
+
+    @property
+    def current(self) -> PairingToken:
+        if self._current is None:
+            self._current = self._mint()
+        return self._current
+
+    def info(self) -> dict:
+        return self.current.info
+
+    def verify(self, token) -> bool:
+        if not isinstance(token, str):
+            return False
+        current = self.current
+        if current.expires_at > self.clock() and hmac.compare_digest(token, current.token):
+            return True
+        previous = self._previous
+        return (previous is not None and self._previous_until > self.clock()
+                and hmac.compare_digest(token, previous.token))
+
+    async def start(self):
+        """
+        Rotate in the background, then render and publish the current token's QR code.
+        A render error is raised, but rotation keeps going.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._rotate_forever())
+        await asyncio.to_thread(self._render_and_publish, self.current)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def rotate(self) -> PairingToken:
+        # Minting looks up the LAN addresses again, so it runs off the loop with the rendering
+        token = await asyncio.to_thread(self._mint)
+        try:
+            await asyncio.to_thread(self._render_and_publish, token)
+        except Exception as e:
+            print(f"❌ Failed to render pairing QR code: {e}")
+            await asyncio.to_thread(self._unpublish)
+        # Nothing awaited between here and the swap, so the two always change together
+        self._previous, self._previous_until = self._current, self.clock() + self.grace
+        self._current = token
+        return token
+
+    def asset_path(self, fmt: str = 'png') -> Path:
+        """Path of the current token's QR code in the given format, rendering it if needed."""
+        token = self.current
+        self._render(token)
+        return self.cache_dir / f'{token.digest}.{fmt}'
+
+    def asset_text(self, fmt: str = 'txt') -> str:
+        return self.asset_path(fmt).read_text(encoding='utf-8')
+
+    async def _rotate_forever(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.current.expires_at - self.clock()))
+            try:
+                token = await self.rotate()
+                print(f"🔑 Pairing token rotated, valid for {self.token_ttl / 60:.0f} min: {token.token}")
+            except Exception as e:
+                print(f"❌ Failed to rotate pairing token: {e}")
+                await asyncio.sleep(5)
+
+    def _mint(self) -> PairingToken:
+        token = ''.join(secrets.choice(TOKEN_ALPHABET) for _ in range(self.token_length))
+        info = {**self.describe(), 'pairing_token': token}
+        return PairingToken(token, info, self.clock() + self.token_ttl)
+
+    def _unpublish(self):
+        # A QR code for an expired token would only fail to pair
+        if self.publish_path is not None:
+            try:
+                self.publish_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def _render_and_publish(self, token: PairingToken):
+        self._render(token)
+        if self.publish_path is not None:
+            _replace_file(self.publish_path, (self.cache_dir / f'{token.digest}.png').read_bytes())
+
+    def _render(self, token: PairingToken):
+        """Write the token's QR code in every format, unless the cache already has it."""
+        paths = {fmt: self.cache_dir / f'{token.digest}.{fmt}' for fmt in QR_FORMATS}
+        if all(path.exists() for path in paths.values()):
+            return
+        from ..utils import QRUtils
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        qr = QRUtils.make_qr(token.info, box_size=8, border=2)
+        matrix = qr.get_matrix()
+        png = io.BytesIO()
+        qr.make_image(fill_color="black", back_color="white").save(png)
+        _replace_file(paths['png'], png.getvalue())
+        _replace_file(paths['svg'], QRUtils.matrix_to_svg(matrix).encode('utf-8'))
+        _replace_file(paths['txt'], QRUtils.matrix_to_text(matrix).encode('utf-8'))
+        self._prune(token.digest)
+
+    def _prune(self, keep_digest: str):
+        rendered = sorted((path for path in self.cache_dir.glob('*.png') if path.stem != keep_digest),
+                          key=lambda path: path.stat().st_mtime, reverse=True)
+        for stale in rendered[max(0, self.keep - 1):]:
+            for fmt in QR_FORMATS:
+                stale.with_suffix(f'.{fmt}').unlink(missing_ok=True)
+
+
+class PairedClients:
+    """
+    Credentials issued to clients at pairing, so each can pair again later without
+    the current token, for instance after the desktop's address changed. Every client
+    gets its own random key; only a hash of it is kept, in a file only the owner may
+    read. Revoking a client invalidates its key without affecting the others.
+    """
+
+    def __init__(self, path: Path, max_clients: int = 64, clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.max_clients = max_clients      # the longest unused ones are forgotten beyond this
+        self.clock = clock
+        self._clients = self._load()
+
+    def issue(self, name: str = '') -> tuple:
+        """Register a new client. Returns (client_id, client_key); the key is shown only once."""
+        client_id = secrets.token_hex(8)
+        key = secrets.token_hex(32)
+        now = self.clock()
+        self._clients[client_id] = {'keyHash': _hash_key(key), 'name': str(name)[:64],
+                                    'pairedAt': now, 'lastSeen': now}
+        while len(self._clients) > self.max_clients:
+            oldest = min(self._clients, key=lambda known: self._clients[known]['lastSeen'])
+            del self._clients[oldest]
+        self._save()
+        return client_id, key
+
+    def verify(self, client_id, key) -> bool:
+        client = self._clients.get(client_id) if isinstance(client_id, str) else None
+        if client is None or not isinstance(key, str):
+            return False
+        if not hmac.compare_digest(client['keyHash'], _hash_key(key)):
+            return False
+        client['lastSeen'] = self.clock()
+        return True
+
+    def known(self, client_id) -> bool:
+        return client_id in self._clients
+
+    def revoke(self, client_id: str) -> bool:
+        if self._clients.pop(client_id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def clients(self) -> list:
+        return [{'clientId': client_id, 'name': client['name'], 'pairedAt': client['pairedAt'],
+                 'lastSeen': client['lastSeen']} for client_id, client in self._clients.items()]
+
+    def _load(self) -> dict:
+        try:
+            stored = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return stored if isinstance(stored, dict) else {}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f'.{self.path.name}.{secrets.token_hex(4)}.tmp')
+        # Only the owner may read the key hashes
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._clients, f)
+        os.replace(temp_path, self.path)
+
+
+def _hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _replace_file(path: Path, data: bytes):
+    """Write a file so readers see either the old or the new content, never a partial one."""
+    temp_path = path.with_name(f'.{path.name}.{secrets.token_hex(4)}.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
@@ -0,0 +1,294 @@
+# Connected client sessions with per-client outbound queues
+import asyncio
+import contextvars
+import json
+import secrets
+import time
+import uuid
+from collections import deque
+
+from websockets.exceptions import ConnectionClosed
+
+from .lanes import LANES, current_lane
+
+# Request ID of the message being handled, echoed in every reply sent while handling it
+current_request = contextvars.ContextVar('request_id', default=None)
+
+
+class SessionClosed(ConnectionClosed):
+    """Raised when sending to a session whose connection is gone or was dropped for being too slow."""
+
+    def __init__(self):
+        super().__init__(None, None)
+
+
+class Session:
+    """
+    One connected client. Everything sent to the client goes through bounded
+    per-lane queues drained by a dedicated writer task, so pushing to a slow client
+    never blocks whoever is pushing. The writer always takes the highest priority
+    lane first (input, then control, then bulk), so a queued file transfer delays
+    an input reply by at most the one frame already being written.
+
+    `await send(frame)` waits for room in the lane (backpressure for the client's
+    own requests and transfers). `push(frame)` never waits: when the lane is full a
+    droppable frame is discarded, anything else closes the session, since a client
+    that can't keep up would otherwise hold an unbounded backlog.
+    """
+
+    def __init__(self, websocket, max_queue: int = 256, max_queue_bytes: int = 8 * 1024 * 1024):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.client_ip = websocket.remote_address[0] if websocket.remote_address else None
+        self.connected_at = time.time()
+        self.paired = False
+        self.client_id = None           # paired client credential used, see PairedClients
+        self.capabilities = set()
+        self.resume_token = None
+        self.resume_state = {}          # what to restore on resume, filled in when the connection ends
+        self.resumable_until = None
+        self.limits = None              # rate and memory limits from admission control
+        self.touchpad = None            # relative pointer state, created on the first relative move
+        self.max_queue = max_queue      # per lane
+        self.max_queue_bytes = max_queue_bytes
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self._queues = {lane: deque() for lane in LANES}
+        self._queue_bytes = {lane: 0 for lane in LANES}
+        self._has_frames = asyncio.Event()
+        self._has_room = {lane: asyncio.Event() for lane in LANES}
+        for event in self._has_room.values():
+            event.set()
+        self._writer_task = None
+
+    @property
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._writer())
+
+    async def send(self, frame, lane: str = None):
+        """
+        Queue a frame (str, bytes or dict), waiting while its lane is full.
+        The lane defaults to that of the message being handled, and a dict frame
+        gets that message's requestId, if it had one.
+        """
+        lane = lane or current_lane.get()
+        request_id = current_request.get()
+        if request_id is not None and isinstance(frame, dict) and 'requestId' not in frame:
+            frame = {**frame, 'requestId': request_id}
+        frame = _serialize(frame)
+        while not self.closed and self._full(lane):
+            self._has_room[lane].clear()
+            await self._has_room[lane].wait()
+        if self.closed:
+            raise SessionClosed()
+        self._enqueue(lane, frame)
+
+    def push(self, frame, droppable: bool = False, lane: str = 'control') -> bool:
+        """Queue a frame without waiting. Returns False if it was dropped or the session is closed."""
+        if self.closed:
+            return False
+        frame = _serialize(frame)
+        if self._full(lane):
+            if droppable:
+                self.dropped += 1
+                return False
+            print(f"⚠️ Closing session {self.id} from {self.client_ip}: {len(self._queues[lane])} {lane} frames queued")
+            self.close(code=1013, reason='Client is not keeping up')
+            return False
+        self._enqueue(lane, frame)
+        return True
+
+    def close(self, code: int = 1000, reason: str = ''):
+        """Stop sending and close the connection. Queued frames are discarded."""
+        if self.closed:
+            return
+        self._mark_closed()
+        asyncio.create_task(self._close_connection(code, reason))
+
+    async def wait_closed(self):
+        if self._writer_task is not None:
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+
+    def _full(self, lane):
+        return len(self._queues[lane]) >= self.max_queue or self._queue_bytes[lane] >= self.max_queue_bytes
+
+    def _enqueue(self, lane, frame):
+        self._queues[lane].append(frame)
+        self._queue_bytes[lane] += len(frame)
+        self._has_frames.set()
+
+    def _next_frame(self):
+        for lane in LANES:
+            queue = self._queues[lane]
+            if queue:
+                frame = queue.popleft()
+                self._queue_bytes[lane] -= len(frame)
+                if not self._full(lane):
+                    self._has_room[lane].set()
+                return frame
+        return None
+
+    def _mark_closed(self):
+        self.closed = True
+        for lane in LANES:
+            self._queues[lane].clear()
+            self._queue_bytes[lane] = 0
+            # Wake any senders waiting for room so they raise
+            self._has_room[lane].set()
+        # Wake the writer so it exits
+        self._has_frames.set()
+
+    async def _close_connection(self, code, reason):
+        try:
+            await self.websocket.close(code, reason)
+        except Exception:
+            pass
+
+    async def _writer(self):
+        try:
+            while True:
+                await self._has_frames.wait()
+                if self.closed:
+                    return
+                frame = self._next_frame()
+                if frame is None:
+                    self._has_frames.clear()
+                    continue
+                await self.websocket.send(frame)
+                self.sent += 1
+        except ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"❌ Error writing to {self.client_ip}: {e}")
+        finally:
+            self._mark_closed()
+
+    def to_dict(self):
+        return {
+            'sessionId': self.id,
+            'clientIp': self.client_ip,
+            'connectedAt': self.connected_at,
+            'paired': self.paired,
+            'capabilities': sorted(self.capabilities),
+            'queued': {lane: len(queue) for lane, queue in self._queues.items()},
+            'sent': self.sent,
+            'dropped': self.dropped
+        }
+
+
+class SessionManager:
+    """
+    Registry of connected sessions, with a broadcast that serializes each message once.
+    Paired sessions get a resumption token. When such a session's connection ends it is
+    kept for resume_ttl seconds, so a client reconnecting after a network hiccup can
+    present the token and pick up where it left off instead of pairing again.
+    Once a session can no longer be resumed, on_expire lets the owner of per-session
+    resources (partial uploads and the like) reclaim them.
+    """
+
+    def __init__(self, max_queue: int = 256, max_queue_bytes: int = 8 * 1024 * 1024,
+                 resume_ttl: float = 120.0, on_expire=None):
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self.resume_ttl = resume_ttl
+        self.on_expire = on_expire  # called with a session once it is gone for good
+        self.sessions = {}
+        self._resumable = {}  # resume token -> Session, live or recently disconnected
+
+    def register(self, websocket) -> Session:
+        session = Session(websocket, max_queue=self.max_queue, max_queue_bytes=self.max_queue_bytes)
+        self.sessions[session.id] = session
+        session.start()
+        return session
+
+    async def unregister(self, session: Session, **resume_state):
+        """Forget a session whose connection ended, keeping `resume_state` for its resume token."""
+        self.sessions.pop(session.id, None)
+        session.close()
+        await session.wait_closed()
+        if session.resume_token is not None:
+            session.resume_state = resume_state
+            session.resumable_until = time.monotonic() + self.resume_ttl
+            asyncio.get_running_loop().call_later(self.resume_ttl, self._expire_session, session)
+        else:
+            self._reclaim(session)
+        self._expire()
+
+    def issue_resume_token(self, session: Session) -> str:
+        """Give a session a fresh resumption token, invalidating its previous one."""
+        if session.resume_token is not None:
+            self._resumable.pop(session.resume_token, None)
+        session.resume_token = secrets.token_urlsafe(32)
+        self._resumable[session.resume_token] = session
+        return session.resume_token
+
+    def take_resumable(self, token: str):
+        """
+        Claim the session a resumption token belongs to. Tokens are single use.
+        Returns None for unknown or expired tokens. The returned session may still
+        be connected if the client noticed the dead connection before the server did.
+        """
+        self._expire()
+        session = self._resumable.pop(token, None)
+        if session is not None:
+            session.resume_token = None
+        return session
+
+    def _expire(self):
+        now = time.monotonic()
+        for session in list(self._resumable.values()):
+            if session.resumable_until is not None and session.resumable_until <= now:
+                self._expire_session(session)
+
+    def _expire_session(self, session):
+        if session.resume_token is None or self._resumable.get(session.resume_token) is not session:
+            # Already resumed or expired
+            return
+        del self._resumable[session.resume_token]
+        session.resume_token = None
+        self._reclaim(session)
+
+    def _reclaim(self, session):
+        if self.on_expire is None:
+            return
+        try:
+            self.on_expire(session)
+        except Exception as e:
+            print(f"❌ Error reclaiming session {session.id}: {e}")
+
+    def get(self, session_id: str):
+        return self.sessions.get(session_id)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def broadcast(self, message, targets=None, exclude=None, paired_only: bool = True,
+                  capability: str = None, droppable: bool = False) -> int:
+        """
+        Push a message to many sessions without waiting on any of them.
+        `targets` narrows the audience to the given sessions (all sessions by default).
+        Returns how many sessions it was queued for.
+        """
+        frame = _serialize(message)
+        delivered = 0
+        for session in list(self.sessions.values() if targets is None else targets):
+            if session is exclude or (paired_only and not session.paired):
+                continue
+            if capability is not None and capability not in session.capabilities:
+                continue
+            if session.push(frame, droppable=droppable):
+                delivered += 1
+        return delivered
+
+
+def _serialize(frame):
+    if isinstance(frame, (str, bytes)):
+        return frame
+    return json.dumps(frame)
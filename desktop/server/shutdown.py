@@ -0,0 +1,66 @@
+# Event-driven shutdown trigger for the websocket server
+import asyncio
+import signal
+import threading
+
+
+class ShutdownTrigger:
+    """
+    Resolves once the server should stop, without polling: on SIGINT/SIGTERM, when a
+    watched file descriptor becomes readable (a byte written to a pipe, or its other
+    end closing), or when a threading/multiprocessing Event is set. An Event has no
+    descriptor the loop could watch, so one thread blocks in event.wait() instead.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._fired = asyncio.Event()
+        self.reason = None
+        self._signals = []
+        self._fds = []
+
+    def install_signal_handlers(self, signals=(signal.SIGINT, signal.SIGTERM)):
+        for signum in signals:
+            try:
+                self._loop.add_signal_handler(signum, self.trigger, signal.Signals(signum).name)
+                self._signals.append(signum)
+            except (NotImplementedError, RuntimeError):
+                # Windows loops have no add_signal_handler, and it only works in the main thread
+                if threading.current_thread() is threading.main_thread():
+                    signal.signal(signum, lambda num, frame: self._trigger_threadsafe(signal.Signals(num).name))
+
+    def watch_fd(self, fd):
+        self._loop.add_reader(fd, self.trigger, 'stop pipe')
+        self._fds.append(fd)
+
+    def watch_event(self, event):
+        thread = threading.Thread(target=self._wait_for_event, args=(event,), daemon=True,
+                                  name='shutdown-event')
+        thread.start()
+
+    def trigger(self, reason='requested'):
+        if not self._fired.is_set():
+            self.reason = reason
+            self._fired.set()
+
+    async def wait(self):
+        await self._fired.wait()
+        return self.reason
+
+    def close(self):
+        for signum in self._signals:
+            self._loop.remove_signal_handler(signum)
+        for fd in self._fds:
+            self._loop.remove_reader(fd)
+        self._signals, self._fds = [], []
+
+    def _wait_for_event(self, event):
+        event.wait()
+        self._trigger_threadsafe('stop event')
+
+    def _trigger_threadsafe(self, reason):
+        try:
+            self._loop.call_soon_threadsafe(self.trigger, reason)
+        except RuntimeError:
+            # The loop has already finished
+            pass
@@ -0,0 +1,115 @@
+# Startup profile: where server start-up time and memory go
+#
+#   python -m desktop.server.startup_profile [--top 15] [--module desktop.server.ws_handler]
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import time
+
+# Runs in a fresh interpreter so nothing is imported yet
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss if sys.platform == 'darwin' else rss * 1024
+except ImportError:
+    rss = None
+print(json.dumps({{'seconds': elapsed, 'maxRssBytes': rss, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def profile_import(module: str):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+    Returns (summary, imports) where imports is a list of
+    (self seconds, cumulative seconds, depth, module name).
+    Raises RuntimeError with the child's error output if the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _IMPORT_SCRIPT.format(module=module)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        # stderr is mostly -X importtime lines, keep the rest: the traceback
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(f"Importing {module} failed with exit code {result.returncode}:\n"
+                           + '\n'.join(errors[-20:]))
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(self_us) / 1e6, int(cumulative_us) / 1e6, depth, name.strip()))
+    return summary, imports
+
+
+def profile_plugins():
+    """Time importing each lazily loaded feature plugin. Returns [(module, seconds, error)]."""
+    from .. import features
+    timings = []
+    for module in features.PLUGINS:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(f'{features.__name__}.{module}')
+            error = None
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        timings.append((module, time.perf_counter() - start, error))
+    return timings
+
+
+def profile_first_use():
+    """Time the work deferred until the server starts: pairing details and the QR code."""
+    from . import ws_handler
+    timings = []
+    start = time.perf_counter()
+    ws_handler.get_pairing_info()
+    timings.append(('pairing info (LAN IP lookup)', time.perf_counter() - start))
+    start = time.perf_counter()
+    ws_handler.get_pairing().asset_path()
+    timings.append(('QR code (qrcode import and render, or cache hit)', time.perf_counter() - start))
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show where server start-up time goes.')
+    parser.add_argument('--module', default='desktop.server.ws_handler', help='module to import')
+    parser.add_argument('--top', type=int, default=15, help='how many imports to list')
+    args = parser.parse_args(argv)
+
+    try:
+        summary, imports = profile_import(args.module)
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
+    print(f"⏱️ import {args.module}: {summary['seconds'] * 1000:.1f} ms, "
+          f"{len(summary['modules'])} modules loaded")
+    if summary['maxRssBytes']:
+        print(f"🧠 Peak RSS after import: {summary['maxRssBytes'] / (1024 * 1024):.1f} MB")
+
+    print(f"\nSlowest imports, cumulative (top {args.top}):")
+    for self_s, cumulative_s, depth, name in sorted(imports, key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative_s * 1000:8.1f} ms  {'  ' * min(depth, 4)}{name}")
+    print(f"\nSlowest imports, own time only (top {args.top}):")
+    for self_s, cumulative_s, depth, name in sorted(imports, key=lambda item: -item[0])[:args.top]:
+        print(f"  {self_s * 1000:8.1f} ms  {name}")
+
+    print("\nFeature plugins, imported on first use:")
+    for module, seconds, error in profile_plugins():
+        print(f"  {seconds * 1000:8.1f} ms  {module}" + (f"  ❌ {error}" if error else ''))
+
+    print("\nDeferred until the server starts:")
+    for label, seconds in profile_first_use():
+        print(f"  {seconds * 1000:8.1f} ms  {label}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Server-push state subscriptions
+import asyncio
+import json
+
+
+class Topic:
+    """A desktop state source shared by every client subscribed to it."""
+
+    def __init__(self, name, sample=None, listen=None, interval=1.0):
+        self.name = name
+        self.sample = sample        # blocking callable returning a dict of fields (polled)
+        self.listen = listen        # coroutine function(publish) for event-driven sources
+        self.interval = interval
+        self.subscribers = set()    # sessions
+        self.stale = set()          # subscribers that missed a diff and need a snapshot
+        self.state = {}
+        self.task = None
+        self.wake = None
+
+
+class SubscriptionManager:
+    """
+    Runs one producer per topic no matter how many clients subscribed,
+    and pushes only the fields that changed since the last sample.
+    Updates are queued on each session without waiting. A client too slow to take
+    a diff gets a full snapshot with the next update instead of a backlog of diffs.
+    """
+
+    def __init__(self):
+        self.topics = {}
+
+    def register_topic(self, name, sample=None, listen=None, interval=1.0):
+        """Register a topic backed by a polled `sample` callable or a `listen` coroutine."""
+        if (sample is None) == (listen is None):
+            raise ValueError("A topic needs exactly one of sample or listen")
+        self.topics[name] = Topic(name, sample=sample, listen=listen, interval=interval)
+
+    async def subscribe(self, session, topics):
+        """Subscribe a session to topics. Returns (accepted, unknown) topic name lists."""
+        accepted, unknown = [], []
+        for name in topics:
+            topic = self.topics.get(name)
+            if topic is None:
+                unknown.append(name)
+                continue
+            accepted.append(name)
+            if session in topic.subscribers:
+                continue
+            topic.subscribers.add(session)
+            if topic.task is None:
+                topic.wake = asyncio.Event()
+                topic.task = asyncio.create_task(self._run_producer(topic))
+            elif topic.state:
+                # Late subscribers get the current snapshot, everyone else only sees diffs
+                if not session.push(self._frame(topic.name, topic.state, snapshot=True), droppable=True):
+                    topic.stale.add(session)
+        return accepted, unknown
+
+    def topics_for(self, session):
+        return [name for name, topic in self.topics.items() if session in topic.subscribers]
+
+    def unsubscribe(self, session, topics=None):
+        """Remove a session from the given topics, or from all topics if none are given."""
+        names = self.topics.keys() if topics is None else topics
+        for name in list(names):
+            topic = self.topics.get(name)
+            if topic is None or session not in topic.subscribers:
+                continue
+            topic.subscribers.discard(session)
+            topic.stale.discard(session)
+            if not topic.subscribers and topic.task is not None:
+                # Last subscriber gone, stop sampling the source
+                topic.task.cancel()
+                topic.task = None
+                topic.state = {}
+
+    def request_sample(self, name):
+        """Wake a polled topic early, e.g. right after the server changed its state."""
+        topic = self.topics.get(name)
+        if topic is not None and topic.task is not None:
+            topic.wake.set()
+
+    async def publish(self, name, fields):
+        """Merge new field values into a topic and push the changed ones to its subscribers."""
+        topic = self.topics[name]
+        # Sources return None when the device has nothing to report (no battery, no player)
+        fields = {'available': False} if fields is None else {'available': True, **fields}
+        changed = {key: value for key, value in fields.items() if topic.state.get(key, object()) != value}
+        if not changed and not topic.stale:
+            return
+        topic.state.update(changed)
+        # Serialize once, every subscriber receives the same frame
+        diff = self._frame(name, changed, snapshot=False) if changed else None
+        snapshot = self._frame(name, topic.state, snapshot=True) if topic.stale else None
+        for session in list(topic.subscribers):
+            if session in topic.stale:
+                if session.push(snapshot, droppable=True):
+                    topic.stale.discard(session)
+            elif diff is not None and not session.push(diff, droppable=True):
+                topic.stale.add(session)
+
+    async def _run_producer(self, topic):
+        try:
+            if topic.listen is not None:
+                await topic.listen(lambda fields: self.publish(topic.name, fields))
+                return
+            while True:
+                topic.wake.clear()
+                try:
+                    fields = await asyncio.to_thread(topic.sample)
+                    await self.publish(topic.name, fields)
+                except Exception as e:
+                    print(f"❌ Error sampling topic {topic.name}: {e}")
+                try:
+                    await asyncio.wait_for(topic.wake.wait(), timeout=topic.interval)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+
+    @staticmethod
+    def _frame(name, fields, snapshot):
+        return json.dumps({
+            'type': 'state_update',
+            'topic': name,
+            'snapshot': snapshot,
+            'changed': fields
+        })
@@ -0,0 +1,125 @@
+# TLS for wss://: a cached self-signed certificate, pinned by fingerprint, with session resumption
+import datetime
+import hashlib
+import hmac
+import os
+import ssl
+from pathlib import Path
+
+CERT_VALIDITY_DAYS = 3650   # clients pin the fingerprint, so the certificate should outlive the pairing
+RENEW_BEFORE_DAYS = 30
+SESSION_TICKETS = 2         # TLS 1.3 tickets handed to each client after a full handshake
+
+
+class TlsUnavailable(Exception):
+    """No certificate could be loaded or created, the server falls back to ws://."""
+
+
+class TlsIdentity:
+    """
+    The server's certificate and key, generated once and kept in `directory`.
+    There is no CA behind it: clients get its SHA-256 fingerprint through the QR
+    code (or a signed discovery reply) and accept only that certificate.
+    """
+
+    def __init__(self, cert_path: Path, key_path: Path):
+        self.cert_path = cert_path
+        self.key_path = key_path
+        der = ssl.PEM_cert_to_DER_cert(cert_path.read_text())
+        self.fingerprint = hashlib.sha256(der).hexdigest()
+
+    @classmethod
+    def load(cls, directory: Path, common_name: str = 'syncbridge') -> 'TlsIdentity':
+        """Read the certificate from directory, creating it on first run or when it is about to expire."""
+        directory = Path(directory)
+        cert_path, key_path = directory / 'cert.pem', directory / 'key.pem'
+        if not (cert_path.exists() and key_path.exists() and not _expiring(cert_path)):
+            directory.mkdir(parents=True, exist_ok=True)
+            _generate(cert_path, key_path, common_name)
+        return cls(cert_path, key_path)
+
+
+def server_context(identity: TlsIdentity) -> ssl.SSLContext:
+    """
+    Server context with session resumption on: TLS 1.3 tickets, plus TLS 1.2
+    tickets and the session cache, so a reconnect costs one round trip and no
+    certificate signature instead of a full handshake.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(identity.cert_path, identity.key_path)
+    context.options &= ~ssl.OP_NO_TICKET
+    if hasattr(context, 'num_tickets'):
+        context.num_tickets = SESSION_TICKETS
+    return context
+
+
+def client_context() -> ssl.SSLContext:
+    """
+    Client context for a pinned self-signed certificate: no CA or hostname check,
+    compare the peer's fingerprint after connecting (see check_pin). Reference
+    for clients, used by the benchmark.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def check_pin(ssl_object, fingerprint: str):
+    """Raise ssl.SSLError unless the peer certificate has the pinned SHA-256 fingerprint."""
+    der = ssl_object.getpeercert(binary_form=True)
+    if der is None or not hmac.compare_digest(hashlib.sha256(der).hexdigest(), fingerprint):
+        raise ssl.SSLError('Server certificate does not match the pinned fingerprint')
+
+
+def _expiring(cert_path: Path) -> bool:
+    try:
+        from cryptography import x509
+    except ImportError:
+        return False   # can't make a new one anyway
+    try:
+        cert = x509.load_pem_x509_certificate(cert_path.read_bytes())
+    except (OSError, ValueError):
+        return True
+    not_after = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return not_after - datetime.datetime.now(datetime.timezone.utc) < datetime.timedelta(days=RENEW_BEFORE_DAYS)
+
+
+def _generate(cert_path: Path, key_path: Path, common_name: str):
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+    except ImportError:
+        raise TlsUnavailable("generating a certificate needs the 'cryptography' package")
+
+    # P-256 signs faster than RSA, which is most of a full handshake's cost on the server
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=CERT_VALIDITY_DAYS))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(common_name)]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    _write(key_path, key_pem, 0o600)   # only the owner may read the key
+    _write(cert_path, cert.public_bytes(serialization.Encoding.PEM), 0o644)
+
+
+def _write(path: Path, data: bytes, mode: int):
+    temp_path = path.with_suffix('.tmp')
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
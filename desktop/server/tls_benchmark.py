@@ -0,0 +1,182 @@
+# TLS benchmark: what wss:// costs compared with ws:// on this machine
+#
+#   python -m desktop.server.tls_benchmark [--connects 50] [--messages 2000] [--megabytes 64]
+import argparse
+import asyncio
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import websockets
+from websockets.sync.client import connect
+
+from . import tls
+
+FRAME_SIZE = 64 * 1024
+
+
+async def _echo(websocket):
+    """Echo text frames; count binary frames and report the total when asked for it."""
+    received = 0
+    async for message in websocket:
+        if isinstance(message, bytes):
+            received += len(message)
+        elif message == 'total':
+            await websocket.send(str(received))
+            received = 0
+        else:
+            await websocket.send(message)
+
+
+class EchoServers:
+    """A ws:// and a wss:// echo server on loopback, run on their own loop in a thread."""
+
+    def __init__(self, context):
+        self.context = context
+        self.ports = {}
+        self._ready = threading.Event()
+        self._stop = None
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        plain = await websockets.serve(_echo, '127.0.0.1', 0, max_size=None, compression=None)
+        secure = await websockets.serve(_echo, '127.0.0.1', 0, ssl=self.context, max_size=None,
+                                        compression=None)
+        self.ports = {'ws': list(plain.sockets)[0].getsockname()[1],
+                      'wss': list(secure.sockets)[0].getsockname()[1]}
+        self._loop = asyncio.get_running_loop()
+        self._ready.set()
+        await self._stop.wait()
+        for server in (plain, secure):
+            server.close()
+            await server.wait_closed()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+
+class Client:
+    """
+    Opens benchmark connections. wss:// connections are wrapped here rather than by
+    websockets so the TLS session can be kept and offered again on the next connect,
+    the way a mobile client resumes after a reconnect.
+    """
+
+    def __init__(self, ports, fingerprint):
+        self.ports = ports
+        self.fingerprint = fingerprint
+        self.context = tls.client_context()
+        self.session = None
+
+    def open(self, scheme, resume=False):
+        """Returns (websocket, seconds to open it, whether the TLS session was resumed)."""
+        start = time.perf_counter()
+        if scheme == 'ws':
+            websocket = connect(f'ws://127.0.0.1:{self.ports["ws"]}', max_size=None, compression=None)
+            return websocket, time.perf_counter() - start, False
+        sock = socket.create_connection(('127.0.0.1', self.ports['wss']))
+        sock = self.context.wrap_socket(sock, session=self.session if resume else None)
+        tls.check_pin(sock, self.fingerprint)
+        websocket = connect(f'ws://127.0.0.1:{self.ports["wss"]}', sock=sock, max_size=None, compression=None)
+        elapsed = time.perf_counter() - start
+        websocket.send('ping')
+        websocket.recv()   # TLS 1.3 tickets arrive after the handshake, read something first
+        self.session = sock.session
+        return websocket, elapsed, sock.session_reused
+
+
+def bench_connect(client, scheme, count, resume=False):
+    timings, resumed = [], 0
+    for _ in range(count):
+        websocket, elapsed, reused = client.open(scheme, resume)
+        websocket.close()
+        timings.append(elapsed)
+        resumed += reused
+    return timings, resumed
+
+
+def bench_round_trips(client, scheme, count):
+    websocket, _, _ = client.open(scheme)
+    payload = 'x' * 64
+    timings = []
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            websocket.send(payload)
+            websocket.recv()
+            timings.append(time.perf_counter() - start)
+    finally:
+        websocket.close()
+    return timings
+
+
+def bench_throughput(client, scheme, megabytes):
+    """Seconds to send `megabytes` MiB in 64 KiB binary frames, until the server has them all."""
+    websocket, _, _ = client.open(scheme)
+    frame = bytes(FRAME_SIZE)
+    frames = megabytes * 1024 * 1024 // FRAME_SIZE
+    try:
+        start = time.perf_counter()
+        for _ in range(frames):
+            websocket.send(frame)
+        websocket.send('total')
+        assert int(websocket.recv()) == frames * FRAME_SIZE
+        return time.perf_counter() - start
+    finally:
+        websocket.close()
+
+
+def _ms(timings, quantile):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare wss:// with ws:// on loopback.')
+    parser.add_argument('--connects', type=int, default=50, help='connections opened per mode')
+    parser.add_argument('--messages', type=int, default=2000, help='round trips of a 64 byte message')
+    parser.add_argument('--megabytes', type=int, default=64, help='MiB sent for the throughput test')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        identity = tls.TlsIdentity.load(Path(directory))
+        print(f"🔐 Certificate generated in {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"(once, then cached), SHA-256 {identity.fingerprint[:16]}…")
+        context = tls.server_context(identity)
+
+        with EchoServers(context) as servers:
+            client = Client(servers.ports, identity.fingerprint)
+
+            print(f"\nConnect, TCP + TLS + websocket handshake ({args.connects} each):")
+            rows = [('ws://', *bench_connect(client, 'ws', args.connects)),
+                    ('wss:// full handshake', *bench_connect(client, 'wss', args.connects)),
+                    ('wss:// resumed', *bench_connect(client, 'wss', args.connects, resume=True))]
+            for label, timings, resumed in rows:
+                print(f"  {label:<24} median {_ms(timings, 0.5):6.2f} ms   p95 {_ms(timings, 0.95):6.2f} ms"
+                      + (f"   {resumed}/{len(timings)} resumed" if label.startswith('wss') else ''))
+
+            print(f"\nRound trip, 64 byte message ({args.messages} each):")
+            for scheme in ('ws', 'wss'):
+                timings = bench_round_trips(client, scheme, args.messages)
+                print(f"  {scheme + '://':<24} median {_ms(timings, 0.5) * 1000:6.1f} µs  "
+                      f"p95 {_ms(timings, 0.95) * 1000:6.1f} µs  mean {statistics.mean(timings) * 1e6:6.1f} µs")
+
+            print(f"\nThroughput, {args.megabytes} MiB in {FRAME_SIZE // 1024} KiB frames:")
+            for scheme in ('ws', 'wss'):
+                seconds = bench_throughput(client, scheme, args.megabytes)
+                print(f"  {scheme + '://':<24} {args.megabytes / seconds:8.1f} MiB/s")
+
+
+if __name__ == '__main__':
+    main()
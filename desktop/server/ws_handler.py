@@ -1,98 +1,161 @@
 import asyncio
 import json
 import os
-import random
-import string
 import socket
+import ssl
 import websockets
 import base64
 import time
 import tempfile
+import uuid
 from pathlib import Path
-import qrcode
 import threading
 
-from ..utils import QRUtils
-from ..features import send_clipboard, recieve_clipboard, press_key, run_command, set_volume, set_brightness, media_playback, Brightness, Volume, Media
-from ..features.mouse_keyboard import move_cursor
+# Features that drive the desktop (pyautogui, win32, psutil) are imported on first use
+from .. import features
+from ..features.notifications import NotificationServer
+from ..features.command import CommandRunner, CommandLimitError, SudoCommandError, CommandCache, prepare_command
+from ..features.jobs import JobManager, JobLimitError, JobNotFoundError
+from ..features.pty_session import PtyManager
+from ..features.clipboard import TEXT_MIME
+from ..features.input_events import InputBusyError, InputExecutor, validate_events
+from .addresses import candidate_addresses
+from .admin import AdminChannel
+from .admission import AdmissionControl, IdleTimer
+from .discovery import DeviceIdentity, start_responder, advertise_mdns
+from .lanes import LaneDispatcher, shielded
+from .loop_monitor import LoopMonitor, loop_name, run as run_loop
+from .pairing import PairedClients, PairingService
+from .sessions import SessionManager, current_request
+from .shutdown import ShutdownTrigger
+from .subscriptions import SubscriptionManager
+from .tls import TlsIdentity, TlsUnavailable, server_context
+from .clipboard_sync import ClipboardSync, INLINE_LIMIT as CLIPBOARD_INLINE_LIMIT, check_mime as check_clipboard_mime
 
 # Add file transfer tracking
 file_transfers = {}  # Track active file transfers
+TRANSFER_CHUNK_SIZE = 64 * 1024  # Raw bytes per outgoing file_chunk frame
+background_tasks = set()  # Streams and other work running past the message that started them
+shutting_down = False  # set once shutdown starts, new uploads and commands are refused
+SPOOL_PREFIX = '.syncbridge-'  # temp files of uploads in progress, hidden in Downloads
 downloads_dir = Path.home() / "Downloads"
 downloads_dir.mkdir(exist_ok=True)
 
+# Persistent server state (notification history, ...)
+data_dir = Path.home() / ".syncbridge"
+data_dir.mkdir(exist_ok=True)
+
+# Phone notifications mirrored to the desktop, with bounded persistent history opened on first use
+notification_server = NotificationServer(history_path=data_dir / "notifications.db")
+
+# State topics clients can subscribe to, each sampled by a single producer
+subscriptions = SubscriptionManager()
+subscriptions.register_topic('volume', sample=features.lazy('get_volume'), interval=1.0)
+subscriptions.register_topic('brightness', sample=features.lazy('get_brightness'), interval=2.0)
+subscriptions.register_topic('battery', sample=features.lazy('get_battery_status'), interval=30.0)
+subscriptions.register_topic('media', sample=features.lazy('get_media_status'), interval=2.0)
+
+# Commands run as async subprocesses with streamed output
+command_runner = CommandRunner()
+
+# Results of allowlisted read-only commands, shared by clients that ask for cached output
+command_cache = CommandCache()
+
+# Background jobs, owned by client IP so a reconnecting device can reattach
+job_manager = JobManager()
+
+# Interactive terminal sessions, closed when their connection goes away
+pty_manager = PtyManager()
+
+# Clipboard changes pushed to paired clients
+clipboard_sync = ClipboardSync()
+
+# Event loop lag and the time each message type holds the loop
+loop_monitor = LoopMonitor()
+
+# Connection caps and per-client rate and memory limits
+admission = AdmissionControl()
+
+# Batched input events run here, one at a time, off the event loop
+input_executor = InputExecutor()
+
+# Connected clients, each with its own outbound queue and writer task
+sessions = SessionManager(on_expire=lambda session: reclaim_session(session))
+
 # Save QR code to Electron GUI's assets directory
 assets_dir = Path(__file__).parent.parent / "gui" / "assets"
 assets_dir.mkdir(exist_ok=True)
 
 
-def save_qr_code(pairing_info):
-    """Save QR code image to assets folder."""
-    try:
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=8,
-            border=2,
-        )
-        qr.add_data(json.dumps(pairing_info))
-        qr.make(fit=True)
-        
-        # Create QR code image
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to assets directory using a binary file handle to avoid linter errors
-        qr_file_path = assets_dir / "pairing_qr.png"
-        with open(qr_file_path, "wb") as f:
-            qr_image.save(f)
-        
-        print(f"✅ QR code saved to: {qr_file_path}")
-        print(f"📱 Scan this QR code with your mobile device to pair")
-        print(f"🔗 Or manually enter:")
-        print(f"   IP: {pairing_info['server_ip']}")
-        print(f"   Port: {pairing_info['port_no']}")
-        print(f"   Token: {pairing_info['pairing_token']}")
-        
-        return str(qr_file_path)
-        
-    except Exception as e:
-        print(f"❌ Failed to generate QR code: {e}")
-        return None
-
 def update_status(message):
     """Update the status message in console."""
     print(f"📱 Status: {message}")
 
 def get_local_ip():
-    """Get the local IP address of the machine."""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
-    except Exception:
-        return "127.0.0.1"
-
-def generate_token(length=8):
-    """Generate a random token for device pairing."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
-
-async def receive_data(websocket, client_ip):
-    """Receive and process data from WebSocket connection."""
+    """Get the local IP address of the machine, the best of the advertised candidates."""
+    return candidate_addresses()[0]
+
+async def receive_data(session, client_ip):
+    """
+    Receive data from WebSocket connection and hand each message to its lane.
+    Input is handled in arrival order, other requests run concurrently unless they
+    share an ordering key. Replies echo the request's requestId so clients can match them.
+    Messages over the client's rate or memory limits are answered with 'throttled'.
+    """
+    limits = session.limits
+    
+    async def handle(item):
+        data, size = item
+        try:
+            current_request.set(data.get('requestId'))
+            await loop_monitor.timed(data.get('type', 'unknown'), process_message(session, data, client_ip))
+        except InputBusyError:
+            throttle(session, data, 'input', 'Input is backed up, try again shortly', INPUT_BUSY_RETRY)
+        finally:
+            limits.release(size)
+    
+    def on_error(item, error):
+        if not isinstance(error, websockets.exceptions.ConnectionClosed):
+            print(f"Error handling {item[0].get('type')} from {client_ip}: {error}")
+    
+    def on_idle():
+        # Paired clients may stay quiet, the heartbeat tells whether they are still there
+        if not session.paired:
+            print(f'⏱️ Closing idle unpaired connection from {client_ip}')
+            session.close(code=1001, reason='Idle timeout')
+    
+    dispatcher = LaneDispatcher(handle, limits=LANE_LIMITS, on_error=on_error,
+                                ordered=ORDERED_LANES, key=lambda item: ordering_key(item[0]))
+    idle_timer = IdleTimer(IDLE_TIMEOUT, on_idle)
     try:
-        async for message in websocket:
+        async for message in session.websocket:
+            idle_timer.touch()
             # Parse JSON message first to check if it's a file chunk
             try:
                 data = json.loads(message)
                 msg_type = data.get('type', 'unknown')
                 
+                retry_after = limits.check(msg_type)
+                if retry_after is not None:
+                    throttle(session, data, 'rate', f'Too many {msg_type} messages', retry_after)
+                    continue
+                if msg_type == 'ping':
+                    # Older clients still send JSON pings, answer without logging or dispatch
+                    pong = {'type': 'pong', 'timestamp': asyncio.get_running_loop().time()}
+                    if data.get('requestId') is not None:
+                        pong['requestId'] = data['requestId']
+                    await session.send(pong)
+                    continue
+                
+                if not limits.reserve(len(message)):
+                    throttle(session, data, 'memory', 'Too much data waiting to be handled, slow down')
+                    continue
+                
                 # Don't print file chunk messages (they contain long base64 data)
                 if msg_type != 'file_chunk':
                     print(f'Received from {client_ip}: {message}')
                 
-                await process_message(websocket, data, client_ip)
+                await dispatcher.dispatch(MESSAGE_LANES.get(msg_type, 'control'), (data, len(message)))
             except json.JSONDecodeError:
                 print(f'Invalid JSON from {client_ip}: {message}')
                 # Send error response
@@ -100,74 +163,212 @@ async def receive_data(websocket, client_ip):
                     'type': 'error',
                     'message': 'Invalid JSON format'
                 }
-                await websocket.send(json.dumps(error_response))
+                await session.send(error_response)
                 
     except websockets.exceptions.ConnectionClosed:
         print(f'Client {client_ip} disconnected')
     except Exception as e:
         print(f'Error handling data from {client_ip}: {e}')
+    finally:
+        idle_timer.cancel()
+        dispatcher.close()
+
+def throttle(session, data, reason, message, retry_after=None):
+    """Tell a client its message was refused for going over a limit. Dropped if the client is backed up."""
+    response = {
+        'type': 'throttled',
+        'request': data.get('type'),
+        'reason': reason,   # 'rate', 'memory' or 'input'
+        'message': message
+    }
+    if retry_after is not None:
+        response['retryAfter'] = round(retry_after, 3)
+    if data.get('requestId') is not None:
+        response['requestId'] = data['requestId']
+    session.push(response, droppable=True)
+
+# Lane each message type travels in, anything not listed is control.
+# Input is handled and answered first, bulk transfers never hold it up.
+MESSAGE_LANES = {
+    'remote_input': 'input',
+    'input_batch': 'input',
+    'presentation': 'input',
+    'media': 'input',
+    'pty_input': 'input',
+    'file_start': 'bulk',
+    'file_chunk': 'bulk',
+    'file_end': 'bulk',
+    'file_list_request': 'bulk',
+    'file_download_request': 'bulk',
+}
+# Messages a lane may hold, queued or being handled, before reading from the socket pauses
+LANE_LIMITS = {'input': 256, 'control': 256, 'bulk': 32}
+# Lanes handled strictly one message at a time, keystrokes and clicks must not reorder
+ORDERED_LANES = ('input',)
+
+# In the other lanes, messages that must keep their order share a key: everything
+# about one upload, command, job or terminal, changes to the session itself, and
+# clipboard and notification requests. Anything else runs concurrently.
+ORDERING_FIELDS = {
+    'file_start': 'fileId',
+    'file_chunk': 'fileId',
+    'file_end': 'fileId',
+    'command': 'commandId',
+    'command_cancel': 'commandId',
+    'job_status': 'jobId',
+    'job_attach': 'jobId',
+    'job_detach': 'jobId',
+    'job_cancel': 'jobId',
+    'job_collect': 'jobId',
+    'pty_resize': 'sessionId',
+    'pty_ack': 'sessionId',
+    'pty_close': 'sessionId',
+}
+ORDERING_GROUPS = {
+    'hello': 'session',
+    'pair': 'session',
+    'resume': 'session',
+    'subscribe': 'session',
+    'unsubscribe': 'session',
+    'clipboard': 'clipboard',
+    'notification': 'notifications',
+    'notification_config': 'notifications',
+    'notification_history': 'notifications',
+}
+
+def ordering_key(data):
+    """Key of the messages this one must not overtake, None if it can run concurrently."""
+    msg_type = data.get('type')
+    if msg_type in ORDERING_GROUPS:
+        return ORDERING_GROUPS[msg_type]
+    field = ORDERING_FIELDS.get(msg_type)
+    if field is not None and data.get(field) is not None:
+        return (field, str(data[field]))
+    return None
 
-async def process_message(websocket, data, client_ip):
+# Requests that start new work, refused once shutdown has begun
+NEW_WORK_TYPES = {'file_start', 'command', 'job_submit', 'pty_open'}
+
+# The only requests a connection may send before it has paired ('ping' is answered in receive_data)
+UNPAIRED_TYPES = {'hello', 'pair', 'resume', 'ping'}
+
+async def process_message(session, data, client_ip):
     """Process different types of messages from clients."""
     msg_type = data.get('type', 'unknown')
     
+    if shutting_down and msg_type in NEW_WORK_TYPES:
+        await session.send({
+            'type': 'error',
+            'request': msg_type,
+            'message': 'Server is shutting down'
+        })
+        return
+    
+    if not session.paired and msg_type not in UNPAIRED_TYPES:
+        # Commands, terminals, input and files would hand the desktop to anyone on the network
+        await session.send({
+            'type': 'error',
+            'request': msg_type,
+            'message': 'Not paired, send pair or resume first'
+        })
+        return
+    
     if msg_type == 'hello':
-        # Client greeting
+        # Client greeting, optionally listing what the client supports
+        session.capabilities.update(data.get('capabilities') or [])
         response = {
             'type': 'hello_ack',
             'message': f'Hello acknowledged from server',
             'server_time': asyncio.get_event_loop().time()
         }
-        await websocket.send(json.dumps(response))
+        await session.send(response)
         
     elif msg_type == 'pair':
         # Device pairing request
-        client_token = data.get('token', '')
-        if client_token == TOKEN:
-            response = {
-                'type': 'pair_success',
-                'message': 'Device paired successfully',
-                'server_info': pairing_info
-            }
-            print(f'Device {client_ip} paired successfully')
-            update_status(f"Device {client_ip} paired successfully! ✅")
-        else:
-            response = {
-                'type': 'pair_failed',
-                'message': 'Invalid pairing token'
-            }
-            print(f'Failed pairing attempt from {client_ip}')
-            update_status(f"Failed pairing attempt from {client_ip} ❌")
-        await websocket.send(json.dumps(response))
+        response = await handle_pair(session, data, client_ip)
+        await session.send(response)
+        
+    elif msg_type == 'resume':
+        # Reconnecting client restoring its previous session instead of pairing again
+        response = await handle_resume(session, data, client_ip)
+        await session.send(response)
         
     elif msg_type == 'command':
-        # Handle device commands
-        command = data.get('command','')
+        # Handle device commands, output streams back as command_output / command_exit
+        response = await handle_command(session, data, client_ip)
+        await session.send(response)
         
-        response = await handle_command(command, client_ip)
-        await websocket.send(json.dumps(response))
+    elif msg_type == 'command_cancel':
+        response = await handle_command_cancel(session, data, client_ip)
+        await session.send(response)
+
+    elif msg_type in ('job_submit', 'job_status', 'job_attach', 'job_detach', 'job_cancel', 'job_collect'):
+        # Long-running commands that outlive the connection
+        response = await handle_job(session, msg_type, data, client_ip)
+        await session.send(response)
+
+    elif msg_type in ('pty_open', 'pty_input', 'pty_resize', 'pty_ack', 'pty_close'):
+        # Interactive terminal, output arrives as batched pty_output frames
+        response = await handle_pty(session, msg_type, data, client_ip)
+        if response:
+            await session.send(response)
         
     elif msg_type == 'file_transfer':
         # Handle file transfer requests
         file_info = data.get('file_info', {})
         response = await handle_file_transfer(file_info, client_ip)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
         
     elif msg_type == 'clipboard':
         # Handle clipboard operations
-        clipboard_data = data.get('data', '')
-        action = data.get('action', 'get')  # 'get' or 'set'
-        response = await handle_clipboard(action, clipboard_data, client_ip)
+        response, payload = await handle_clipboard(session, data, client_ip)
         print("Response: ", response)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
+        if payload is not None:
+            # Large or binary content follows as file chunks so it doesn't hog the connection
+            start_background(send_chunked(session, response['fileId'], payload, response['mime'], target='clipboard'))
         
-    elif msg_type == 'ping':
-        # Simple ping/pong for connection health
+    elif msg_type == 'subscribe':
+        # Push state updates for the requested topics instead of polling
+        topics = data.get('topics', [])
+        accepted, unknown = await subscriptions.subscribe(session, topics)
         response = {
-            'type': 'pong',
-            'timestamp': asyncio.get_event_loop().time()
+            'type': 'subscribe_response',
+            'topics': accepted,
+            'unknown': unknown
         }
-        await websocket.send(json.dumps(response))
+        await session.send(response)
+
+    elif msg_type == 'unsubscribe':
+        topics = data.get('topics')
+        subscriptions.unsubscribe(session, topics)
+        response = {
+            'type': 'unsubscribe_response',
+            'topics': topics if topics is not None else list(subscriptions.topics)
+        }
+        await session.send(response)
+
+    elif msg_type == 'notification':
+        # Phone notifications to mirror, either one or a batched 'notifications' array
+        response = await handle_notification(data, client_ip)
+        if data.get('ack', True):
+            await session.send(response)
+
+    elif msg_type == 'notification_config':
+        response = await handle_notification_config(data, client_ip)
+        await session.send(response)
+
+    elif msg_type == 'notification_history':
+        # Paginated, filtered notification history
+        response = await handle_notification_history(data, client_ip)
+        await session.send(response)
+
+    elif msg_type == 'loop_stats':
+        # Event loop lag and per-message-type blocking time, for finding handlers that hurt latency
+        response = {'type': 'loop_stats_response', **loop_monitor.stats()}
+        if data.get('reset'):
+            loop_monitor.reset()
+        await session.send(response)
 
     elif msg_type == 'get_hostname':
         # Respond with the server's hostname
@@ -177,52 +378,57 @@ async def process_message(websocket, data, client_ip):
         except Exception as e:
             print(f"Error getting hostname: {e}")
             response = {'type': 'hostname', 'hostname': 'Unknown'}
-        await websocket.send(json.dumps(response))
+        await session.send(response)
 
     elif msg_type == "presentation":
         print("Presentation message received")
         # Handle key press operations
         key = data.get('action', '')
         response = await handle_key_press(key, client_ip)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
         
     elif msg_type == "media":
         print("Media message received")
         action = data.get('action', '')
         response = await handle_media(action,data, client_ip)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
+        # Let subscribers see the new state without waiting for the next sample
+        subscriptions.request_sample(action if action in ('volume', 'brightness') else 'media')
         
     elif msg_type == "remote_input":
-        print("🖱️ Remote input message received from", client_ip)
-        print("📦 Data received:", data)
-        response = await handle_remote_input(data, client_ip)
-        await websocket.send(json.dumps(response))
+        response = await handle_remote_input(session, data, client_ip)
+        await session.send(response)
+        
+    elif msg_type == "input_batch":
+        response = await handle_input_batch(session, data)
+        if response is not None:
+            await session.send(response)
 
     # File transfer messages
     elif msg_type == "file_start":
         print("File start message received")
-        response = await handle_file_start(data, client_ip)
-        await websocket.send(json.dumps(response))
+        response = await handle_file_start(session, data, client_ip)
+        await session.send(response)
         
     elif msg_type == "file_chunk":
         # Remove the print statement - don't print file chunk messages
-        response = await handle_file_chunk(data, client_ip)
-        await websocket.send(json.dumps(response))
+        response = await handle_file_chunk(session, data, client_ip)
+        await session.send(response)
         
     elif msg_type == "file_end":
         print("File end message received")
-        response = await handle_file_end(data, client_ip)
-        await websocket.send(json.dumps(response))
+        response = await handle_file_end(session, data, client_ip)
+        await session.send(response)
         
     elif msg_type == "file_list_request":
         print("File list request received")
         response = await handle_file_list_request(data, client_ip)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
         
     elif msg_type == "file_download_request":
         print("File download request received")
         response = await handle_file_download_request(data, client_ip)
-        await websocket.send(json.dumps(response))
+        await session.send(response)
 
     else:
         # Unknown message type
@@ -230,9 +436,125 @@ async def process_message(websocket, data, client_ip):
             'type': 'error',
             'message': f'Unknown message type: {msg_type}'
         }
-        await websocket.send(json.dumps(response))
+        await session.send(response)
 
-async def handle_file_start(data, client_ip):
+async def handle_pair(session, data, client_ip):
+    """Pair with the current token, or with the credential this client got when it paired before."""
+    paired_clients = get_paired_clients()
+    client_id, client_key = data.get('clientId'), None
+    if not paired_clients.verify(client_id, data.get('clientKey')):
+        if not get_pairing().verify(data.get('token', '')):
+            print(f'Failed pairing attempt from {client_ip}')
+            update_status(f"Failed pairing attempt from {client_ip} ❌")
+            return {
+                'type': 'pair_failed',
+                'message': 'Invalid pairing token'
+            }
+        client_id, client_key = await asyncio.to_thread(paired_clients.issue, data.get('deviceName') or client_ip)
+    session.paired = True
+    session.client_id = client_id
+    session.capabilities.update(data.get('capabilities') or [])
+    response = {
+        'type': 'pair_success',
+        'message': 'Device paired successfully',
+        'server_info': get_pairing_info(),
+        'sessionId': session.id,
+        # Present this in a 'resume' frame after a reconnect to skip pairing
+        'resumeToken': sessions.issue_resume_token(session),
+        # Keep this to pair again without the token, until the desktop revokes it
+        'clientId': client_id,
+        # Keep these to find the desktop by discovery and check its replies
+        'deviceId': get_device_identity().device_id,
+        'discoveryKey': get_device_identity().key
+    }
+    if client_key is not None:
+        response['clientKey'] = client_key
+    print(f'Device {client_ip} paired successfully')
+    clipboard_sync.add_client(session)
+    update_status(f"Device {client_ip} paired successfully! ✅")
+    return response
+
+def revoke_client(client_id):
+    """Forget a paired client's credential and disconnect it. False if the client wasn't known."""
+    if not get_paired_clients().revoke(client_id):
+        return False
+    for session in list(sessions):
+        if session.client_id == client_id:
+            session.paired = False
+            session.close(code=4003, reason='Pairing revoked')
+    print(f'🔒 Revoked pairing of client {client_id}')
+    return True
+
+async def handle_admin(request):
+    """Requests from the desktop GUI over the admin channel: list or revoke paired clients."""
+    action = request.get('action')
+    if action == 'paired_clients':
+        connected = {session.client_id for session in sessions if session.paired}
+        clients = [{**client, 'connected': client['clientId'] in connected}
+                   for client in get_paired_clients().clients()]
+        return {'type': 'paired_clients', 'clients': clients}
+    if action == 'revoke_client':
+        client_id = request.get('clientId')
+        return {'type': 'revoke_client_response', 'clientId': client_id,
+                'revoked': isinstance(client_id, str) and revoke_client(client_id)}
+    return {'type': 'error', 'action': action, 'message': f'Unknown admin action: {action}'}
+
+async def handle_resume(session, data, client_ip):
+    """Restore a previous session from its resumption token."""
+    previous = sessions.take_resumable(str(data.get('token', '')))
+    if previous is not None and previous.client_id is not None and not get_paired_clients().known(previous.client_id):
+        # Revoked since
+        previous = None
+    if previous is None or previous is session:
+        print(f'Resume from {client_ip} refused, token unknown or expired')
+        return {
+            'type': 'resume_failed',
+            'message': 'Unknown or expired resume token, pair again'
+        }
+    topics = set(previous.resume_state.get('topics', [])) | set(subscriptions.topics_for(previous))
+    if not previous.closed:
+        # The old connection is dead but hasn't timed out yet
+        previous.close(code=4000, reason='Session resumed on a new connection')
+    
+    session.paired = True
+    session.client_id = previous.client_id
+    if previous.client_id is None:
+        job_manager.transfer(previous.id, session.id)
+    session.capabilities = set(previous.capabilities)
+    session.capabilities.update(data.get('capabilities') or [])
+    clipboard_sync.add_client(session)
+    accepted, _ = await subscriptions.subscribe(session, sorted(topics))
+    
+    # Uploads that were cut off continue from the next chunk the server doesn't have
+    transfers = []
+    for file_id, transfer in file_transfers.items():
+        if transfer['session_id'] == previous.id:
+            transfer['session_id'] = session.id
+            transfers.append({
+                'fileId': file_id,
+                'name': transfer['name'],
+                'nextIndex': transfer['next_index'],
+                'received': transfer['received']
+            })
+    print(f'Device {client_ip} resumed session {previous.id} as {session.id}')
+    update_status(f"Device {client_ip} reconnected ✅")
+    return {
+        'type': 'resume_success',
+        'sessionId': session.id,
+        'resumeToken': sessions.issue_resume_token(session),
+        'topics': accepted,
+        'transfers': transfers
+    }
+
+def reclaim_session(session):
+    """Free what a session left behind once it has disconnected and can't be resumed."""
+    abandoned = [file_id for file_id, transfer in file_transfers.items() if transfer['session_id'] == session.id]
+    for file_id in abandoned:
+        finish_transfer(file_id)
+    if abandoned:
+        print(f"🧹 Dropped {len(abandoned)} unfinished transfer(s) from {session.client_ip}")
+
+async def handle_file_start(session, data, client_ip):
     """Handle file transfer start."""
     file_id = data.get('fileId')
     # Handle both 'fileName' and 'name' field names
@@ -249,18 +571,46 @@ async def handle_file_start(data, client_ip):
     print(f"From: {client_ip}")
     print("-" * 50)
     
+    target = data.get('target', 'file')  # 'file' (Downloads) or 'clipboard'
+    if target == 'clipboard':
+        try:
+            check_clipboard_mime(mime_type)
+        except ValueError as e:
+            return {
+                'type': 'file_start_error',
+                'fileId': file_id,
+                'message': str(e)
+            }
+    
     # Automatically accept file transfer
     print(f"✅ Starting file transfer: {file_name}")
     
+    # A restarted transfer replaces the old one
+    finish_transfer(file_id)
+    if target == 'file':
+        # Spool to a hidden temp file next to the destination, renamed into place when complete
+        fd, temp_path = tempfile.mkstemp(dir=downloads_dir, prefix=SPOOL_PREFIX, suffix='.part')
+        spool = os.fdopen(fd, 'wb')
+    else:
+        temp_path, spool = None, None
+    
     # Initialize file transfer with proper filename
     file_transfers[file_id] = {
+        'session_id': session.id,  # partial uploads are dropped once the session is gone for good
         'name': str(file_name),  # Ensure it's a string and preserve original name
         'size': int(file_size),  # Ensure it's an integer
         'mime': mime_type,
-        'chunks': [],
+        'chunks': [],  # clipboard payloads stay in memory
+        'quota': session.limits,  # ...and count against the sender's memory quota
+        'charged': 0,
+        'spool': spool,
+        'temp_path': temp_path,
+        'next_index': 0,
         'received': 0,
         'last_percent': -1,  # Start at -1 to ensure first progress update
-        'status': 'receiving'
+        'status': 'receiving',
+        'target': target,
+        'finished': asyncio.get_running_loop().create_future()  # resolved once committed or dropped
     }
     
     return {
@@ -270,7 +620,7 @@ async def handle_file_start(data, client_ip):
         "status": "ready"
     }
 
-async def handle_file_chunk(data, client_ip):
+async def handle_file_chunk(session, data, client_ip):
     """Handle file chunk upload."""
     file_id = data.get('fileId')
     chunk_index = data.get('index', 0)
@@ -284,9 +634,47 @@ async def handle_file_chunk(data, client_ip):
             "message": "Transfer not found"
         }
     
+    if 'index' not in data:
+        chunk_index = transfer['next_index']  # older clients send chunks in order without one
+    elif not isinstance(chunk_index, int) or isinstance(chunk_index, bool) or chunk_index < 0:
+        return {
+            "type": "file_chunk_error",
+            "fileId": file_id,
+            "message": "index must be a non-negative integer"
+        }
+    if chunk_index < transfer['next_index']:
+        # Resent after a reconnect, the chunk is already stored
+        return {
+            "type": "file_chunk_response",
+            "fileId": file_id,
+            "index": chunk_index,
+            "status": "duplicate"
+        }
+    if chunk_index > transfer['next_index']:
+        # An earlier chunk was refused (throttled) or lost, appending this one would leave a hole
+        return {
+            "type": "file_chunk_error",
+            "fileId": file_id,
+            "index": chunk_index,
+            "nextIndex": transfer['next_index'],
+            "status": "out_of_order",
+            "message": f"Expected chunk {transfer['next_index']}, resend from there"
+        }
+
     try:
         # Decode chunk data
         chunk_bytes = base64.b64decode(chunk_data)
+        if transfer['spool'] is None:
+            if not transfer['quota'].reserve(len(chunk_bytes)):
+                return {
+                    "type": "throttled",
+                    "request": "file_chunk",
+                    "reason": "memory",
+                    "fileId": file_id,
+                    "index": chunk_index,
+                    "message": "Clipboard transfer exceeds the memory quota"
+                }
+            transfer['charged'] += len(chunk_bytes)
         transfer['received'] += len(chunk_bytes)
         
         # Calculate progress - handle division by zero
@@ -301,7 +689,11 @@ async def handle_file_chunk(data, client_ip):
             print(f"\r📁 Receiving {transfer['name']}: {percent}%", end='', flush=True)
         
         # Store chunk for later assembly
-        transfer['chunks'].append(chunk_data)
+        if transfer['spool'] is not None:
+            transfer['spool'].write(chunk_bytes)
+        else:
+            transfer['chunks'].append(chunk_bytes)
+        transfer['next_index'] += 1
         
         return {
             "type": "file_chunk_response",
@@ -319,7 +711,7 @@ async def handle_file_chunk(data, client_ip):
             "message": str(e)
         }
 
-async def handle_file_end(data, client_ip):
+async def handle_file_end(session, data, client_ip):
     """Handle file transfer end."""
     file_id = data.get('fileId')
     transfer = file_transfers.get(file_id)
@@ -334,32 +726,26 @@ async def handle_file_end(data, client_ip):
     try:
         print(f"\n Assembling file: {transfer['name']}")
         
-        # Combine all chunks
-        all_data = ''.join(transfer['chunks'])
-        file_buffer = base64.b64decode(all_data)
-        
-        # Save file to Downloads directory with original filename
-        file_path = downloads_dir / transfer['name']
-        
-        # Handle duplicate filenames by adding number suffix
-        counter = 1
-        original_path = file_path
-        while file_path.exists():
-            # Split filename and extension
-            stem = original_path.stem
-            suffix = original_path.suffix
-            file_path = downloads_dir / f"{stem}_{counter}{suffix}"
-            counter += 1
+        if transfer['target'] == 'clipboard':
+            # Large or binary clipboard content uploaded in chunks
+            file_buffer = b''.join(transfer['chunks'])
+            finish_transfer(file_id)
+            changed = await clipboard_sync.set_binary_from_client(session, file_buffer, transfer['mime'])
+            print(f"📋 Clipboard {'updated' if changed else 'unchanged'} from transfer ({transfer['mime']}, {len(file_buffer):,} bytes)")
+            return {
+                "type": "file_end_response",
+                "fileId": file_id,
+                "status": "success",
+                "target": "clipboard",
+                "fileSize": transfer['received']
+            }
         
-        with open(file_path, 'wb') as f:
-            f.write(file_buffer)
+        # A disconnect cancels this handler, the rename must not stop halfway
+        file_path = await shielded(finish_upload(file_id, transfer))
         
         print(f"✅ File saved: {file_path}")
         print(f"📊 Total received: {transfer['received']:,} bytes")
         
-        # Clean up transfer
-        del file_transfers[file_id]
-        
         return {
             "type": "file_end_response",
             "fileId": file_id,
@@ -370,12 +756,67 @@ async def handle_file_end(data, client_ip):
         
     except Exception as e:
         print(f"\n❌ Error saving file: {e}")
+        # The spool is closed or half-renamed by now, a retried file_end can't use it:
+        # drop the transfer and its temp file, the client has to start the upload again
+        finish_transfer(file_id)
         return {
             "type": "file_end_error",
             "fileId": file_id,
+            "restart": True,
             "message": str(e)
         }
 
+async def finish_upload(file_id, transfer):
+    """Commit an upload, then forget it; on failure its temp file is removed."""
+    try:
+        return await commit_transfer(transfer)
+    finally:
+        finish_transfer(file_id)
+
+async def commit_transfer(transfer):
+    """Flush a spooled upload to disk and atomically move it to its final name in Downloads."""
+    spool = transfer['spool']
+    await asyncio.to_thread(_flush_and_close, spool)
+    
+    # Save file to Downloads directory with original filename
+    file_path = downloads_dir / Path(transfer['name']).name
+    
+    # Handle duplicate filenames by adding number suffix
+    counter = 1
+    original_path = file_path
+    while file_path.exists():
+        # Split filename and extension
+        stem = original_path.stem
+        suffix = original_path.suffix
+        file_path = downloads_dir / f"{stem}_{counter}{suffix}"
+        counter += 1
+    
+    # Readers never see a half-written file, it appears complete or not at all
+    os.replace(transfer['temp_path'], file_path)
+    transfer['temp_path'] = None
+    return file_path
+
+def _flush_and_close(spool):
+    spool.flush()
+    os.fsync(spool.fileno())
+    spool.close()
+
+def finish_transfer(file_id):
+    """Forget a transfer, deleting its temp file if it was never committed."""
+    transfer = file_transfers.pop(file_id, None)
+    if transfer is None:
+        return
+    transfer['quota'].release(transfer['charged'])
+    if transfer['spool'] is not None and not transfer['spool'].closed:
+        transfer['spool'].close()
+    if transfer['temp_path'] is not None:
+        try:
+            os.unlink(transfer['temp_path'])
+        except OSError:
+            pass
+    if not transfer['finished'].done():
+        transfer['finished'].set_result(file_id)
+
 async def handle_file_list_request(data, client_ip):
     """Handle request for list of available files."""
     directory = data.get('directory', os.getcwd())
@@ -441,6 +882,41 @@ async def handle_file_download_request(data, client_ip):
             "message": str(e)
         }
 
+async def send_chunked(session, file_id, payload, mime, name='clipboard', target=None):
+    """Stream a payload to a client as file_start / file_chunk / file_end frames on the bulk lane."""
+    try:
+        await session.send({
+            "type": "file_start",
+            "fileId": file_id,
+            "fileName": name,
+            "fileSize": len(payload),
+            "mime": mime,
+            "target": target,
+            "chunks": (len(payload) + TRANSFER_CHUNK_SIZE - 1) // TRANSFER_CHUNK_SIZE
+        }, lane='bulk')
+        for index, offset in enumerate(range(0, len(payload), TRANSFER_CHUNK_SIZE)):
+            chunk = payload[offset:offset + TRANSFER_CHUNK_SIZE]
+            await session.send({
+                "type": "file_chunk",
+                "fileId": file_id,
+                "index": index,
+                "data": base64.b64encode(chunk).decode('ascii')
+            }, lane='bulk')
+        await session.send({
+            "type": "file_end",
+            "fileId": file_id,
+            "fileSize": len(payload)
+        }, lane='bulk')
+    except websockets.exceptions.ConnectionClosed:
+        print(f"❌ Connection closed while sending {file_id}")
+
+def start_background(coro):
+    """Run a coroutine as a task that outlives the current message."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 # ... rest of your existing functions remain the same ...
 
 async def handle_media(command,data, client_ip):
@@ -448,14 +924,14 @@ async def handle_media(command,data, client_ip):
     print(f'Media {command} from {client_ip}')
     if command == "volume":
         if data.get("value","") == "+":
-            set_volume(Volume.VUP)
+            await input_executor.call(features.set_volume, features.Volume.VUP)
             return {
                 "type": "volume_response",
                 "action": "volume",
                 "message": "Volume increased"
             }
         elif data.get("value","") == "-":
-            set_volume(Volume.VDOWN)
+            await input_executor.call(features.set_volume, features.Volume.VDOWN)
             return {
                 "type": "volume_response",
                 "action": "volume",
@@ -463,59 +939,232 @@ async def handle_media(command,data, client_ip):
             }
     elif command == "brightness":
         if data.get("value","") == "+":
-            set_brightness(Brightness.BUP)
+            await input_executor.call(features.set_brightness, features.Brightness.BUP)
             return {
                 "type": "brightness_response",
                 "action": "brightness",
                 "message": "Brightness increased"
             }
         elif data.get("value","") == "-":
-            set_brightness(Brightness.BDOWN)
+            await input_executor.call(features.set_brightness, features.Brightness.BDOWN)
             return {
                 "type": "brightness_response",
                 "action": "brightness",
                 "message": "Brightness decreased"
             }
     elif command == "playpause":
-        media_playback("playpause")
+        await input_executor.call(features.media_playback, "playpause")
         return {
             "type": "media_response",
             "action": "playpause",
             "message": "Play/Pause"
         }
     elif command == "next":
-        media_playback("next")
+        await input_executor.call(features.media_playback, "next")
         return {
             "type": "media_response",
             "action": "next",
             "message": "Next"
         }
     elif command == "previous":
-        media_playback("previous")
+        await input_executor.call(features.media_playback, "previous")
         return {
             "type": "media_response",
             "action": "previous",
             "message": "Previous"
         }
 
-async def handle_command(command, client_ip):
-    """Handle different device commands."""
+async def handle_command(session, data, client_ip):
+    """Start a command whose output is streamed back as command_output / command_exit messages."""
+    command = data.get('command', '')
+    command_id = str(data.get('commandId') or uuid.uuid4().hex)
     print(f'Executing command "{command}" from {client_ip}')
+    cached = bool(data.get('cache'))
     try:
-        response = run_command(command)
-    except Exception as e:
-        print(f'Error executing command "{command}" from {client_ip}: {e}')
-        response = {
-            'type': 'error',
-            'message': f'Error executing command "{command}": {e}'
+        prepare_command(command)
+        cached = cached and command_cache.cacheable(command)
+        # Taken before anything is awaited, so concurrent requests can't all pass the limit.
+        # Cached runs take a slot too, and can be cancelled like any other command
+        command_runner.reserve(session, command_id)
+    except (ValueError, SudoCommandError, CommandLimitError) as e:
+        print(f'Rejected command "{command}" from {client_ip}: {e}')
+        return {
+            'type': 'command_response',
+            'command': command,
+            'commandId': command_id,
+            'status': 'rejected',
+            'message': str(e)
         }
-    print("Response: ", response)
+    if cached:
+        start_background(run_cached_command(session, command_id, command, client_ip))
+    else:
+        start_background(run_streamed_command(session, command_id, command, client_ip))
     return {
         'type': 'command_response',
         'command': command,
-        'message': f'Command {command} executed successfully'
+        'commandId': command_id,
+        'status': 'started',
+        'message': f'Command {command} started'
     }
 
+async def run_streamed_command(session, command_id, command, client_ip):
+    """Run a command for a client, forwarding its output as it arrives."""
+    async def send(message):
+        try:
+            await session.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    try:
+        exit_code = await command_runner.run(session, command_id, command, send, reserved=True)
+        print(f'Command "{command}" from {client_ip} exited with {exit_code}')
+    except Exception as e:
+        print(f'Error executing command "{command}" from {client_ip}: {e}')
+        await send({
+            'type': 'command_exit',
+            'commandId': command_id,
+            'exitCode': None,
+            'error': str(e)
+        })
+
+async def run_cached_command(session, command_id, command, client_ip):
+    """
+    Answer an allowlisted read-only command from the cache, in the same messages as a
+    streamed run. It holds the command slot reserved for it until it answers. A cancel
+    doesn't stop the shared run other requests may be waiting on; the command just
+    exits with 'cancelled' and no output.
+    """
+    async def send(message):
+        try:
+            await session.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    try:
+        result, cached = await command_cache.run(command)
+    except Exception as e:
+        print(f'Error executing command "{command}" from {client_ip}: {e}')
+        await send({
+            'type': 'command_exit',
+            'commandId': command_id,
+            'exitCode': None,
+            'error': str(e)
+        })
+        return
+    finally:
+        cancelled = command_runner.release(session, command_id)
+    if cancelled:
+        await send({
+            'type': 'command_exit',
+            'commandId': command_id,
+            'exitCode': None,
+            'cancelled': True,
+            'cached': cached
+        })
+        return
+    for stream, text in (('stdout', result.stdout), ('stderr', result.stderr)):
+        if text:
+            await send({'type': 'command_output', 'commandId': command_id, 'stream': stream, 'data': text})
+    await send({
+        'type': 'command_exit',
+        'commandId': command_id,
+        'exitCode': result.returncode,
+        'truncated': False,
+        'timedOut': False,
+        'cached': cached
+    })
+
+async def handle_command_cancel(session, data, client_ip):
+    """Cancel (SIGTERM) or kill (SIGKILL) a running command."""
+    command_id = str(data.get('commandId', ''))
+    force = data.get('signal') == 'kill'
+    cancelled = command_runner.cancel(session, command_id, force=force)
+    print(f'{"Kill" if force else "Cancel"} command {command_id} from {client_ip}: {cancelled}')
+    return {
+        'type': 'command_cancel_response',
+        'commandId': command_id,
+        'status': 'signalled' if cancelled else 'not_running'
+    }
+
+def job_owner(session):
+    """
+    Jobs belong to the paired client's credential, so they can be reattached after any
+    reconnect, or else to the session. Never to an address several devices may share.
+    """
+    return session.client_id or session.id
+
+async def handle_job(session, msg_type, data, client_ip):
+    """Handle background job requests."""
+    job_id = str(data.get('jobId', ''))
+    owner = job_owner(session)
+    try:
+        if msg_type == 'job_submit':
+            job = job_manager.submit(owner, data.get('command', ''))
+            print(f'🛠️ Job {job.id} submitted by {client_ip}: {job.command}')
+            return {'type': 'job_submit_response', **job.to_dict()}
+        elif msg_type == 'job_status':
+            if job_id:
+                return {'type': 'job_status_response', 'jobs': [job_manager.get(owner, job_id).to_dict()]}
+            return {'type': 'job_status_response', 'jobs': [job.to_dict() for job in job_manager.jobs_for(owner)]}
+        elif msg_type == 'job_attach':
+            # Buffered output after 'since' is replayed as job_output frames, live output follows.
+            # A client that falls behind gets job_detached with the 'since' to re-attach from
+            job = await job_manager.attach(owner, job_id, session, since=data.get('since'))
+            return {'type': 'job_attach_response', **job.to_dict()}
+        elif msg_type == 'job_detach':
+            job_manager.detach(owner, job_id, session)
+            return {'type': 'job_detach_response', 'jobId': job_id}
+        elif msg_type == 'job_cancel':
+            cancelled = job_manager.cancel(owner, job_id, force=data.get('signal') == 'kill')
+            return {'type': 'job_cancel_response', 'jobId': job_id, 'status': 'signalled' if cancelled else 'not_running'}
+        else:
+            job = job_manager.collect(owner, job_id)
+            output = [{'seq': seq, 'stream': stream, 'data': text} for seq, stream, text in job.output]
+            return {'type': 'job_collect_response', **job.to_dict(), 'output': output}
+    except (ValueError, SudoCommandError, JobLimitError, JobNotFoundError) as e:
+        return {
+            'type': 'job_error',
+            'request': msg_type,
+            'jobId': job_id or None,
+            'message': str(e)
+        }
+
+async def handle_pty(session, msg_type, data, client_ip):
+    """Handle terminal session requests. Input, resize and ack are not answered."""
+    session_id = str(data.get('sessionId', ''))
+    try:
+        if msg_type == 'pty_open':
+            async def send(message):
+                try:
+                    await session.send(message)
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+            terminal = await pty_manager.open(
+                session, send,
+                cols=int(data.get('cols', 80)), rows=int(data.get('rows', 24))
+            )
+            print(f'🖥️ Terminal session {terminal.id} opened by {client_ip}')
+            return {'type': 'pty_open_response', 'sessionId': terminal.id, 'status': 'opened'}
+        if msg_type == 'pty_ack' and not pty_manager.has(session, session_id):
+            # Acks for output sent just before the shell exited
+            return None
+        terminal = pty_manager.get(session, session_id)
+        if msg_type == 'pty_input':
+            terminal.write(data.get('data', ''))
+        elif msg_type == 'pty_resize':
+            terminal.resize(int(data.get('cols', terminal.cols)), int(data.get('rows', terminal.rows)))
+        elif msg_type == 'pty_ack':
+            terminal.ack(int(data.get('bytes', 0)))
+        else:
+            # pty_exit follows once the shell has gone
+            terminal.close()
+        return None
+    except (KeyError, ValueError, RuntimeError, OSError) as e:
+        return {
+            'type': 'pty_error',
+            'request': msg_type,
+            'sessionId': session_id or None,
+            'message': str(e).strip("'")
+        }
+
 async def handle_file_transfer(file_info, client_ip):
     """Handle file transfer operations."""
     print(f'File transfer request from {client_ip}: {file_info}')
@@ -528,44 +1177,165 @@ async def handle_file_transfer(file_info, client_ip):
         'message': 'File transfer ready'
     }
 
-async def handle_clipboard(action, data, client_ip):
-    """Handle clipboard operations."""
-    print(f'Clipboard {action} from {client_ip}')
+async def handle_clipboard(session, data, client_ip):
+    """
+    Handle clipboard operations.
+    Returns the response and, for content too large or binary to send inline, the payload
+    to stream after it as file chunks.
+    """
+    action = data.get('action', 'get')  # 'get' or 'set'
+    mime = data.get('mime', TEXT_MIME)
+    print(f'Clipboard {action} ({mime}) from {client_ip}')
     
-    if action == 'get':  
-        data = send_clipboard()
-        print("Clipboard data: ", data)
+    if action == 'get':
+        try:
+            payload, mime = await clipboard_sync.read(
+                mime,
+                max_dimension=data.get('maxDimension'),
+                image_format=data.get('imageFormat', 'PNG')
+            )
+        except ValueError as e:
+            return {
+                'type': 'error',
+                'request': 'clipboard',
+                'action': 'get',
+                'message': str(e)
+            }, None
+        if payload is None:
+            return {
+                'type': 'clipboard_response',
+                'action': 'get',
+                'mime': mime,
+                'data': None,
+                'message': f'No {mime} content on the clipboard'
+            }, None
+        if mime == TEXT_MIME and len(payload) <= CLIPBOARD_INLINE_LIMIT:
+            return {
+                'type': 'clipboard_response',
+                'action': 'get',
+                'mime': mime,
+                'data': payload.decode('utf-8')
+            }, None
         return {
             'type': 'clipboard_response',
             'action': 'get',
-            'data': data
-        }
+            'mime': mime,
+            'data': None,
+            'fileId': f"clipboard_{uuid.uuid4().hex}",
+            'size': len(payload),
+            'chunked': True
+        }, payload
     elif action == 'set':
-        # Set clipboard content
-        recieve_clipboard(data)
+        # Set clipboard content, skipped when it is already on the clipboard
+        # (large or binary content is uploaded with file_start target='clipboard' instead)
+        text = data.get('data', '')
+        if not isinstance(text, str):
+            return {
+                'type': 'error',
+                'request': 'clipboard',
+                'action': 'set',
+                'message': 'data must be a string'
+            }, None
+        try:
+            changed = await clipboard_sync.set_from_client(session, text)
+        except Exception as e:
+            print(f"❌ Error setting clipboard: {e}")
+            return {
+                'type': 'error',
+                'request': 'clipboard',
+                'action': 'set',
+                'message': 'Failed to set the clipboard'
+            }, None
         return {
             'type': 'clipboard_response',
             'action': 'set',
-            'message': 'Clipboard updated'
-        }
+            'message': 'Clipboard updated' if changed else 'Clipboard unchanged'
+        }, None
     else:
         return {
             'type': 'error',
             'message': f'Unknown clipboard action: {action}'
+        }, None
+
+async def handle_notification(data, client_ip):
+    """Handle mirrored phone notifications."""
+    notifications = data.get('notifications')
+    if not isinstance(notifications, list):
+        notifications = [data]
+    try:
+        accepted = await notification_server.handle_phone_notifications(notifications)
+    except ValueError as e:
+        return {
+            'type': 'error',
+            'request': 'notification',
+            'message': str(e)
         }
+    return {
+        'type': 'notification_response',
+        'received': accepted
+    }
+
+async def handle_notification_config(data, client_ip):
+    """Handle per-app notification batching windows."""
+    try:
+        windows = {str(app_name): max(0.0, float(seconds)) for app_name, seconds in data.get('windows', {}).items()}
+        default_window = max(0.0, float(data['default_window'])) if 'default_window' in data else None
+        # All of the per-app windows or none of them, past the cap
+        notification_server.batcher.set_windows(windows)
+        if default_window is not None:
+            notification_server.set_batch_window(None, default_window)
+    except (AttributeError, TypeError, ValueError) as e:
+        return {
+            'type': 'error',
+            'message': f'Invalid notification config: {e}'
+        }
+    batcher = notification_server.batcher
+    return {
+        'type': 'notification_config_response',
+        'default_window': batcher.default_window,
+        'windows': batcher.windows
+    }
+
+async def handle_notification_history(data, client_ip):
+    """Handle a notification history page request."""
+    try:
+        limit = max(1, min(int(data.get('limit', 50)), 200))
+        items, next_cursor = await notification_server.get_notification_history(
+            app=data.get('app'),
+            since=data.get('since'),
+            until=data.get('until'),
+            cursor=data.get('cursor'),
+            limit=limit
+        )
+    except (TypeError, ValueError) as e:
+        return {
+            'type': 'error',
+            'message': f'Invalid notification history query: {e}'
+        }
+    print(f'📜 Notification history request from {client_ip}: {len(items)} items')
+    return {
+        'type': 'notification_history_response',
+        'items': items,
+        'count': len(items),
+        'cursor': next_cursor
+    }
 
 async def handle_key_press(key, client_ip):
     """Handle key press operations."""
     print(f'Key press {key} from {client_ip}')
-    press_key(key)
+    await input_executor.call(features.press_key, key)
     return {
         'type': 'key_press_response',
         'key': key,
         'message': 'Key pressed'
     }
 
-async def handle_remote_input(data, client_ip):
+async def handle_remote_input(session, data, client_ip):
     """Handle remote input (touchpad) operations."""
+    if data.get('mode') == 'relative':
+        return await handle_relative_input(session, data)
+    print("🖱️ Remote input message received from", client_ip)
+    print("📦 Data received:", data)
     fingerX = data.get('fingerX', 0)
     fingerY = data.get('fingerY', 0)
     normalizedX = data.get('normalizedX', 0)
@@ -575,8 +1345,28 @@ async def handle_remote_input(data, client_ip):
     
     print(f'Remote input from {client_ip}: fingerX={fingerX}, fingerY={fingerY}, normalized=({normalizedX}, {normalizedY})')
     
-    # Get current screen dimensions
+    # On the input thread, like every other injection
+    success, targetX, targetY = await input_executor.call(move_to_finger, normalizedX, normalizedY)
+    
+    if success:
+        print(f'✅ Cursor moved to: ({targetX}, {targetY}) based on finger position ({fingerX}, {fingerY})')
+        return {
+            'type': 'remote_input_response',
+            'status': 'success',
+            'message': f'Cursor moved to ({targetX}, {targetY})'
+        }
+    else:
+        print(f'❌ Error moving cursor')
+        return {
+            'type': 'remote_input_response',
+            'status': 'error',
+            'message': 'Failed to move cursor'
+        }
+
+def move_to_finger(normalizedX, normalizedY):
+    """Absolute touchpad mode: move the pointer to the same fraction of the screen. Runs on the input thread."""
     import pyautogui
+    # Get current screen dimensions
     screen_width, screen_height = pyautogui.size()
     
     # Calculate target cursor position on screen based on finger position
@@ -591,89 +1381,377 @@ async def handle_remote_input(data, client_ip):
     deltaY = targetY - currentY
     
     # Use the existing move_cursor function from mouse_keyboard.py
-    success = move_cursor(deltaX, deltaY)
-    
-    if success:
-        print(f'✅ Cursor moved to: ({targetX}, {targetY}) based on finger position ({fingerX}, {fingerY})')
+    return features.move_cursor(deltaX, deltaY), targetX, targetY
+
+def get_touchpad(session):
+    """The session's relative pointer state, created on first use."""
+    if session.touchpad is None:
+        session.touchpad = features.Touchpad(
+            features.AccelerationCurve(TOUCHPAD_SENSITIVITY, TOUCHPAD_ACCELERATION)
+        )
+    return session.touchpad
+
+async def handle_input_batch(session, data):
+    """
+    Run an ordered batch of input events (move, click, down, up, scroll, key) on the
+    input thread and answer with one input_batch_response, or nothing when 'ack' is
+    false. Invalid batches are refused whole and always answered.
+    """
+    try:
+        events = validate_events(data.get('events'))
+    except ValueError as e:
+        return {
+            'type': 'input_batch_response',
+            'status': 'error',
+            'executed': 0,
+            'message': str(e)
+        }
+    if data.get('timing') and events[-1]['t']:
+        # Timed batches hold the input thread while they wait, so each client gets a budget
+        retry_after = session.limits.check('input_timed', events[-1]['t'] / 1000)
+        if retry_after is not None:
+            throttle(session, data, 'rate', 'Too much timed input, send it untimed or wait', retry_after)
+            return None
+    touchpad = get_touchpad(session)
+    if data.get('phase') == 'begin':
+        touchpad.begin()
+    result = await input_executor.submit(events, touchpad, timing=bool(data.get('timing')))
+    if result['error'] is not None:
+        print(f'❌ Input batch stopped at {result["error"]}')
+        touchpad.begin()   # the pointer may not be where we think
+    elif data.get('ack', True) is False:
+        return None
+    response = {
+        'type': 'input_batch_response',
+        'status': 'error' if result['error'] else 'success',
+        'executed': result['executed'],
+        'count': len(events)
+    }
+    if result['error']:
+        response['message'] = result['error']
+    if data.get('timing'):
+        response['lateMs'] = result['lateMs']
+    if touchpad.position is not None:
+        response['x'], response['y'] = touchpad.position
+    return response
+
+async def handle_relative_input(session, data):
+    """
+    Relative touchpad mode: {'dx', 'dy'} finger deltas, 'dt' milliseconds since the
+    previous sample and 'phase' 'begin' on touch down. Moves the pointer by the
+    accelerated delta on the input thread, one move per event and no position lookup.
+    """
+    try:
+        dx, dy = float(data.get('dx', 0)), float(data.get('dy', 0))
+    except (TypeError, ValueError):
         return {
             'type': 'remote_input_response',
-            'status': 'success',
-            'message': f'Cursor moved to ({targetX}, {targetY})'
+            'status': 'error',
+            'message': 'dx and dy must be numbers'
         }
-    else:
-        print(f'❌ Error moving cursor')
+    touchpad = get_touchpad(session)
+    if data.get('phase') == 'begin':
+        touchpad.begin()
+    dt = data.get('dt')
+    try:
+        x, y = await input_executor.call(touchpad.move, dx, dy, dt / 1000 if isinstance(dt, (int, float)) else None)
+    except InputBusyError:
+        # Answered as 'throttled' by receive_data, the move never ran
+        raise
+    except Exception as e:
+        print(f'❌ Error moving cursor: {e}')
+        touchpad.begin()
         return {
             'type': 'remote_input_response',
             'status': 'error',
             'message': 'Failed to move cursor'
         }
+    return {
+        'type': 'remote_input_response',
+        'status': 'success',
+        'x': x,
+        'y': y
+    }
 
 async def handle_connection(websocket):  # Fixed: removed 'path' parameter
     """Handle WebSocket connection."""
     client_ip = websocket.remote_address[0]
+    refused = admission.admit(client_ip)
+    if refused is not None:
+        print(f'⛔ Refused connection from {client_ip}: {refused}')
+        try:
+            await websocket.send(json.dumps({'type': 'throttled', 'reason': 'connections', 'message': refused}))
+            await websocket.close(1013, 'Too many connections')
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        return
     print(f'Client connected from {client_ip}!')
+    session = sessions.register(websocket)
+    session.limits = admission.limits(client_ip)
+    # Lag is only sampled while someone is connected, an idle server doesn't wake up
+    loop_monitor.start()
     
     # Update GUI status
     update_status(f"Device connected from {client_ip}")
     
-    # Send welcome message
+    # Send welcome message. No pairing token in it: the client has to bring one
     welcome_msg = {
         'type': 'hello',
-        'token': TOKEN,
+        'sessionId': session.id,
         'message': 'Welcome from server!'
     }
-    await websocket.send(json.dumps(welcome_msg))
     
     # Start receiving data
-    await receive_data(websocket, client_ip)
+    try:
+        await session.send(welcome_msg)
+        await receive_data(session, client_ip)
+    finally:
+        # Kept with the resume token so a reconnect can subscribe to the same topics
+        topics = subscriptions.topics_for(session)
+        subscriptions.unsubscribe(session)
+        clipboard_sync.remove_client(session)
+        command_runner.cancel_all(session)
+        job_manager.detach_all(session)
+        pty_manager.close_all(session)
+        admission.release(client_ip)
+        loop_monitor.stop()
+        await sessions.unregister(session, topics=topics)
+
+def get_pairing():
+    """The pairing token service, created on first use."""
+    global _pairing
+    if _pairing is None:
+        _pairing = PairingService(
+            describe_server, data_dir / "qr_cache", publish_path=assets_dir / "pairing_qr.png",
+            token_ttl=PAIRING_TOKEN_TTL, grace=PAIRING_TOKEN_GRACE
+        )
+    return _pairing
 
 def get_pairing_info():
-    return pairing_info
+    """Pairing details for the current token, what the QR code encodes."""
+    return get_pairing().info()
+
+def describe_server():
+    """Everything in the QR code but the token. Finding the LAN addresses opens sockets."""
+    candidates = candidate_addresses()
+    info = {
+        'server_ip': candidates[0],
+        # Every usable interface, best first; clients race them and keep the first that connects
+        'candidates': candidates,
+        'port_no': PORT,
+        'device_id': get_device_identity().device_id,
+        'scheme': 'ws' if _tls_identity is None else 'wss',
+    }
+    if _tls_identity is not None:
+        # Clients accept only this certificate, there is no CA to vouch for it
+        info['cert_sha256'] = _tls_identity.fingerprint
+    return info
+
+def get_device_identity():
+    """This desktop's persistent device ID and discovery key, loaded on first use."""
+    global _device_identity
+    if _device_identity is None:
+        _device_identity = DeviceIdentity.load(data_dir / "device.json")
+    return _device_identity
 
-def show_qr_window(pairing_info):
-    """This function is kept for compatibility but now just saves QR code to file."""
-    print("QR code window functionality has been replaced with file-based QR code generation.")
-    print("QR code is automatically saved to the temp directory.")
-    return save_qr_code(pairing_info)
+def get_paired_clients():
+    """Credentials of the clients paired with this desktop, loaded on first use."""
+    global _paired_clients
+    if _paired_clients is None:
+        _paired_clients = PairedClients(data_dir / "paired_clients.json")
+    return _paired_clients
 
-async def main(stop_event=None):
-    """Main server function."""
+def start_tls():
+    """Load or create the certificate and return the server's SSL context, None to serve plain ws://."""
+    global _tls_identity
+    if not USE_TLS:
+        return None
+    try:
+        identity = TlsIdentity.load(data_dir / "tls", common_name=f"syncbridge-{get_device_identity().device_id[:8]}")
+        context = server_context(identity)
+    except (TlsUnavailable, OSError, ssl.SSLError) as e:
+        print(f"❌ TLS unavailable, serving plain ws:// instead: {e}")
+        return None
+    _tls_identity = identity
+    return context
+
+def show_qr_window(pairing_info=None):
+    """This function is kept for compatibility, the QR code is published to the GUI assets."""
+    return str(get_pairing().publish_path)
+
+async def main(stop_event=None, admin=None):
+    """
+    Main server function.
+    stop_event is a threading/multiprocessing Event, or anything with a fileno()
+    (such as the read end of a pipe) that becomes readable when the server should stop.
+    admin is the server's end of a multiprocessing Pipe the GUI sends requests over,
+    see handle_admin().
+    """
+    ssl_context = start_tls()   # before the pairing info, which carries the certificate fingerprint
+    pairing_info = get_pairing_info()
     print('--- WebSocket Pairing Server ---')
     print(f'LAN IP: {pairing_info["server_ip"]}')
+    if len(pairing_info['candidates']) > 1:
+        print(f'Other addresses: {", ".join(pairing_info["candidates"][1:])}')
     print(f'Port: {PORT}')
-    print(f'Pairing token: {TOKEN}')
+    if ssl_context is not None:
+        print(f'🔐 TLS: wss:// with certificate SHA-256 {pairing_info["cert_sha256"]}')
+    print(f'Pairing token: {pairing_info["pairing_token"]}')
+    print(f'Event loop: {loop_name()}')
+    
+    # Uploads cut off by a crash never got committed
+    for stale in downloads_dir.glob(f'{SPOOL_PREFIX}*.part'):
+        stale.unlink(missing_ok=True)
     
-    # Save QR code to temp folder instead of creating GUI window
-    qr_file_path = save_qr_code(pairing_info)
-    if qr_file_path:
-        print(f'--- QR code saved to: {qr_file_path} ---')
-    print('--- Waiting for mobile device to connect... ---')
+    # Sleep until something asks us to stop, nothing polls in between
+    trigger = ShutdownTrigger()
+    trigger.install_signal_handlers()
+    if stop_event is not None:
+        if hasattr(stop_event, 'fileno'):
+            trigger.watch_fd(stop_event.fileno())
+        else:
+            trigger.watch_event(stop_event)
+    if admin is not None:
+        AdminChannel(admin, handle_admin)
     
-    # Start WebSocket server
-    server = await websockets.serve(handle_connection, "0.0.0.0", PORT)
+    # Start WebSocket server, protocol-level pings detect dead connections
+    server = await websockets.serve(
+        handle_connection, HOST, PORT,
+        ssl=ssl_context,
+        open_timeout=HANDSHAKE_TIMEOUT,
+        max_size=MAX_MESSAGE_SIZE,
+        ping_interval=HEARTBEAT_INTERVAL,
+        ping_timeout=HEARTBEAT_TIMEOUT,
+        close_timeout=CLOSE_TIMEOUT
+    )
+    discovery, advertisement = await start_discovery(pairing_info)
     
     try:
-        while True:
-            # Check the stop_event every 0.5 seconds
-            if stop_event and stop_event.is_set():
-                print("Shutting down websocket server...")
-                break
-            await asyncio.sleep(0.5)
+        # The QR code renders off the loop, so clients can connect while qrcode and PIL load
+        pairing = get_pairing()
+        try:
+            await pairing.start()
+            print(f'--- QR code saved to: {pairing.publish_path} ---')
+            print(f"📱 Scan this QR code with your mobile device to pair")
+        except Exception as e:
+            print(f"❌ Failed to generate QR code: {e}")
+        print(f"🔗 Or manually enter:")
+        print(f"   IP: {pairing_info['server_ip']}")
+        print(f"   Port: {pairing_info['port_no']}")
+        print(f"   Token: {pairing_info['pairing_token']} (changes every {PAIRING_TOKEN_TTL // 60} min)")
+        print('--- Waiting for mobile device to connect... ---')
+        
+        reason = await trigger.wait()
+        print(f"Shutting down websocket server ({reason})...")
+        await drain(server, SHUTDOWN_DEADLINE)
     finally:
+        trigger.close()
+        get_pairing().stop()
+        await clipboard_sync.close()
+        if discovery is not None:
+            discovery.close()
+        if advertisement is not None:
+            await advertisement.close()
+        # Remaining connections are closed with 1001 (going away)
+        for session in sessions:
+            session.close(code=1001, reason='Server shutting down')
         server.close()
         await server.wait_closed()
 
-def run_server(stop_event=None):
-    asyncio.run(main(stop_event))
+async def start_discovery(pairing_info):
+    """Answer discovery broadcasts, and advertise over mDNS if zeroconf is installed."""
+    if DISCOVERY_PORT is None:
+        return None, None
+    identity = get_device_identity()
+    hostname = socket.gethostname()
+    
+    def info():
+        # Addresses are looked up again whenever the pairing token rotates
+        pairing_info = get_pairing_info()
+        details = {'name': hostname, 'ip': pairing_info['server_ip'],
+                   'candidates': pairing_info['candidates'], 'port': PORT, 'scheme': pairing_info['scheme']}
+        if 'cert_sha256' in pairing_info:
+            # Signed with the discovery key, so a paired client can tell it came from this desktop
+            details['certSha256'] = pairing_info['cert_sha256']
+        return details
+    
+    try:
+        transport, _ = await start_responder(identity, info, port=DISCOVERY_PORT)
+        print(f'📡 Answering discovery requests on UDP port {DISCOVERY_PORT}')
+    except OSError as e:
+        print(f'❌ Discovery unavailable, UDP port {DISCOVERY_PORT}: {e}')
+        transport = None
+    try:
+        advertisement = await advertise_mdns(identity, hostname, PORT, pairing_info['candidates'])
+    except Exception as e:
+        print(f'❌ mDNS advertisement failed: {e}')
+        advertisement = None
+    return transport, advertisement
+
+async def drain(server, deadline):
+    """
+    Stop taking new connections and new work, give in-flight uploads, commands and
+    jobs up to `deadline` seconds to finish, then stop whatever is left.
+    """
+    global shutting_down
+    shutting_down = True
+    server.close(close_connections=False)
+    sessions.broadcast({
+        'type': 'server_shutdown',
+        'message': 'Server is shutting down',
+        'deadline': deadline
+    }, paired_only=False)
+    
+    pending = [transfer['finished'] for transfer in file_transfers.values()]
+    pending += list(background_tasks)
+    pending += [job.task for job in job_manager.jobs.values() if job.status == 'running']
+    if pending:
+        print(f"⏳ Waiting up to {deadline}s for {len(pending)} transfer(s) and command(s) to finish")
+        done, left = await asyncio.wait(pending, timeout=deadline)
+        if left:
+            print(f"⚠️ Stopping {len(left)} transfer(s) and command(s) still running after {deadline}s")
+    
+    for session in sessions:
+        command_runner.cancel_all(session)
+        pty_manager.close_all(session)
+    job_manager.cancel_all()
+    for file_id in list(file_transfers):
+        # Unfinished uploads never reach Downloads, their temp files are removed
+        finish_transfer(file_id)
+
+def run_server(stop_event=None, admin=None):
+    run_loop(main(stop_event, admin), use_uvloop=USE_UVLOOP)
 
 # Server configuration
+HOST = None              # None listens on every IPv4 and IPv6 interface
 PORT = 9000
-TOKEN = generate_token()
-pairing_info = {
-    'server_ip': get_local_ip(),
-    'port_no': PORT,
-    'pairing_token': TOKEN,
-}
+USE_UVLOOP = True        # run on uvloop when it is installed
+SHUTDOWN_DEADLINE = 10   # seconds in-flight uploads and commands get to finish on shutdown
+HEARTBEAT_INTERVAL = 10  # seconds between server pings
+HEARTBEAT_TIMEOUT = 10   # seconds to wait for the pong before dropping the connection
+CLOSE_TIMEOUT = 5        # seconds a dead peer gets to finish the closing handshake
+HANDSHAKE_TIMEOUT = 10   # seconds a new connection gets to complete the websocket handshake
+IDLE_TIMEOUT = 60        # seconds an unpaired connection may stay silent before it is closed
+MAX_MESSAGE_SIZE = 1024 * 1024  # bytes, larger frames close the connection
+DISCOVERY_PORT = 9001    # UDP port answering LAN discovery broadcasts, None to disable
+TOUCHPAD_SENSITIVITY = 1.0   # screen pixels per touchpad unit for slow relative moves
+TOUCHPAD_ACCELERATION = 2.0  # extra gain for fast moves, 0 turns acceleration off
+INPUT_BUSY_RETRY = 0.1   # seconds a client is told to wait when the input thread is backed up
+USE_TLS = False          # serve wss:// with a self-signed certificate pinned through the QR code
+PAIRING_TOKEN_TTL = 600  # seconds a pairing token (and its QR code) is valid before it rotates
+PAIRING_TOKEN_GRACE = 60 # seconds the previous token is still accepted after a rotation
+_pairing = None          # created on first use, see get_pairing()
+_device_identity = None  # loaded on first use, see get_device_identity()
+_paired_clients = None   # loaded on first use, see get_paired_clients()
+_tls_identity = None     # set by start_tls() when the server runs wss://
+
+def __getattr__(name):
+    # TOKEN and pairing_info used to be created at import time
+    if name == 'TOKEN':
+        return get_pairing_info()['pairing_token']
+    if name == 'pairing_info':
+        return get_pairing_info()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     asyncio.run(main())
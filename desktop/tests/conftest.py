@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from desktop.features.touchpad import AccelerationCurve, Touchpad
+
+# A 4K screen with a 1080p one to its right, bottoms not aligned
+MONITORS = [(0, 0, 3840, 2160), (3840, 0, 1920, 1080)]
+
+
+class FakeClock:
+    """A clock tests move by hand; sleep() advances it and records the wait."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(round(seconds, 3))
+        self.now += seconds
+
+
+class FakeInputBackend:
+    """Records pointer, button, wheel and key calls instead of injecting them."""
+
+    def __init__(self, position=(100, 100), fail_on=None):
+        self.start = position
+        self.fail_on = fail_on
+        self.queries = 0
+        self.calls = []
+        self.threads = set()
+
+    @property
+    def moves(self):
+        return [call[1:] for call in self.calls if call[0] == 'move_to']
+
+    def _record(self, *call):
+        self.threads.add(threading.current_thread().name)
+        if call[0] == self.fail_on:
+            raise RuntimeError('injection failed')
+        self.calls.append(call)
+
+    def position(self):
+        self.queries += 1
+        return self.start
+
+    def move_to(self, x, y):
+        self._record('move_to', x, y)
+
+    def click(self, button, clicks):
+        self._record('click', button, clicks)
+
+    def down(self, button):
+        self._record('down', button)
+
+    def up(self, button):
+        self._record('up', button)
+
+    def scroll(self, dx, dy):
+        self._record('scroll', dx, dy)
+
+    def key(self, key):
+        self._record('key', key)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def monitors():
+    return MONITORS
+
+
+@pytest.fixture
+def make_backend():
+    return FakeInputBackend
+
+
+@pytest.fixture
+def make_touchpad(clock):
+    """Touchpads without acceleration on MONITORS, driven by the test's clock."""
+    def make(backend, curve=None, monitors=MONITORS):
+        return Touchpad(curve or AccelerationCurve(sensitivity=1.0, acceleration=0), backend,
+                        layout=lambda: monitors, clock=clock)
+    return make
@@ -0,0 +1,82 @@
+import asyncio
+import socket
+import sys
+import types
+from collections import namedtuple
+
+import websockets
+
+from desktop.server import addresses
+from desktop.server.addresses import candidate_addresses, candidate_urls, race_connect
+
+Addr = namedtuple('Addr', 'family address')
+Stats = namedtuple('Stats', 'isup')
+
+
+def fake_psutil(interfaces, down=()):
+    module = types.ModuleType('psutil')
+    module.net_if_addrs = lambda: {
+        name: [Addr(socket.AF_INET6 if ':' in address else socket.AF_INET, address) for address in addrs]
+        for name, addrs in interfaces.items()
+    }
+    module.net_if_stats = lambda: {name: Stats(name not in down) for name in interfaces}
+    return module
+
+
+def test_candidates_prefer_the_default_route_and_physical_interfaces(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'psutil', fake_psutil({
+        'lo': ['127.0.0.1', '::1'],
+        'docker0': ['172.17.0.1'],
+        'wlan0': ['10.0.0.5'],
+        'eth0': ['fe80::1%eth0', '2001:db8::20', '192.168.1.20'],
+        'wg0': ['10.8.0.2'],
+        'eth1': ['192.168.50.3'],
+    }, down={'wlan0'}))
+    monkeypatch.setattr(addresses, 'primary_address',
+                        lambda family=socket.AF_INET: '192.168.50.3' if family == socket.AF_INET else None)
+    assert candidate_addresses() == ['192.168.50.3', '192.168.1.20', '2001:db8::20', '172.17.0.1', '10.8.0.2']
+    assert candidate_addresses(limit=2) == ['192.168.50.3', '192.168.1.20']
+
+
+def test_no_network_falls_back_to_loopback(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'psutil', fake_psutil({'lo': ['127.0.0.1']}))
+    monkeypatch.setattr(addresses, 'primary_address', lambda family=socket.AF_INET: None)
+    assert candidate_addresses() == ['127.0.0.1']
+
+
+def test_urls_bracket_ipv6():
+    assert candidate_urls(['192.168.1.20', 'fd00::5'], 9000) == ['ws://192.168.1.20:9000', 'ws://[fd00::5]:9000']
+
+
+def test_race_connect_takes_the_first_candidate_that_answers():
+    async def handler(websocket):
+        await websocket.wait_closed()
+
+    async def scenario():
+        async with websockets.serve(handler, '127.0.0.1', 0) as server:
+            port = list(server.sockets)[0].getsockname()[1]
+            with socket.socket() as closed:
+                closed.bind(('127.0.0.1', 0))
+                refused_port = closed.getsockname()[1]
+            started = []
+
+            async def connect(url):
+                started.append(url)
+                if 'never' in url:
+                    await asyncio.sleep(10)
+                return await websockets.connect(url.replace('never', '127.0.0.1'))
+
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            url, connection = await race_connect(
+                [f'ws://127.0.0.1:{refused_port}', f'ws://never:{port}', f'ws://127.0.0.1:{port}'],
+                connect, stagger=0.05)
+            elapsed = loop.time() - start
+            await connection.close()
+            return url, port, started, elapsed
+
+    url, port, started, elapsed = asyncio.run(scenario())
+    assert url == f'ws://127.0.0.1:{port}'
+    # The refused attempt didn't cost a stagger, the hanging one cost exactly one
+    assert len(started) == 3
+    assert elapsed < 1
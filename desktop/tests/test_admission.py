@@ -0,0 +1,95 @@
+import asyncio
+
+from desktop.server.admission import AdmissionControl, ClientLimits, IdleTimer, TokenBucket
+
+
+def test_token_bucket_allows_bursts_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.retry_after() == 0.5
+    clock.now += 0.5
+    assert bucket.take()
+    assert not bucket.take()
+    clock.now += 10
+    # Never more than the burst
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_client_limits_are_per_message_type(clock):
+    limits = ClientLimits({'command': (1, 2), '*': (10, 10)}, memory_quota=100, clock=clock)
+    assert limits.check('command') is None
+    assert limits.check('command') is None
+    assert limits.check('command') == 1.0
+    # Other types have their own buckets
+    assert all(limits.check('get_hostname') is None for _ in range(10))
+    assert limits.check('get_hostname') is not None
+    assert limits.check('clipboard') is None
+    assert limits.throttled == 2
+
+
+def test_client_limits_can_charge_a_cost(clock):
+    # Seconds of timed input rather than messages
+    limits = ClientLimits({'input_timed': (0.5, 2.0), '*': (10, 10)}, memory_quota=100, clock=clock)
+    assert limits.check('input_timed', 1.5) is None
+    assert limits.check('input_timed', 1.5) == 2.0
+    clock.now += 2
+    assert limits.check('input_timed', 1.5) is None
+
+
+def test_memory_quota():
+    limits = ClientLimits({'*': (1, 1)}, memory_quota=100)
+    assert limits.reserve(60)
+    assert not limits.reserve(50)
+    assert limits.memory_used == 60
+    limits.release(60)
+    assert limits.reserve(100)
+
+
+def test_connection_caps():
+    admission = AdmissionControl(max_connections=3, max_per_client=2)
+    assert admission.admit('10.0.0.2') is None
+    assert admission.admit('10.0.0.2') is None
+    assert 'per client' in admission.admit('10.0.0.2')
+    assert admission.admit('10.0.0.3') is None
+    assert 'limit of 3' in admission.admit('10.0.0.4')
+    admission.release('10.0.0.2')
+    assert admission.admit('10.0.0.4') is None
+    admission.release('10.0.0.3')
+    assert '10.0.0.3' not in admission.connections
+
+
+def test_idle_timer_fires_only_after_silence():
+    fired = []
+
+    async def scenario():
+        timer = IdleTimer(0.05, lambda: fired.append(asyncio.get_running_loop().time()))
+        for _ in range(4):
+            await asyncio.sleep(0.02)
+            timer.touch()
+        assert fired == []
+        await asyncio.sleep(0.1)
+        timer.cancel()
+
+    asyncio.run(scenario())
+    assert len(fired) == 1
+
+
+def test_reconnecting_does_not_reset_pair_limits(clock):
+    admission = AdmissionControl(rates={'pair': (0.5, 2), '*': (100, 100)}, clock=clock)
+    first = admission.limits('10.0.0.2')
+    assert first.check('pair') is None and first.check('pair') is None
+    again = admission.limits('10.0.0.2')
+    assert again.check('pair') == 2.0
+    assert again.check('ping') is None
+    assert admission.limits('10.0.0.3').check('pair') is None
+    clock.now += 2
+    assert again.check('pair') is None
+
+
+def test_rested_addresses_are_forgotten(clock):
+    admission = AdmissionControl(max_addresses=2, clock=clock)
+    for address in ('10.0.0.2', '10.0.0.3'):
+        admission.limits(address).check('pair')
+    clock.now += 60
+    admission.limits('10.0.0.4')
+    assert list(admission.address_buckets) == ['10.0.0.4']
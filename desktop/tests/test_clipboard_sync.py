@@ -0,0 +1,123 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from desktop.features import clipboard
+from desktop.features.clipboard import clipboard_hash
+from desktop.server import clipboard_sync
+from desktop.server.clipboard_sync import ClipboardSync
+
+
+class FakeSession:
+    def __init__(self):
+        self.frames = []
+
+    def push(self, frame, droppable=False, lane='control'):
+        self.frames.append(frame)
+
+
+def test_stopping_the_watcher_never_blocks_the_loop(monkeypatch):
+    reading = threading.Event()
+
+    def slow_clipboard():
+        reading.set()
+        time.sleep(0.3)
+        return 'text'
+
+    monkeypatch.setattr(clipboard, 'send_clipboard', slow_clipboard)
+    monkeypatch.setattr(clipboard, '_clipboard_change_counter', lambda: None)
+    monkeypatch.delenv('DISPLAY', raising=False)
+    sync = ClipboardSync(interval=0.01)
+    pipes = []
+    real_pipe = os.pipe
+
+    def pipe():
+        pipes.append(real_pipe())
+        return pipes[-1]
+
+    monkeypatch.setattr(clipboard.os, 'pipe', pipe)
+
+    async def scenario():
+        session = FakeSession()
+        sync.add_client(session)
+        await asyncio.to_thread(reading.wait, 2)
+        # The watcher is in the middle of a slow read
+        start = time.perf_counter()
+        sync.remove_client(session)
+        removed_in = time.perf_counter() - start
+        await sync.close()
+        return removed_in
+
+    assert asyncio.run(scenario()) < 0.1
+    assert not sync.watching and sync._stopping == []
+    # The thread has exited and both ends of its wake-up pipe are closed
+    for fd in pipes[0]:
+        with pytest.raises(OSError):
+            os.fstat(fd)
+
+
+def test_bad_read_requests_raise_value_error():
+    sync = ClipboardSync()
+
+    async def read(**kwargs):
+        return await sync.read(**kwargs)
+
+    for kwargs in ({'mime': 'application/x-evil'}, {'mime': 'image/png', 'max_dimension': 'big'},
+                   {'mime': 'image/png', 'max_dimension': -5}, {'mime': 'image/png', 'image_format': 'TIFF'},
+                   {'mime': 'image/png', 'image_format': None}):
+        with pytest.raises(ValueError):
+            asyncio.run(read(**kwargs))
+
+
+def test_failed_binary_write_is_rolled_back_and_pool_shut_down(monkeypatch):
+    sync = ClipboardSync()
+    sync._remember('hello', clipboard_hash('hello'))
+
+    def broken(payload, mime):
+        raise OSError('xclip not found')
+
+    monkeypatch.setattr(clipboard_sync, 'write_clipboard', broken)
+    session = FakeSession()
+    assert asyncio.run(sync.set_binary_from_client(session, b'\x89PNG', 'image/png')) is False
+    assert (sync.current_text, sync.current_hash) == ('hello', clipboard_hash('hello'))
+    assert session.frames == []
+    with pytest.raises(ValueError):
+        asyncio.run(sync.set_binary_from_client(session, b'data', 'application/x-evil'))
+
+    class Pool:
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.stopped = cancel_futures
+
+    sync._image_pool = pool = Pool()
+    asyncio.run(sync.close())
+    assert pool.stopped and sync._image_pool is None
+
+
+def test_broadcasts_are_tracked_reported_and_cancelled(monkeypatch, capsys):
+    sync = ClipboardSync()
+    started = []
+
+    async def broadcast(text, digest, exclude=None):
+        started.append(text)
+        if text == 'bad':
+            raise RuntimeError('session gone')
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(sync, '_broadcast', broadcast)
+
+    async def scenario():
+        sync._on_local_change('bad', clipboard_hash('bad'))
+        sync._on_local_change('slow', clipboard_hash('slow'))
+        assert len(sync._tasks) == 2
+        await asyncio.sleep(0.01)
+        pending = list(sync._tasks)
+        await sync.close()
+        return pending
+
+    pending = asyncio.run(scenario())
+    assert started == ['bad', 'slow']
+    assert len(pending) == 1 and pending[0].cancelled() and sync._tasks == set()
+    assert 'session gone' in capsys.readouterr().out
@@ -0,0 +1,98 @@
+import asyncio
+import subprocess
+import threading
+import time
+
+import pytest
+
+from desktop.features.command import CommandCache, SudoCommandError
+
+
+class CountingRunner:
+    def __init__(self, returncode=0, delay=0.05):
+        self.calls = []
+        self.returncode = returncode
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, argv, check=True):
+        with self.lock:
+            self.calls.append(argv)
+        time.sleep(self.delay)
+        return subprocess.CompletedProcess(argv, self.returncode, stdout=f"run {len(self.calls)}\n", stderr="")
+
+
+def test_concurrent_identical_requests_share_one_run():
+    runner = CountingRunner()
+    cache = CommandCache({'df -h': 10.0}, runner=runner)
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.run("df   -h") for _ in range(5)))
+        again = await cache.run(["df", "-h"])
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert runner.calls == [["df", "-h"]]
+    assert sorted(cached for _, cached in results) == [False, True, True, True, True]
+    assert {result.stdout for result, _ in results} == {"run 1\n"}
+    assert again[1] is True
+
+
+def test_ttl_expiry_failures_and_allowlist():
+    runner = CountingRunner(delay=0)
+    cache = CommandCache({'uptime': 0.05}, runner=runner)
+
+    async def scenario():
+        await cache.run("uptime")
+        await asyncio.sleep(0.1)
+        _, cached = await cache.run("uptime")
+        assert cached is False
+        _, cached = await cache.run("uptime -p")
+        assert cached is False
+        await cache.run("uptime -p")
+
+    asyncio.run(scenario())
+    assert len(runner.calls) == 4
+    assert not cache.cacheable("uptime -p")
+    with pytest.raises(SudoCommandError):
+        cache.cacheable("sudo uptime")
+
+    failing = CountingRunner(returncode=1, delay=0)
+    cache = CommandCache({'uptime': 10.0}, runner=failing)
+
+    async def failures():
+        await cache.run("uptime")
+        await cache.run("uptime")
+
+    asyncio.run(failures())
+    assert len(failing.calls) == 2
+
+
+def test_cached_commands_take_a_slot_and_can_be_cancelled(monkeypatch):
+    from desktop.server import ws_handler
+    from desktop.features.command import CommandRunner
+
+    class Session:
+        def __init__(self):
+            self.frames = []
+
+        async def send(self, frame):
+            self.frames.append(frame)
+
+    monkeypatch.setattr(ws_handler, 'command_cache', CommandCache({'uptime': 10.0}, runner=CountingRunner(delay=0.2)))
+    monkeypatch.setattr(ws_handler, 'command_runner', CommandRunner(max_per_client=2))
+    session = Session()
+
+    async def scenario():
+        replies = [await ws_handler.handle_command(session, {'command': 'uptime', 'commandId': str(i), 'cache': True},
+                                                   '10.0.0.2') for i in range(3)]
+        cancel = await ws_handler.handle_command_cancel(session, {'commandId': '0'}, '10.0.0.2')
+        await asyncio.gather(*ws_handler.background_tasks)
+        return replies, cancel
+
+    replies, cancel = asyncio.run(scenario())
+    assert [reply['status'] for reply in replies] == ['started', 'started', 'rejected']
+    assert cancel['status'] == 'signalled'
+    exits = {frame['commandId']: frame for frame in session.frames if frame['type'] == 'command_exit'}
+    assert exits['0']['cancelled'] is True and exits['1']['exitCode'] == 0
+    assert ws_handler.command_runner.running(session) == 0
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+
+import pytest
+
+from desktop.features.command import CommandRunner, CommandLimitError, SudoCommandError
+
+
+def collect(runner, cmd, owner="client", command_id="1"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def scenario():
+        return await runner.run(owner, command_id, cmd, send)
+
+    exit_code = asyncio.run(scenario())
+    return exit_code, messages
+
+
+def test_streams_both_pipes_and_reports_exit_code():
+    script = "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"
+    exit_code, messages = collect(CommandRunner(), [sys.executable, "-c", script])
+    assert exit_code == 3
+    output = {'stdout': '', 'stderr': ''}
+    for message in messages:
+        if message['type'] == 'command_output':
+            output[message['stream']] += message['data']
+    assert output == {'stdout': 'out\n', 'stderr': 'err\n'}
+    assert messages[-1]['type'] == 'command_exit'
+    assert messages[-1]['exitCode'] == 3
+
+
+def test_output_cap_truncates_but_drains():
+    script = "print('x' * 100000)"
+    exit_code, messages = collect(CommandRunner(max_output_bytes=100), [sys.executable, "-c", script])
+    assert exit_code == 0
+    sent = sum(len(m['data']) for m in messages if m['type'] == 'command_output')
+    assert sent == 100
+    assert messages[-1]['truncated'] is True
+
+
+def test_cancel_and_per_client_limit():
+    runner = CommandRunner(max_per_client=1)
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def scenario():
+        task = asyncio.create_task(runner.run("a", "long", [sys.executable, "-c", "import time; time.sleep(30)"], send))
+        await asyncio.sleep(0)
+        with pytest.raises(CommandLimitError):
+            await runner.run("a", "other", ["true"], send)
+        assert runner.cancel("a", "long", force=True)
+        return await task
+
+    exit_code = asyncio.run(scenario())
+    assert exit_code != 0
+    assert runner.running("a") == 0
+
+
+def test_rejects_sudo():
+    with pytest.raises(SudoCommandError):
+        collect(CommandRunner(), "sudo ls")
+
+
+def test_reserved_slots_count_against_the_limit_at_once():
+    runner = CommandRunner(max_per_client=1)
+    runner.reserve("client", "1")
+    with pytest.raises(CommandLimitError):
+        runner.reserve("client", "2")
+    # A cancel while only reserved is handed over by release()
+    assert runner.cancel("client", "1") is True
+    assert runner.release("client", "1") is True
+    assert runner.running("client") == 0
+
+    async def scenario():
+        runner.reserve("client", "3")
+        return await runner.run("client", "3", [sys.executable, "-c", "pass"], lambda message: asyncio.sleep(0),
+                                reserved=True)
+
+    assert asyncio.run(scenario()) == 0
+    assert runner.running("client") == 0
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import stat
+
+from desktop.server.discovery import DeviceIdentity, discover, sign_blob, start_responder, verify_blob
+
+
+def test_identity_persists_and_is_private(tmp_path):
+    path = tmp_path / 'device.json'
+    first = DeviceIdentity.load(path)
+    again = DeviceIdentity.load(path)
+    assert (again.device_id, again.key) == (first.device_id, first.key)
+    if os.name == 'posix':
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_signed_blobs_detect_tampering(tmp_path):
+    key = DeviceIdentity.load(tmp_path / 'device.json').key
+    blob = sign_blob(key, {'ip': '192.168.1.20', 'port': 9000})
+    assert verify_blob(key, blob)
+    assert not verify_blob(key, {**blob, 'ip': '192.168.1.66'})
+    assert not verify_blob(DeviceIdentity.load(tmp_path / 'other.json').key, blob)
+
+
+def test_many_clients_discover_on_loopback(tmp_path):
+    identity = DeviceIdentity.load(tmp_path / 'device.json')
+
+    async def scenario():
+        transport, responder = await start_responder(
+            identity, lambda: {'name': 'desk', 'ip': '127.0.0.1', 'port': 9000}, host='127.0.0.1', port=0)
+        port = transport.get_extra_info('sockname')[1]
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            # Paired clients verify the reply, an unpaired one just takes what it hears
+            paired = [discover('127.0.0.1', port, timeout=2, device_id=identity.device_id, key=identity.key)
+                      for _ in range(5)]
+            results = await asyncio.gather(*paired, discover('127.0.0.1', port, timeout=0.1))
+            elapsed = loop.time() - start
+            # Someone else's desktop, and a forged key
+            others = await asyncio.gather(
+                discover('127.0.0.1', port, timeout=0.1, device_id='someone-else'),
+                discover('127.0.0.1', port, timeout=0.1, key='00' * 32))
+        finally:
+            transport.close()
+        return results, others, elapsed, responder.answered
+
+    results, others, elapsed, answered = asyncio.run(scenario())
+    for found in results:
+        assert len(found) == 1
+        assert found[0]['deviceId'] == identity.device_id
+        assert (found[0]['port'], found[0]['address']) == (9000, '127.0.0.1')
+    # Verified clients stop at the first reply instead of waiting out the timeout
+    assert elapsed < 0.5
+    assert others == [[], []]
+    assert answered == 7
@@ -0,0 +1,82 @@
+import asyncio
+import base64
+
+import pytest
+
+from desktop.server import ws_handler
+from desktop.server.admission import ClientLimits
+
+
+class FakeSession:
+    def __init__(self):
+        self.id = 'session-1'
+        self.limits = ClientLimits({'*': (100, 100)}, memory_quota=1024)
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws_handler, 'downloads_dir', tmp_path)
+    return tmp_path
+
+
+def chunk(index, payload):
+    return {'type': 'file_chunk', 'fileId': 'f1', 'index': index, 'data': base64.b64encode(payload).decode()}
+
+
+def test_refused_chunk_is_resent_not_skipped(downloads):
+    session = FakeSession()
+    parts = [b'aaaa', b'bbbb', b'cccc']
+
+    async def upload():
+        await ws_handler.handle_file_start(session, {'fileId': 'f1', 'fileName': 'out.bin', 'fileSize': 12}, '10.0.0.2')
+        replies = [await ws_handler.handle_file_chunk(session, chunk(0, parts[0]), '10.0.0.2')]
+        # Chunk 1 was throttled before reaching the handler, chunk 2 arrives first
+        replies.append(await ws_handler.handle_file_chunk(session, chunk(2, parts[2]), '10.0.0.2'))
+        # The client resends from nextIndex after retryAfter
+        for index in (1, 2):
+            replies.append(await ws_handler.handle_file_chunk(session, chunk(index, parts[index]), '10.0.0.2'))
+        replies.append(await ws_handler.handle_file_chunk(session, chunk(1, parts[1]), '10.0.0.2'))
+        end = await ws_handler.handle_file_end(session, {'fileId': 'f1'}, '10.0.0.2')
+        return replies, end
+
+    replies, end = asyncio.run(upload())
+    assert replies[1]['status'] == 'out_of_order' and replies[1]['nextIndex'] == 1
+    assert [reply['status'] for reply in replies[2:]] == ['received', 'received', 'duplicate']
+    assert end['status'] == 'success'
+    assert (downloads / 'out.bin').read_bytes() == b'aaaabbbbcccc'
+
+
+def test_bad_chunk_index_is_answered_not_raised(downloads):
+    session = FakeSession()
+
+    async def upload():
+        await ws_handler.handle_file_start(session, {'fileId': 'f1', 'fileName': 'out.bin', 'fileSize': 4}, '10.0.0.2')
+        replies = []
+        for index in ('1', None, -1, 1.5, True):
+            replies.append(await ws_handler.handle_file_chunk(session, {**chunk(0, b'aaaa'), 'index': index}, '10.0.0.2'))
+        ws_handler.finish_transfer('f1')
+        return replies
+
+    assert all(reply['type'] == 'file_chunk_error' for reply in asyncio.run(upload()))
+
+
+def test_failed_commit_drops_the_transfer_and_its_spool(downloads, monkeypatch):
+    session = FakeSession()
+
+    def disk_full(source, target):
+        raise OSError(28, 'No space left on device')
+
+    async def upload():
+        await ws_handler.handle_file_start(session, {'fileId': 'f1', 'fileName': 'out.bin', 'fileSize': 4}, '10.0.0.2')
+        await ws_handler.handle_file_chunk(session, chunk(0, b'aaaa'), '10.0.0.2')
+        monkeypatch.setattr(ws_handler.os, 'replace', disk_full)
+        first = await ws_handler.handle_file_end(session, {'fileId': 'f1'}, '10.0.0.2')
+        monkeypatch.undo()
+        again = await ws_handler.handle_file_end(session, {'fileId': 'f1'}, '10.0.0.2')
+        return first, again
+
+    first, again = asyncio.run(upload())
+    assert first['type'] == 'file_end_error' and first['restart'] is True
+    assert again['message'] == 'Transfer not found'
+    assert 'f1' not in ws_handler.file_transfers
+    assert list(downloads.iterdir()) == []
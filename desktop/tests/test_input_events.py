@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from desktop.features.input_events import InputBusyError, InputExecutor, validate_events
+
+
+def test_validation_rejects_the_whole_batch():
+    events = validate_events([{'type': 'move', 'dx': 1, 'dy': 2}, {'type': 'key', 'key': 'next', 't': 5}])
+    assert events == [{'type': 'move', 't': 0, 'dx': 1, 'dy': 2}, {'type': 'key', 't': 5, 'key': 'right'}]
+    for bad in ([], [{'type': 'teleport'}], [{'type': 'click', 'button': 'thumb'}],
+                [{'type': 'move', 'dx': 'far', 'dy': 0}], [{'type': 'key', 't': 10}, {'type': 'key', 't': 5}],
+                [{'type': 'scroll', 'dy': 1}] * 1000):
+        with pytest.raises(ValueError):
+            validate_events(bad)
+
+
+def test_batch_runs_in_order_on_the_input_thread(make_backend, make_touchpad):
+    backend = make_backend()
+    executor = InputExecutor(backend)
+    events = validate_events([
+        {'type': 'move', 'dx': 5, 'dy': 0},
+        {'type': 'down', 'button': 'left'},
+        {'type': 'move', 'dx': 0, 'dy': 5},
+        {'type': 'up', 'button': 'left'},
+        {'type': 'scroll', 'dy': -3},
+        {'type': 'click', 'button': 'right', 'clicks': 2},
+    ])
+    result = asyncio.run(executor.submit(events, make_touchpad(backend)))
+    assert result == {'executed': 6, 'error': None, 'lateMs': 0.0}
+    assert backend.calls == [('move_to', 105, 100), ('down', 'left'), ('move_to', 105, 105),
+                             ('up', 'left'), ('scroll', 0, -3), ('click', 'right', 2)]
+    assert len(backend.threads) == 1 and backend.threads.pop().startswith('input')
+
+
+def test_timing_is_preserved_and_failures_stop_the_batch(clock, make_backend, make_touchpad):
+    backend = make_backend(fail_on='click')
+    executor = InputExecutor(backend, clock=clock, sleep=clock.sleep)
+    events = validate_events([{'type': 'key', 'key': 'a'}, {'type': 'key', 'key': 'b', 't': 50},
+                              {'type': 'click', 't': 80}, {'type': 'key', 'key': 'c', 't': 90}])
+    result = executor.run(events, make_touchpad(backend), timing=True)
+    assert clock.slept == [0.05, 0.03]
+    assert result['executed'] == 2 and 'injection failed' in result['error']
+    assert backend.calls == [('key', 'a'), ('key', 'b')]
+
+
+def test_single_injections_share_the_input_thread(make_backend, make_touchpad):
+    backend = make_backend()
+    executor = InputExecutor(backend)
+    touchpad = make_touchpad(backend)
+
+    async def mixed():
+        batch = executor.submit(validate_events([{'type': 'click'}]), touchpad)
+        return await asyncio.gather(batch, executor.call(touchpad.move, 5, 0, None), executor.call(backend.key, 'a'))
+
+    asyncio.run(mixed())
+    assert backend.calls == [('click', 'left', 1), ('move_to', 105, 100), ('key', 'a')]
+    assert len(backend.threads) == 1
+
+
+def test_input_backlog_is_bounded(make_backend):
+    executor = InputExecutor(make_backend(), max_pending=1)
+    release = threading.Event()
+
+    async def flood():
+        first = asyncio.ensure_future(executor.call(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(InputBusyError):
+            await executor.call(print)
+        release.set()
+        await first
+        await executor.call(print)
+
+    asyncio.run(flood())
+    assert executor.pending == 0
+
+
+def test_relative_move_on_a_busy_executor_is_throttled(make_backend, make_touchpad, monkeypatch):
+    from types import SimpleNamespace
+
+    from desktop.server import ws_handler
+
+    backend = make_backend()
+    executor = InputExecutor(backend, max_pending=1)
+    monkeypatch.setattr(ws_handler, 'input_executor', executor)
+    session = SimpleNamespace(touchpad=make_touchpad(backend))
+    release = threading.Event()
+
+    async def busy():
+        first = asyncio.ensure_future(executor.call(release.wait))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(InputBusyError):
+                await ws_handler.handle_relative_input(session, {'mode': 'relative', 'dx': 5, 'dy': 0})
+        finally:
+            release.set()
+            await first
+
+    asyncio.run(busy())
+    assert backend.moves == []
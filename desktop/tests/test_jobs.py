@@ -0,0 +1,123 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from desktop.features.jobs import Job, JobManager, JobLimitError, JobNotFoundError
+
+
+class FakeSession:
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, frame):
+        self.frames.append(json.loads(frame))
+
+    def push(self, frame, droppable=False, lane='control'):
+        self.frames.append(json.loads(frame))
+        return True
+
+
+class SlowSession(FakeSession):
+    """Its bulk lane fills up after `room` frames, like a client not reading."""
+
+    def __init__(self, room):
+        super().__init__()
+        self.room = room
+
+    def push(self, frame, droppable=False, lane='control'):
+        if lane == 'bulk':
+            assert droppable
+            if self.room == 0:
+                return False
+            self.room -= 1
+        return super().push(frame, droppable, lane)
+
+
+def test_job_survives_detach_and_keeps_output_tail():
+    script = "import sys\nfor i in range(200): print(f'line {i}', flush=True)"
+
+    async def scenario():
+        manager = JobManager(max_output_bytes=100)
+        job = manager.submit("phone", [sys.executable, "-c", script])
+        await job.task
+        with pytest.raises(JobNotFoundError):
+            manager.get("someone-else", job.id)
+        socket = FakeSession()
+        await manager.attach("phone", job.id, socket)
+        collected = manager.collect("phone", job.id)
+        return collected, socket, manager
+
+    job, socket, manager = asyncio.run(scenario())
+    assert job.status == 'exited'
+    assert job.exit_code == 0
+    assert job.output_bytes <= 100
+    assert job.dropped_bytes > 0
+    assert ''.join(entry[2] for entry in job.output).endswith("line 199\n")
+    assert socket.frames[-1]['type'] == 'job_exit'
+    assert manager.jobs == {}
+
+
+def test_per_client_limit_counts_uncollected_jobs():
+    async def scenario():
+        manager = JobManager(max_per_client=1)
+        job = manager.submit("phone", [sys.executable, "-c", "pass"])
+        await job.task
+        with pytest.raises(JobLimitError):
+            manager.submit("phone", [sys.executable, "-c", "pass"])
+        manager.collect("phone", job.id)
+        second = manager.submit("phone", [sys.executable, "-c", "pass"])
+        await second.task
+
+    asyncio.run(scenario())
+
+
+def test_output_tail_is_counted_in_utf8_bytes():
+    job = Job('j1', 'phone', 'echo', max_output_bytes=10)
+    job.append('stdout', 'ééé')          # 6 bytes
+    job.append('stdout', 'ééé')
+    assert job.output_bytes == 6 and job.dropped_bytes == 6
+    job.append('stdout', '€' * 5)        # 15 bytes on its own
+    assert list(job.output) == [(2, 'stdout', '€€€')]
+    assert job.output_bytes == 9 and job.dropped_bytes == 18
+
+
+def test_cancel_before_the_task_runs_never_spawns(monkeypatch):
+    async def scenario():
+        manager = JobManager()
+        spawned = []
+        monkeypatch.setattr(asyncio, 'create_subprocess_exec', lambda *args, **kwargs: spawned.append(args))
+        job = manager.submit("phone", [sys.executable, "-c", "pass"])
+        assert manager.cancel("phone", job.id) is True
+        await job.task
+        with pytest.raises(ValueError):
+            await manager.attach("phone", job.id, FakeSession(), since='0')
+        return job, spawned
+
+    job, spawned = asyncio.run(scenario())
+    assert job.status == 'cancelled' and spawned == []
+
+
+def test_slow_listener_is_detached_and_can_catch_up():
+    script = "import sys\nfor i in range(50): print(f'line {i}', flush=True)"
+
+    async def scenario():
+        manager = JobManager()
+        slow = SlowSession(room=3)
+        job = manager.submit("phone", [sys.executable, "-c", script])
+        await manager.attach("phone", job.id, slow)
+        await job.task
+        detached = [frame for frame in slow.frames if frame['type'] == 'job_detached']
+        caught_up = FakeSession()
+        await manager.attach("phone", job.id, caught_up, since=detached[0]['since'])
+        return slow, detached, caught_up
+
+    slow, detached, caught_up = asyncio.run(scenario())
+    received = [frame for frame in slow.frames if frame['type'] == 'job_output']
+    assert len(received) == 3 and len(detached) == 1
+    assert detached[0]['since'] == received[-1]['seq']
+    assert caught_up.frames[0]['seq'] == received[-1]['seq'] + 1
+    text = ''.join(frame['data'] for frame in received + caught_up.frames[:-1])
+    assert text == ''.join(f'line {i}\n' for i in range(50))
+    assert caught_up.frames[-1]['type'] == 'job_exit'
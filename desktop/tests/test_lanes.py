@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from desktop.server.lanes import LaneDispatcher, current_lane, shielded
+from desktop.server.sessions import Session, current_request
+
+
+class FakeSocket:
+    remote_address = ('127.0.0.1', 5000)
+
+    def __init__(self):
+        self.frames = []
+        self.gate = asyncio.Event()
+
+    async def send(self, frame):
+        await self.gate.wait()
+        self.frames.append(frame)
+
+    async def close(self, code=1000, reason=''):
+        pass
+
+
+def test_input_is_handled_while_bulk_lane_is_backed_up():
+    handled = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handle(message):
+            if message['type'] == 'file_chunk':
+                await release.wait()
+            handled.append((message['type'], current_lane.get()))
+
+        dispatcher = LaneDispatcher(handle, limits={'bulk': 8})
+        for index in range(5):
+            await dispatcher.dispatch('bulk', {'type': 'file_chunk', 'index': index})
+        await dispatcher.dispatch('input', {'type': 'remote_input'})
+        await asyncio.sleep(0.01)
+        assert handled == [('remote_input', 'input')]
+        release.set()
+        await asyncio.sleep(0.01)
+        dispatcher.close()
+
+    asyncio.run(scenario())
+    assert handled[1:] == [('file_chunk', 'bulk')] * 5
+
+
+def test_unrelated_requests_overtake_slow_ones_but_keyed_ones_keep_order():
+    handled = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handle(message):
+            if message['type'] == 'clipboard':
+                await release.wait()
+            handled.append(message.get('index', message['type']))
+
+        dispatcher = LaneDispatcher(handle, ordered=('input',), key=lambda message: message.get('key'))
+        await dispatcher.dispatch('control', {'type': 'clipboard', 'key': 'clipboard'})
+        await dispatcher.dispatch('control', {'type': 'clipboard_get', 'key': 'clipboard', 'index': 'after clipboard'})
+        await dispatcher.dispatch('control', {'type': 'get_hostname'})
+        for index in range(3):
+            await dispatcher.dispatch('bulk', {'type': 'file_chunk', 'key': 'file-1', 'index': index})
+        await asyncio.sleep(0.01)
+        assert handled == ['get_hostname', 0, 1, 2]
+        assert dispatcher.pending('control') == 2
+        release.set()
+        await asyncio.sleep(0.01)
+        assert dispatcher.pending('control') == 0
+        dispatcher.close()
+
+    asyncio.run(scenario())
+    assert handled[-2:] == ['clipboard', 'after clipboard']
+
+
+def test_replies_echo_the_request_id():
+    async def scenario():
+        socket = FakeSocket()
+        socket.gate.set()
+        session = Session(socket)
+        session.start()
+
+        async def reply(request_id):
+            current_request.set(request_id)
+            await session.send({'type': 'hostname'})
+
+        await asyncio.gather(asyncio.create_task(reply('a')), asyncio.create_task(reply(None)))
+        await asyncio.sleep(0.01)
+        session.close()
+        await session.wait_closed()
+        return [json.loads(frame) for frame in socket.frames]
+
+    assert asyncio.run(scenario()) == [{'type': 'hostname', 'requestId': 'a'}, {'type': 'hostname'}]
+
+
+def test_writer_sends_higher_priority_lanes_first():
+    async def scenario():
+        socket = FakeSocket()
+        session = Session(socket)
+        session.start()
+        await session.send('chunk-0', lane='bulk')
+        await asyncio.sleep(0)
+        # chunk-0 is being written, everything else waits in the lanes
+        for index in range(1, 4):
+            await session.send(f'chunk-{index}', lane='bulk')
+        await session.send('status')
+        await session.send('input-ack', lane='input')
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        session.close()
+        await session.wait_closed()
+        return socket.frames
+
+    assert asyncio.run(scenario()) == ['chunk-0', 'input-ack', 'status', 'chunk-1', 'chunk-2', 'chunk-3']
+
+
+def test_close_lets_shielded_sections_finish():
+    steps = []
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def commit():
+            steps.append('commit started')
+            started.set()
+            await asyncio.sleep(0.02)
+            steps.append('commit finished')
+
+        async def handle(message):
+            await shielded(commit())
+            steps.append('replied')
+
+        dispatcher = LaneDispatcher(handle)
+        await dispatcher.dispatch('bulk', {'type': 'file_end'})
+        await started.wait()
+        dispatcher.close()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert steps == ['commit started', 'commit finished']
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from desktop.server.loop_monitor import LoopMonitor, run
+
+
+def test_timed_steps_are_attributed_to_their_label():
+    monitor = LoopMonitor(interval=0.01, slow_threshold=0.03)
+
+    async def blocking_handler():
+        await asyncio.sleep(0)
+        time.sleep(0.05)   # like a synchronous pyautogui call
+        await asyncio.sleep(0)
+        return 'done'
+
+    async def quick_handler():
+        await asyncio.sleep(0.01)
+
+    async def failing_handler():
+        await asyncio.sleep(0)
+        raise ValueError('boom')
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.02)
+        result = await monitor.timed('media', blocking_handler())
+        await monitor.timed('get_hostname', quick_handler())
+        try:
+            await monitor.timed('command', failing_handler())
+        except ValueError:
+            pass
+        await asyncio.sleep(0.03)
+        monitor.stop()
+        return result, monitor.stats()
+
+    result, stats = run(scenario(), use_uvloop=False)
+    assert result == 'done'
+    assert stats['loop'] == 'asyncio'
+    media = stats['handlers']['media']
+    assert media['count'] == 1 and media['steps'] == 3 and media['slowSteps'] == 1
+    assert media['maxStepMs'] >= 50
+    assert stats['handlers']['get_hostname']['slowSteps'] == 0
+    assert stats['handlers']['command']['steps'] == 2
+    assert [entry['label'] for entry in stats['slow']] == ['media']
+    # The lag sample taken after the blocking step blames it
+    assert stats['lag']['maxMs'] >= 30
+    assert any(cause['label'] == 'media' for stall in stats['stalls'] for cause in stall['causes'])
+
+
+def test_cancellation_reaches_the_wrapped_coroutine():
+    monitor = LoopMonitor()
+    cancelled = []
+
+    async def handler():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        task = asyncio.create_task(monitor.timed('pty_open', handler()))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+
+
+def test_idle_monitor_leaves_no_timer_pending():
+    monitor = LoopMonitor(interval=0.01)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        # Two connections come and go
+        monitor.start()
+        monitor.start()
+        monitor.stop()
+        await asyncio.sleep(0.03)
+        sampled = len(monitor.lags)
+        monitor.stop()
+        await asyncio.sleep(0)
+        return sampled, [timer for timer in loop._scheduled if not timer.cancelled()]
+
+    sampled, pending = run(scenario(), use_uvloop=False)
+    assert sampled >= 1
+    assert pending == []
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+from desktop.features.notification_history import NotificationHistory
+from desktop.features.notifications import NotificationServer
+
+
+def test_ring_is_bounded_and_pages_fall_through_to_sqlite(tmp_path):
+    history = NotificationHistory(tmp_path / "history.db", max_memory=10)
+    history.add_many([("chat" if i % 2 else "mail", f"title {i}", f"body {i}") for i in range(50)])
+    assert len(history.recent) == 10
+
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = history.query(cursor=cursor, limit=7)
+        seen.extend(item['title'] for item in items)
+        if cursor is None:
+            break
+    assert seen == [f"title {i}" for i in reversed(range(50))]
+
+    chat, _ = history.query(app="chat", limit=100)
+    assert len(chat) == 25
+    assert all(item['app'] == "chat" for item in chat)
+    history.close()
+
+
+def test_startup_recovery_loads_only_the_tail(tmp_path):
+    path = tmp_path / "history.db"
+    history = NotificationHistory(path, max_memory=5)
+    history.add_many([("app", f"t{i}", "") for i in range(20)])
+    history.close()
+
+    history = NotificationHistory(path, max_memory=5, max_rows=12)
+    assert [entry['title'] for entry in history.recent] == [f"t{i}" for i in range(15, 20)]
+    items, cursor = history.query(limit=100)
+    assert len(items) == 12
+    assert cursor is None
+    history.close()
+
+
+def test_server_opens_history_on_first_use_off_the_loop(tmp_path, monkeypatch):
+    path = tmp_path / "history.db"
+    server = NotificationServer(history_path=path)
+    assert not path.exists()
+    threads = []
+    add_many = NotificationHistory.add_many
+
+    def recording_add_many(self, notifications):
+        threads.append(threading.current_thread())
+        return add_many(self, notifications)
+
+    monkeypatch.setattr(NotificationHistory, 'add_many', recording_add_many)
+    monkeypatch.setattr(server.batcher, 'add', lambda *args: None)
+
+    async def scenario():
+        accepted = await server.handle_phone_notifications([{'app': 'chat', 'title': 'hi'}])
+        items, _ = await server.get_notification_history(app='chat')
+        for bad in ({'app': ['chat']}, {'since': '0'}, {'cursor': 5}):
+            with pytest.raises(TypeError):
+                await server.get_notification_history(**bad)
+        return accepted, items
+
+    accepted, items = asyncio.run(scenario())
+    assert accepted == 1 and [item['title'] for item in items] == ['hi']
+    assert path.exists() and threads and threading.main_thread() not in threads
+    server.history.close()
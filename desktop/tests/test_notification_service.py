@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from desktop.features.notifications import AsyncNotificationService, NotificationBatcher, NotificationServer
+
+
+class SlowBackend:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def send_notification(self, title, message, replaces_id=0, **kwargs):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        self.calls.append((title, message, replaces_id))
+        return replaces_id or len(self.calls)
+
+
+def test_notify_never_blocks_and_coalesces_by_key():
+    backend = SlowBackend()
+
+    async def scenario():
+        service = AsyncNotificationService(backend=backend, rate=100, burst=100)
+        start = time.perf_counter()
+        for i in range(20):
+            service.notify("Chat", f"message {i}", app_name="chat", key="chat")
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.3)
+        service.close()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed < 0.05
+    # The first call was in flight, the other 19 collapsed into one update
+    assert [call[1] for call in backend.calls] == ["message 0", "message 19"]
+    # The update replaced the notification already on screen
+    assert backend.calls[1][2] == 1
+    assert threading.get_ident() not in backend.threads
+
+
+def test_rate_limit_per_app():
+    backend = SlowBackend(delay=0)
+
+    async def scenario():
+        service = AsyncNotificationService(backend=backend, rate=5, burst=1)
+        service.notify("a", "1", app_name="noisy", key=1)
+        service.notify("b", "2", app_name="noisy", key=2)
+        service.notify("c", "3", app_name="quiet", key=3)
+        await asyncio.sleep(0.05)
+        first = [call[0] for call in backend.calls]
+        await asyncio.sleep(0.3)
+        service.close()
+        return first
+
+    first = asyncio.run(scenario())
+    assert first == ["a", "c"]
+    assert [call[0] for call in backend.calls] == ["a", "c", "b"]
+
+
+class RecordingService:
+    def __init__(self):
+        self.shown = []
+
+    def notify(self, title, message, app_name="", key=None):
+        self.shown.append((title, message, key))
+
+
+def test_burst_is_merged_into_one_summary():
+    service = RecordingService()
+
+    async def scenario():
+        batcher = NotificationBatcher(service, default_window=0.05, windows={'calls': 0})
+        for i in range(12):
+            batcher.add("Chat", "Alice", f"msg {i}")
+        batcher.add("calls", "Bob", "ringing")
+        batcher.add("calls", "Bob", "missed")
+        await asyncio.sleep(0.2)
+        batcher.close()
+
+    asyncio.run(scenario())
+    chat = [shown for shown in service.shown if shown[2] == ('phone', 'Chat')]
+    assert chat == [
+        ("Chat: Alice", "msg 0", ('phone', 'Chat')),
+        ("12 new notifications from Chat", "Alice: msg 11", ('phone', 'Chat')),
+    ]
+    # Batching disabled for this app
+    assert [shown[1] for shown in service.shown if shown[2] == ('phone', 'calls')] == ["ringing", "missed"]
+
+
+def test_windows_and_batches_are_capped():
+    batcher = NotificationBatcher(RecordingService(), max_windows=2, windows={'a': 1})
+    with pytest.raises(ValueError):
+        batcher.set_windows({'b': 1, 'c': 1})
+    assert batcher.windows == {'a': 1}
+    batcher.set_windows({'a': 0, 'b': 1})
+    assert batcher.windows == {'a': 0, 'b': 1}
+
+    server = NotificationServer(max_batch=3)
+    server.batcher = NotificationBatcher(RecordingService())
+    with pytest.raises(ValueError):
+        asyncio.run(server.handle_phone_notifications([{'app': 'x'}] * 4))
+    server.notifier.close()
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import stat
+import string
+
+import pytest
+
+from desktop.server.pairing import PairedClients, PairingService
+from desktop.utils.qr import QRUtils
+
+
+@pytest.fixture
+def make_service(tmp_path, clock):
+    def make(**kwargs):
+        describe = lambda: {'server_ip': '192.168.1.20', 'port_no': 9000}
+        return PairingService(describe, tmp_path / 'qr_cache', publish_path=tmp_path / 'pairing_qr.png',
+                              clock=clock, **kwargs)
+    return make
+
+
+def test_tokens_are_random_and_expire_with_grace(clock, make_service):
+    service = make_service(token_ttl=600, grace=60)
+    first = service.current.token
+    assert len(first) == 8 and set(first) <= set(string.ascii_lowercase + string.digits)
+    assert service.info()['pairing_token'] == first
+    assert service.verify(first) and not service.verify('wrong') and not service.verify(None)
+
+    asyncio.run(service.rotate())
+    second = service.current.token
+    assert second != first
+    assert service.verify(second) and service.verify(first)
+    clock.now += 61
+    assert service.verify(second) and not service.verify(first)
+    clock.now += 600
+    assert not service.verify(second)
+
+
+def test_qr_assets_are_cached_by_content(tmp_path, make_service):
+    pytest.importorskip('qrcode')
+    service = make_service()
+    asyncio.run(service.start())
+    service.stop()
+    png = service.asset_path('png')
+    assert (tmp_path / 'pairing_qr.png').read_bytes() == png.read_bytes()
+    assert service.asset_path('svg').read_text().startswith('<svg')
+    assert '██' in service.asset_text()
+
+    # Same payload, same files: nothing is rendered again
+    mtime = png.stat().st_mtime_ns
+    service._render(service.current)
+    assert png.stat().st_mtime_ns == mtime
+    assert not list((tmp_path / 'qr_cache').glob('.*.tmp'))
+
+
+def test_old_qr_codes_are_pruned(tmp_path, make_service):
+    pytest.importorskip('qrcode')
+    service = make_service(keep=2)
+
+    async def rotate_often():
+        for _ in range(4):
+            await service.rotate()
+
+    asyncio.run(rotate_often())
+    assert len(list((tmp_path / 'qr_cache').glob('*.png'))) == 2
+    assert service.asset_path('png').exists()
+
+
+def test_matrix_to_text():
+    assert QRUtils.matrix_to_text([[True, False], [False, True]]) == '██  \n  ██\n'
+
+
+def test_rotation_survives_a_failing_render(tmp_path, clock, make_service, monkeypatch):
+    service = make_service(token_ttl=600, grace=60)
+    (tmp_path / 'pairing_qr.png').write_bytes(b'stale')
+
+    def broken(token):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(service, '_render_and_publish', broken)
+
+    async def start_then_rotate():
+        with pytest.raises(OSError):
+            await service.start()
+        assert service._task is not None
+        first = service.current.token
+        await service.rotate()
+        service.stop()
+        return first
+
+    first = asyncio.run(start_then_rotate())
+    assert service.current.token != first and service.verify(service.current.token)
+    assert not (tmp_path / 'pairing_qr.png').exists()
+
+
+def test_paired_clients_get_their_own_revocable_keys(tmp_path, clock):
+    path = tmp_path / 'paired_clients.json'
+    clients = PairedClients(path, max_clients=2, clock=clock)
+    phone, phone_key = clients.issue('phone')
+    tablet, tablet_key = clients.issue('tablet')
+    assert phone_key not in path.read_text()
+    assert clients.verify(phone, phone_key) and clients.verify(tablet, tablet_key)
+    assert not clients.verify(phone, tablet_key) and not clients.verify(phone, None)
+    assert not clients.verify(None, phone_key)
+
+    again = PairedClients(path, clock=clock)
+    assert again.verify(phone, phone_key)
+    assert again.revoke(phone) and not again.revoke(phone)
+    assert not again.verify(phone, phone_key) and again.verify(tablet, tablet_key)
+    assert [client['name'] for client in PairedClients(path).clients()] == ['tablet']
+    if os.name == 'posix':
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+    # Past max_clients the one unused the longest is forgotten
+    clock.now += 1
+    clients.verify(phone, phone_key)
+    clients.issue('laptop')
+    assert clients.known(phone) and not clients.known(tablet)
+
+
+class UnpairedSession:
+    def __init__(self):
+        self.id = 'session-1'
+        self.paired = False
+        self.client_id = None
+        self.capabilities = set()
+        self.sent = []
+
+    async def send(self, frame, lane=None):
+        self.sent.append(frame)
+
+
+def test_unpaired_connections_only_get_the_handshake(monkeypatch):
+    from desktop.server import ws_handler
+
+    async def never(*args, **kwargs):
+        raise AssertionError('reached a handler before pairing')
+
+    for handler in ('handle_pty', 'handle_command', 'handle_job', 'handle_clipboard',
+                    'handle_file_start', 'handle_remote_input'):
+        monkeypatch.setattr(ws_handler, handler, never)
+    session = UnpairedSession()
+
+    async def scenario():
+        for msg_type in ('pty_open', 'command', 'job_submit', 'clipboard', 'file_start', 'remote_input', 'hello'):
+            await ws_handler.process_message(session, {'type': msg_type}, '10.0.0.2')
+
+    asyncio.run(scenario())
+    refused, hello = session.sent[:-1], session.sent[-1]
+    assert [frame['request'] for frame in refused] == ['pty_open', 'command', 'job_submit', 'clipboard',
+                                                         'file_start', 'remote_input']
+    assert all(frame['type'] == 'error' and 'Not paired' in frame['message'] for frame in refused)
+    assert hello['type'] == 'hello_ack'
+
+
+def test_revoked_client_loses_access(tmp_path, monkeypatch):
+    from multiprocessing import Pipe
+
+    from desktop.server import ws_handler
+    from desktop.server.admin import AdminChannel
+    from desktop.server.sessions import SessionManager
+    from desktop.tests.test_sessions import FakeSocket
+
+    monkeypatch.setattr(ws_handler, 'data_dir', tmp_path)
+    monkeypatch.setattr(ws_handler, 'sessions', SessionManager())
+    for cached in ('_pairing', '_device_identity', '_paired_clients'):
+        monkeypatch.setattr(ws_handler, cached, None)
+    monkeypatch.setattr(ws_handler.clipboard_sync, 'add_client', lambda session: None)
+    client_id, key = ws_handler.get_paired_clients().issue('phone')
+    gui, server_end = Pipe()
+
+    def ask(request):
+        gui.send(request)
+        return gui.recv()
+
+    async def scenario():
+        AdminChannel(server_end, ws_handler.handle_admin)
+        session = ws_handler.sessions.register(FakeSocket())
+        paired = await ws_handler.handle_pair(session, {'clientId': client_id, 'clientKey': key}, '10.0.0.2')
+        listed = await asyncio.to_thread(ask, {'action': 'paired_clients', 'id': 1})
+        revoked = await asyncio.to_thread(ask, {'action': 'revoke_client', 'clientId': client_id, 'id': 2})
+        sent = []
+
+        async def record(frame, lane=None):
+            sent.append(frame)
+
+        session.send = record
+        await ws_handler.process_message(session, {'type': 'command', 'command': 'echo hi'}, '10.0.0.2')
+        again = ws_handler.sessions.register(FakeSocket())
+        retry = await ws_handler.handle_pair(again, {'clientId': client_id, 'clientKey': key}, '10.0.0.2')
+        return session, paired, listed, revoked, sent, retry
+
+    session, paired, listed, revoked, sent, retry = asyncio.run(scenario())
+    gui.close()
+    assert paired['type'] == 'pair_success'
+    assert listed['id'] == 1 and [(c['clientId'], c['connected']) for c in listed['clients']] == [(client_id, True)]
+    assert revoked == {'type': 'revoke_client_response', 'clientId': client_id, 'revoked': True, 'id': 2}
+    assert session.closed and not session.paired
+    assert sent[0]['type'] == 'error' and sent[0]['request'] == 'command'
+    assert retry['type'] == 'pair_failed'
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from desktop.features.pty_session import PtyManager, PTY_SUPPORTED
+
+pytestmark = pytest.mark.skipif(not PTY_SUPPORTED, reason="PTYs need a POSIX system")
+
+
+def test_output_is_batched_and_throttled_by_acks():
+    async def scenario():
+        manager = PtyManager()
+        frames = []
+        exited = asyncio.Event()
+
+        async def send(message):
+            frames.append(message)
+            if message['type'] == 'pty_exit':
+                exited.set()
+
+        session = await manager.open("phone", send, shell="/bin/sh", window=32 * 1024)
+        session.write("head -c 200000 /dev/zero | tr '\\0' '\\132'; exit 7\n")
+        # Without acks the session stops reading once the window is full
+        await asyncio.sleep(0.5)
+        unacked = sum(m['bytes'] for m in frames if m['type'] == 'pty_output')
+        assert unacked < 32 * 1024 + session.max_frame * 4 + 65536
+        assert not exited.is_set()
+        acked = 0
+        while not exited.is_set():
+            sent = sum(m['bytes'] for m in frames if m['type'] == 'pty_output')
+            session.ack(sent - acked)
+            acked = sent
+            await asyncio.sleep(0.01)
+        return manager, frames
+
+    manager, frames = asyncio.run(scenario())
+    output = [m for m in frames if m['type'] == 'pty_output']
+    assert sum(m['data'].count('Z') for m in output) == 200000
+    assert all(m['bytes'] <= 16 * 1024 for m in output)
+    assert frames[-1] == {'type': 'pty_exit', 'sessionId': frames[-1]['sessionId'], 'exitCode': 7}
+    assert not manager.has("phone", frames[-1]['sessionId'])
+
+
+def test_shell_gets_the_pty_as_its_controlling_terminal():
+    async def scenario():
+        manager = PtyManager()
+        frames = []
+        exited = asyncio.Event()
+
+        async def send(message):
+            frames.append(message)
+            if message['type'] == 'pty_exit':
+                exited.set()
+
+        session = await manager.open("phone", send, shell="/bin/sh")
+        # /dev/tty only opens for a process with a controlling terminal
+        session.write("(: < /dev/tty) && echo ctty-$((6 * 7)); exit\n")
+        await asyncio.wait_for(exited.wait(), 10)
+        return ''.join(m['data'] for m in frames if m['type'] == 'pty_output')
+
+    assert 'ctty-42' in asyncio.run(scenario())
+
+
+def test_open_reserves_its_slot_and_respects_close_all():
+    async def scenario():
+        manager = PtyManager(max_per_client=1)
+        frames = []
+        exited = asyncio.Event()
+
+        async def send(message):
+            frames.append(message)
+            if message['type'] == 'pty_exit':
+                exited.set()
+
+        results = await asyncio.gather(*(manager.open("phone", send, shell="/bin/sh") for _ in range(2)),
+                                       return_exceptions=True)
+        manager.close_all("phone")
+        await asyncio.wait_for(exited.wait(), 10)
+        exited.clear()
+        # The connection goes away while the shell is still starting
+        late = asyncio.ensure_future(manager.open("phone", send, shell="/bin/sh"))
+        await asyncio.sleep(0)
+        manager.close_all("phone")
+        with pytest.raises(RuntimeError):
+            await late
+        await asyncio.wait_for(exited.wait(), 10)
+        return results, manager
+
+    results, manager = asyncio.run(scenario())
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    assert not manager._sessions.get("phone")
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from desktop.server.sessions import SessionManager, SessionClosed
+
+
+class FakeSocket:
+    def __init__(self, blocked=False):
+        self.remote_address = ('127.0.0.1', 5000)
+        self.frames = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send(self, frame):
+        await self.gate.wait()
+        self.frames.append(frame)
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = code
+
+
+def test_broadcast_serializes_once_and_skips_unpaired():
+    async def scenario():
+        manager = SessionManager()
+        a, b, c = FakeSocket(), FakeSocket(), FakeSocket()
+        sa, sb, sc = manager.register(a), manager.register(b), manager.register(c)
+        sa.paired = sb.paired = True
+        sb.capabilities.add('clipboard')
+        assert manager.broadcast({'type': 'x'}) == 2
+        assert manager.broadcast({'type': 'y'}, capability='clipboard') == 1
+        await asyncio.sleep(0.01)
+        for session in (sa, sb, sc):
+            await manager.unregister(session)
+        return a, b, c
+
+    a, b, c = asyncio.run(scenario())
+    assert a.frames == ['{"type": "x"}']
+    assert b.frames == ['{"type": "x"}', '{"type": "y"}']
+    assert a.frames[0] is b.frames[0]
+    assert c.frames == []
+
+
+def test_slow_client_drops_or_closes_without_blocking_others():
+    async def scenario():
+        manager = SessionManager(max_queue=2)
+        slow_socket, fast_socket = FakeSocket(blocked=True), FakeSocket()
+        slow, fast = manager.register(slow_socket), manager.register(fast_socket)
+        slow.paired = fast.paired = True
+        for i in range(3):
+            manager.broadcast({'n': i})
+            await asyncio.sleep(0)
+        # One frame is stuck in the writer, two wait in the queue, the overflow is dropped
+        assert manager.broadcast({'n': 'extra'}, droppable=True) == 1
+        assert slow.dropped >= 1 and not slow.closed
+        manager.broadcast({'n': 'essential'})
+        await asyncio.sleep(0.01)
+        assert slow.closed
+        with pytest.raises(SessionClosed):
+            await slow.send({'n': 'late'})
+        slow_socket.gate.set()
+        await manager.unregister(slow)
+        await manager.unregister(fast)
+        return slow_socket, fast_socket
+
+    slow_socket, fast_socket = asyncio.run(scenario())
+    assert slow_socket.closed_with == 1013
+    assert len(fast_socket.frames) == 5
+
+
+def test_send_waits_for_room():
+    async def scenario():
+        manager = SessionManager(max_queue=1)
+        socket = FakeSocket(blocked=True)
+        session = manager.register(socket)
+        await session.send('a')
+        await asyncio.sleep(0)
+        await session.send('b')
+        pending = asyncio.create_task(session.send('c'))
+        await asyncio.sleep(0.01)
+        assert not pending.done()
+        socket.gate.set()
+        await pending
+        await asyncio.sleep(0.01)
+        await manager.unregister(session)
+        return socket
+
+    assert asyncio.run(scenario()).frames == ['a', 'b', 'c']
+
+
+def test_resume_tokens_are_single_use_and_expire():
+    async def scenario():
+        manager = SessionManager(resume_ttl=0.05)
+        old = manager.register(FakeSocket())
+        token = manager.issue_resume_token(old)
+        await manager.unregister(old, topics=['battery'])
+        assert manager.take_resumable(token) is old
+        assert old.resume_state == {'topics': ['battery']}
+        assert manager.take_resumable(token) is None
+
+        expiring = manager.register(FakeSocket())
+        token = manager.issue_resume_token(expiring)
+        rotated = manager.issue_resume_token(expiring)
+        assert manager.take_resumable(token) is None
+        await manager.unregister(expiring)
+        await asyncio.sleep(0.1)
+        assert manager.take_resumable(rotated) is None
+
+    asyncio.run(scenario())
+
+
+def test_expired_sessions_are_reclaimed_unless_resumed():
+    reclaimed = []
+
+    async def scenario():
+        manager = SessionManager(resume_ttl=0.05, on_expire=reclaimed.append)
+        unpaired = manager.register(FakeSocket())
+        await manager.unregister(unpaired)
+        assert reclaimed == [unpaired]
+
+        resumed, abandoned = manager.register(FakeSocket()), manager.register(FakeSocket())
+        token = manager.issue_resume_token(resumed)
+        manager.issue_resume_token(abandoned)
+        await manager.unregister(resumed)
+        await manager.unregister(abandoned)
+        assert manager.take_resumable(token) is resumed
+        await asyncio.sleep(0.1)
+        return unpaired, abandoned
+
+    unpaired, abandoned = asyncio.run(scenario())
+    assert reclaimed == [unpaired, abandoned]
@@ -0,0 +1,37 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from desktop.server.shutdown import ShutdownTrigger
+
+
+def test_event_set_from_another_thread_triggers():
+    async def scenario():
+        trigger = ShutdownTrigger()
+        event = threading.Event()
+        trigger.watch_event(event)
+        asyncio.get_running_loop().call_later(0.05, event.set)
+        reason = await asyncio.wait_for(trigger.wait(), 2)
+        trigger.close()
+        return reason
+
+    assert asyncio.run(scenario()) == 'stop event'
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="add_reader needs a selector loop")
+def test_pipe_write_triggers_without_polling():
+    async def scenario():
+        trigger = ShutdownTrigger()
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        trigger.watch_fd(reader.fileno())
+        await asyncio.sleep(0.05)
+        assert trigger.reason is None
+        writer.send(b'stop')
+        reason = await asyncio.wait_for(trigger.wait(), 2)
+        trigger.close()
+        return reason
+
+    assert asyncio.run(scenario()) == 'stop pipe'
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from desktop.server.startup_profile import profile_import
+
+# Generous, cold imports on a slow machine included; the server used to need several times this
+IMPORT_BUDGET = 1.0  # seconds
+
+# Loaded only once a client uses the feature that needs them
+DEFERRED_MODULES = (
+    'pyautogui', 'pynput', 'pyperclip', 'psutil', 'qrcode', 'PIL',
+    'win32api', 'desktop.features.mouse_keyboard', 'desktop.features.multimedia',
+    'desktop.features.battery',
+)
+
+
+def test_server_import_is_cheap(tmp_path, monkeypatch):
+    # The server creates its data folders under the home directory
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('USERPROFILE', str(tmp_path))
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    summary, imports = profile_import('desktop.server.ws_handler')
+    loaded = set(summary['modules'])
+    assert [name for name in DEFERRED_MODULES if name in loaded] == []
+    assert summary['seconds'] < IMPORT_BUDGET
+    assert any(name == 'desktop.server.ws_handler' for _, _, _, name in imports)
+
+
+def test_failed_import_shows_the_child_error():
+    with pytest.raises(RuntimeError) as failure:
+        profile_import('desktop.no_such_module')
+    assert "ModuleNotFoundError: No module named 'desktop.no_such_module'" in str(failure.value)
+    assert 'import time:' not in str(failure.value)
+
+
+def test_plugins_load_on_first_use():
+    from desktop import features
+    from desktop.features.command import run_command
+    assert 'get_battery_status' in dir(features)
+    assert features.run_command is run_command
+    with pytest.raises(AttributeError):
+        features.not_a_feature
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from desktop.server.subscriptions import SubscriptionManager
+
+
+class FakeSession:
+    def __init__(self, accept=True):
+        self.frames = []
+        self.accept = accept
+
+    def push(self, frame, droppable=False):
+        if self.accept:
+            self.frames.append(frame)
+        return self.accept
+
+
+def test_one_producer_and_diff_only_updates():
+    calls = []
+    levels = [40, 40, 55]
+
+    def sample():
+        calls.append(1)
+        return {'level': levels[min(len(calls), len(levels)) - 1], 'muted': False}
+
+    async def scenario():
+        manager = SubscriptionManager()
+        manager.register_topic('volume', sample=sample, interval=0.01)
+        a, b = FakeSession(), FakeSession()
+        await manager.subscribe(a, ['volume'])
+        await manager.subscribe(b, ['volume', 'nope'])
+        await asyncio.sleep(0.1)
+        manager.unsubscribe(a)
+        manager.unsubscribe(b)
+        return a, b
+
+    a, b = asyncio.run(scenario())
+    # One producer sampled for both clients
+    assert len(calls) >= 3
+    updates = [json.loads(frame)['changed'] for frame in a.frames]
+    assert updates == [{'available': True, 'level': 40, 'muted': False}, {'level': 55}]
+    # Both subscribers share the exact same serialized frames
+    assert b.frames == a.frames
+
+
+def test_late_subscriber_gets_snapshot():
+    async def scenario():
+        manager = SubscriptionManager()
+        manager.register_topic('battery', sample=lambda: {'percent': 80}, interval=10)
+        a, b = FakeSession(), FakeSession()
+        await manager.subscribe(a, ['battery'])
+        await asyncio.sleep(0.05)
+        await manager.subscribe(b, ['battery'])
+        manager.unsubscribe(a)
+        manager.unsubscribe(b)
+        return b
+
+    b = asyncio.run(scenario())
+    frame = json.loads(b.frames[0])
+    assert frame['snapshot'] is True
+    assert frame['changed'] == {'available': True, 'percent': 80}
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot():
+    async def scenario():
+        manager = SubscriptionManager()
+        manager.register_topic('volume', sample=lambda: None, interval=10)
+        slow = FakeSession()
+        await manager.subscribe(slow, ['volume'])
+        await manager.publish('volume', {'level': 10})
+        slow.accept = False
+        await manager.publish('volume', {'level': 20})
+        slow.accept = True
+        await manager.publish('volume', {'level': 20})
+        manager.unsubscribe(slow)
+        return slow
+
+    slow = asyncio.run(scenario())
+    frames = [json.loads(frame) for frame in slow.frames]
+    assert frames[-1]['snapshot'] is True
+    assert frames[-1]['changed'] == {'available': True, 'level': 20}
@@ -0,0 +1,53 @@
+import os
+import socket
+import ssl
+import stat
+import threading
+
+import pytest
+
+pytest.importorskip('cryptography')
+
+from desktop.server.tls import TlsIdentity, check_pin, client_context, server_context
+
+
+def test_identity_is_cached_and_key_is_private(tmp_path):
+    first = TlsIdentity.load(tmp_path)
+    again = TlsIdentity.load(tmp_path)
+    assert again.fingerprint == first.fingerprint and len(first.fingerprint) == 64
+    if os.name == 'posix':
+        assert stat.S_IMODE(first.key_path.stat().st_mode) == 0o600
+
+
+def test_reconnect_resumes_session_and_checks_pin(tmp_path):
+    identity = TlsIdentity.load(tmp_path)
+    context = server_context(identity)
+    listener = socket.create_server(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+
+    def serve(count):
+        for _ in range(count):
+            conn, _ = listener.accept()
+            with context.wrap_socket(conn, server_side=True) as tls_conn:
+                tls_conn.sendall(b'x')
+                tls_conn.recv(1)
+
+    server = threading.Thread(target=serve, args=(2,), daemon=True)
+    server.start()
+    client = client_context()
+    session = None
+    reused = []
+    try:
+        for _ in range(2):
+            with client.wrap_socket(socket.create_connection(('127.0.0.1', port)), session=session) as sock:
+                check_pin(sock, identity.fingerprint)
+                with pytest.raises(ssl.SSLError):
+                    check_pin(sock, '0' * 64)
+                sock.recv(1)   # TLS 1.3 tickets arrive after the handshake
+                session = sock.session
+                reused.append(sock.session_reused)
+                sock.sendall(b'y')
+    finally:
+        server.join(5)
+        listener.close()
+    assert reused == [False, True]
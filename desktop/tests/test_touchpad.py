@@ -0,0 +1,91 @@
+import sys
+import types
+
+import pytest
+
+from desktop.features.touchpad import AccelerationCurve, PointerBackend, clamp_to_monitors
+
+
+def test_curve_accelerates_fast_strokes_only():
+    curve = AccelerationCurve(sensitivity=2.0, acceleration=3.0, low_speed=100, high_speed=1100)
+    assert curve.gain(0) == curve.gain(100) == 2.0
+    assert curve.gain(600) == 2.0 * 2.5
+    assert curve.gain(5000) == 2.0 * 4.0
+
+
+def test_slow_moves_accumulate_sub_pixels(make_backend, make_touchpad):
+    backend = make_backend()
+    touchpad = make_touchpad(backend)
+    for _ in range(10):
+        touchpad.move(0.25, -0.25)
+    # 2.5 px each way: two whole pixels moved, the half kept for later
+    assert touchpad.position == (102, 98)
+    assert backend.moves == [(101, 99), (102, 98)]
+    assert backend.queries == 1
+
+
+def test_position_is_read_once_per_gesture(clock, make_backend, make_touchpad):
+    backend = make_backend()
+    touchpad = make_touchpad(backend)
+    for _ in range(5):
+        clock.now += 0.01
+        touchpad.move(3, 0)
+    assert backend.queries == 1 and touchpad.position == (115, 100)
+    touchpad.begin()
+    touchpad.move(1, 0)
+    assert backend.queries == 2
+    clock.now += 5   # a long pause also counts as a new gesture
+    touchpad.move(1, 0)
+    assert backend.queries == 3
+
+
+def test_moves_stop_at_monitor_edges(monitors, make_backend, make_touchpad):
+    assert clamp_to_monitors(5000, 500, monitors) == (5000, 500)
+    # Below the smaller monitor is off screen, the pointer stays on its bottom edge
+    assert clamp_to_monitors(5000, 1500, monitors) == (5000, 1079)
+    assert clamp_to_monitors(-50, -50, monitors) == (0, 0)
+
+    backend = make_backend(position=(3830, 1500))
+    touchpad = make_touchpad(backend)
+    # Nothing to the right at this height, the pointer stops at the 4K screen's edge
+    touchpad.move(50, 0)
+    assert touchpad.position == (3839, 1500)
+    backend.calls.clear()
+    touchpad.move(10, 0)   # already on the edge: nothing to inject
+    assert backend.moves == []
+
+
+class FakePyautogui(types.ModuleType):
+    def __init__(self, platform_move):
+        super().__init__('pyautogui')
+        self.moves = []
+        if platform_move is not None:
+            self.platformModule = types.SimpleNamespace(_moveTo=platform_move)
+
+    def moveTo(self, x, y, _pause=True):
+        self.moves.append(('moveTo', x, y, _pause))
+
+
+@pytest.mark.parametrize('platform_move', [None, 'not callable', 'raises'])
+def test_pointer_falls_back_to_public_move(monkeypatch, platform_move):
+    calls = []
+
+    def broken(x, y):
+        calls.append((x, y))
+        raise TypeError('_moveTo() takes 1 positional argument')
+
+    fake = FakePyautogui(broken if platform_move == 'raises' else platform_move)
+    monkeypatch.setitem(sys.modules, 'pyautogui', fake)
+    backend = PointerBackend()
+    backend.move_to(10, 20)
+    backend.move_to(11, 21)
+    assert fake.moves == [('moveTo', 10, 20, False), ('moveTo', 11, 21, False)]
+    assert calls == ([(10, 20)] if platform_move == 'raises' else [])
+
+
+def test_pointer_uses_platform_move(monkeypatch):
+    calls = []
+    fake = FakePyautogui(lambda x, y: calls.append((x, y)))
+    monkeypatch.setitem(sys.modules, 'pyautogui', fake)
+    PointerBackend().move_to(10, 20)
+    assert calls == [(10, 20)] and fake.moves == []
@@ -1,27 +1,45 @@
 # QR code generation utilities
 import json
-import qrcode
 
 class QRUtils:
+    @staticmethod
+    def make_qr(data, box_size=1.0, border=1):
+        """Build the QR code for a JSON-serializable payload."""
+        import qrcode  # pulls in PIL, only loaded when a QR code is needed
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=box_size,
+            border=border,
+        )
+        qr.add_data(json.dumps(data))
+        qr.make(fit=True)
+        return qr
+
+    @staticmethod
+    def matrix_to_text(matrix):
+        """Render a QR matrix as terminal text, two characters per module."""
+        return "".join("".join("██" if cell else "  " for cell in row) + "\n" for row in matrix)
+
+    @staticmethod
+    def matrix_to_svg(matrix, scale=8):
+        """Render a QR matrix as a standalone SVG document."""
+        size = len(matrix) * scale
+        path = "".join(
+            f"M{x * scale},{y * scale}h{scale}v{scale}h-{scale}z"
+            for y, row in enumerate(matrix) for x, cell in enumerate(row) if cell
+        )
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="100%" height="100%" fill="#fff"/><path d="{path}" fill="#000"/></svg>\n'
+        )
+
     @staticmethod
     def generate_qr_code(data, box_size=1.0):
         """Generate QR code for terminal display."""
         try:
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=box_size,
-                border=1,
-            )
-            qr.add_data(json.dumps(data))
-            qr.make(fit=True)
-            terminal_qr = qr.get_matrix()
-            qr_string = ""
-            for row in terminal_qr:
-                for cell in row:
-                    qr_string += "██" if cell else "  "
-                qr_string += "\n"
-            return qr_string
+            return QRUtils.matrix_to_text(QRUtils.make_qr(data, box_size=box_size).get_matrix())
         except Exception as e:
             print(f"Failed to generate QR code: {e}")
-            return ""
\ No newline at end of file
+            return ""
@@ -5,6 +5,11 @@ export interface Device {
   ip: string;
   port: string;
   token: string;
+  // Issued at pairing: pair again with these instead of the (rotating) token
+  clientId?: string;
+  clientKey?: string;
+  // Restores the previous session after a short disconnect
+  resumeToken?: string;
   hostType?: string;
   name: string;
   lastConnected?: number;
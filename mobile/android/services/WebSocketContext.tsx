@@ -46,7 +46,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     setConnectingDevice(null); // Clear connecting device on disconnect
   }, []);
 
-  const connect = useCallback((ip: string, port: string, token: string, isAutoConnect: boolean = false) => {
+  const connect = useCallback((ip: string, port: string, token: string, isAutoConnect: boolean = false, saved: Device | null = null) => {
     if (wsRef.current) {
       wsRef.current.close();
     }
@@ -60,12 +60,26 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
       setConnectingDevice(null);
     }
 
+    // Saved devices pair with the credential the server issued, the token rotates
+    const pairAgain = () => {
+      if (saved?.clientId && saved?.clientKey) {
+        ws.send(JSON.stringify({ type: 'pair', clientId: saved.clientId, clientKey: saved.clientKey }));
+      } else {
+        // Saved before the server issued credentials, the token only works until it rotates
+        ws.send(JSON.stringify({ type: 'pair', token }));
+      }
+    };
+
     ws.onopen = () => {
-      if (!isAutoConnect) {
+      if (!isAutoConnect || !saved) {
         // Manual connection: user scanned a QR code, use that token immediately.
         ws.send(JSON.stringify({ type: 'pair', token }));
+      } else if (saved.resumeToken) {
+        // Auto-connection: pick up the previous session, pairing again if it has expired
+        ws.send(JSON.stringify({ type: 'resume', token: saved.resumeToken }));
+      } else {
+        pairAgain();
       }
-      // For auto-connection, we wait for the 'hello' message from the server.
     };
 
     ws.onmessage = (event) => {
@@ -73,11 +87,20 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
       try {
         const message = JSON.parse(event.data);
 
-        // Case 1: Auto-connect receives the server's fresh token
-        if (isAutoConnect && message.type === 'hello' && message.token) {
-          ws.send(JSON.stringify({ type: 'pair', token: message.token }));
-        
-        // Case 2: Pairing is successful (for both manual and auto-connect)
+        // Case 1: The previous session expired, pair again with the saved credential
+        if (isAutoConnect && message.type === 'resume_failed') {
+          pairAgain();
+
+        // Case 2: The previous session was restored
+        } else if (message.type === 'resume_success' && saved) {
+          setConnected(true);
+          const resumedDevice: Device = { ...saved, resumeToken: message.resumeToken, lastConnected: Date.now() };
+          setConnectedDevice(resumedDevice);
+          DeviceStorage.saveDevice(resumedDevice);
+          setConnectingDevice(null);
+          ws.send(JSON.stringify({ type: 'get_hostname' }));
+
+        // Case 3: Pairing is successful (for both manual and auto-connect)
         } else if (message.type === 'pair_success' && message.server_info) {
           console.log('🔗 Setting connected to true - pairing successful');
           setConnected(true);
@@ -92,6 +115,10 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
             ip: server_ip,
             port: String(port_no),
             token: pairing_token,
+            clientId: message.clientId,
+            // Only sent when a new credential was issued, pairing with the saved one keeps it
+            clientKey: message.clientKey || saved?.clientKey,
+            resumeToken: message.resumeToken,
             name: baseDevice.name || server_ip, // Keep existing name or use IP as default
             
             lastConnected: Date.now(),
@@ -104,12 +131,12 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
           // After pairing, ask the server for its hostname
           ws.send(JSON.stringify({ type: 'get_hostname' }));
 
-        // Case 3: Pairing fails
+        // Case 4: Pairing fails
         } else if (message.type === 'pair_failed') {
           console.error('Pairing failed:', message.message);
           disconnect(); // Disconnect and clear state on failure
         
-        // Case 4: Server provides its hostname after pairing
+        // Case 5: Server provides its hostname after pairing
         } else if (message.type === 'hostname' && message.hostname) {
           if (connectedDevice) {
             DeviceStorage.updateDeviceName(connectedDevice.id, message.hostname);
@@ -136,7 +163,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
 
   const connectToDevice = useCallback((device: Device) => {
     setConnectingDevice(device); // Set the device we are attempting to connect to
-    connect(device.ip, device.port, device.token, true); // Pass true for auto-connect
+    connect(device.ip, device.port, device.token, true, device); // Pass true for auto-connect
   }, [connect]);
 
   const send = useCallback((data: string) => {
@@ -232,18 +259,8 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     };
   }, [connected, isAutoConnecting, startAutoConnect, stopAutoConnect]); // Dependencies updated
 
-  // Keep the connection alive with pings
-  useEffect(() => {
-    if (!connected) return;
-
-    const pingInterval = setInterval(() => {
-      send(JSON.stringify({ type: 'ping' }));
-    }, 10000); // every 10 seconds
-
-    return () => {
-      clearInterval(pingInterval);
-    };
-  }, [connected, send]);
+  // No app-level keepalive needed: the server sends WebSocket protocol pings,
+  // which the platform WebSocket answers on its own.
 
   return (
     <WebSocketContext.Provider value={{ 